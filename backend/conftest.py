@@ -0,0 +1 @@
+pytest_plugins = ['foodieasy_backend.pytest_plugin']
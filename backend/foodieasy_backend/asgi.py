@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodieasy_backend.settings')
 
 application = get_asgi_application()
+
+# Warm the catalogue cache in the background (WARM_CACHES_ON_STARTUP)
+from restaurants.cache import start_background_warmup  # noqa: E402
+start_background_warmup()
@@ -0,0 +1,76 @@
+"""
+Conditional GET support (ETag / Last-Modified / Cache-Control) for DRF views.
+
+Views compute validators from cheap queries (``MAX(updated_at)``, version
+counters) instead of hashing the rendered body, so a matching
+``If-None-Match`` / ``If-Modified-Since`` is answered with 304 after
+authentication and permission checks but before any serialization.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Quoted strong ETag for the given validator parts"""
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+class NotModified(Exception):
+    """Carries the 304/412 response out of ``initial`` or an action"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalResponseMixin:
+    """
+    ViewSet mixin. For actions in ``conditional_actions`` the view's
+    ``get_validators()`` runs in ``initial()``; other actions can call
+    ``check_not_modified()`` themselves (e.g. after their own permission
+    checks). Successful responses carry the validators and
+    ``cache_control`` directives.
+    """
+    conditional_actions = ('list', 'retrieve')
+    # Shared caches may store the payload but must revalidate each time
+    cache_control = {'public': True, 'no_cache': True}
+
+    def get_validators(self, request, *args, **kwargs):
+        """Return ``(etag, last_modified)`` for the current read, or None to skip"""
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.last_modified = None
+        if request.method in ('GET', 'HEAD') and self.action in self.conditional_actions:
+            validators = self.get_validators(request, *args, **kwargs)
+            if validators:
+                self.check_not_modified(request, *validators)
+
+    def check_not_modified(self, request, etag, last_modified=None):
+        """Raise NotModified (handled by the view) if the client's copy is current"""
+        self.etag = etag
+        self.last_modified = last_modified
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified:
+                response['Last-Modified'] = http_date(self.last_modified.timestamp())
+            patch_cache_control(response, **self.cache_control)
+        return response
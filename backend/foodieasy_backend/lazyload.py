@@ -0,0 +1,168 @@
+"""
+Detection of lazy relation loads.
+
+Accessing ``order.customer`` or ``restaurant.delivery_estimate`` when the
+relation was not fetched with ``select_related``/``prefetch_related`` costs
+one query per object. Once ``install()`` has patched Django's relation
+descriptors, every such implicit query (and every deferred-field load) is
+counted per call site and, depending on the mode:
+
+- ``off``: ignored (default)
+- ``log``: logged with the model, relation and the project line responsible
+- ``raise``: ``LazyLoadError`` is raised at that line
+
+The mode comes from ``strict_relations()`` when active, otherwise from the
+``LAZY_LOAD_MODE`` setting. ``LazyLoadMiddleware`` enables ``log`` mode for
+a ``LAZY_LOAD_SAMPLE_RATE`` fraction of production requests.
+"""
+import contextvars
+import logging
+import random
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor,
+    ReverseOneToOneDescriptor,
+)
+from django.db.models.query_utils import DeferredAttribute
+
+
+logger = logging.getLogger(__name__)
+
+OFF = 'off'
+LOG = 'log'
+RAISE = 'raise'
+MODES = (OFF, LOG, RAISE)
+
+_mode = contextvars.ContextVar('lazy_load_mode', default=None)
+_counts = Counter()
+_counts_lock = threading.Lock()
+_installed = False
+_install_lock = threading.Lock()
+
+
+class LazyLoadError(Exception):
+    """A relation or deferred field was loaded implicitly in strict mode"""
+
+
+def current_mode():
+    mode = _mode.get()
+    if mode is None:
+        mode = getattr(settings, 'LAZY_LOAD_MODE', OFF)
+    return mode
+
+
+@contextmanager
+def strict_relations(mode=RAISE):
+    """Use ``mode`` for lazy loads inside the block (tests, sampled requests)"""
+    if mode not in MODES:
+        raise ValueError(f'Unknown lazy load mode {mode!r}; expected one of {MODES}')
+    install()
+    token = _mode.set(mode)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def lazy_load_counts():
+    """``{(relation, call site): count}`` for this process since the last reset"""
+    with _counts_lock:
+        return dict(_counts)
+
+
+def reset_counts():
+    with _counts_lock:
+        _counts.clear()
+
+
+def _call_site():
+    """``path:line in function`` of the innermost project frame outside Django"""
+    base_dir = str(Path(settings.BASE_DIR).resolve())
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir) and filename != __file__
+                and 'site-packages' not in filename):
+            return f'{Path(filename).relative_to(base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return '<unknown>'
+
+
+def _lazy_load(relation):
+    mode = current_mode()
+    if mode == OFF:
+        return
+    site = _call_site()
+    with _counts_lock:
+        _counts[(relation, site)] += 1
+    message = f'Lazy load of {relation} at {site}; use select_related/prefetch_related/only()'
+    if mode == RAISE:
+        raise LazyLoadError(message)
+    logger.warning(message)
+
+
+def _wrap_forward(get_queryset):
+    def wrapper(self, **hints):
+        # Only the per-instance lookup passes ``instance``; prefetching does not
+        if 'instance' in hints:
+            _lazy_load(f'{self.field.model.__name__}.{self.field.name}')
+        return get_queryset(self, **hints)
+    return wrapper
+
+
+def _wrap_reverse(get_queryset):
+    def wrapper(self, **hints):
+        if 'instance' in hints:
+            _lazy_load(f'{self.related.model.__name__}.{self.related.get_accessor_name()}')
+        return get_queryset(self, **hints)
+    return wrapper
+
+
+def _wrap_deferred(get):
+    def wrapper(self, instance, cls=None):
+        # Non-data descriptor: only reached when the value is missing
+        if instance is not None and self.field.attname not in instance.__dict__:
+            _lazy_load(f'{type(instance).__name__}.{self.field.attname} (deferred)')
+        return get(self, instance, cls)
+    return wrapper
+
+
+def install():
+    """Patch the relation descriptors once per process; safe to call repeatedly"""
+    global _installed
+    if _installed:
+        return
+    with _install_lock:
+        if _installed:
+            return
+        ForwardManyToOneDescriptor.get_queryset = _wrap_forward(ForwardManyToOneDescriptor.get_queryset)
+        ReverseOneToOneDescriptor.get_queryset = _wrap_reverse(ReverseOneToOneDescriptor.get_queryset)
+        DeferredAttribute.__get__ = _wrap_deferred(DeferredAttribute.__get__)
+        _installed = True
+
+
+class LazyLoadMiddleware:
+    """
+    Log lazy loads for a ``LAZY_LOAD_SAMPLE_RATE`` fraction of requests
+    (0 disables sampling). Requests that are not sampled use ``LAZY_LOAD_MODE``.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'LAZY_LOAD_SAMPLE_RATE', 0.0)
+        if not self.sample_rate and getattr(settings, 'LAZY_LOAD_MODE', OFF) == OFF:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            with strict_relations(LOG):
+                return self.get_response(request)
+        return self.get_response(request)
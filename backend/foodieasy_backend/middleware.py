@@ -0,0 +1,232 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+Like Django's GZipMiddleware, but prefers brotli when the client accepts it
+and the ``brotli`` package is installed, honours q-values, and leaves
+responses smaller than ``COMPRESSION_MIN_SIZE`` bytes alone (the framing
+overhead outweighs the savings). Streaming responses such as order exports
+are gzip-compressed chunk by chunk.
+
+``LoadSheddingMiddleware`` rejects low-priority requests early while the
+server is saturated.
+"""
+import math
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript')
+
+
+def accepted_encodings(header):
+    """Parse an Accept-Encoding header into ``{coding: q}``"""
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[coding] = q
+    return encodings
+
+
+def choose_encoding(header, candidates=None):
+    """Return the preferred of ``candidates`` ('br', 'gzip') the client accepts, or None"""
+    encodings = accepted_encodings(header)
+    wildcard = encodings.get('*', 0.0)
+    if candidates is None:
+        candidates = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = encodings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """Compress eligible responses with brotli or gzip"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+        self.brotli_quality = getattr(settings, 'BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        # The representation depends on Accept-Encoding from here on
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            ('gzip',) if response.streaming else None
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=self.brotli_quality)
+            else:
+                compressed = compress_string(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The compressed body is no longer byte-identical to the original
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+
+# Load shedding
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+LOW = 'low'
+
+DEFAULT_SHEDDING_THRESHOLDS_MS = {LOW: 250, NORMAL: 1000}
+DEFAULT_SHEDDING_RULES = [
+    # (methods, path regex, priority, only for authenticated requests); first match wins
+    (('POST', 'PATCH'), r'^/api/orders/', CRITICAL, True),
+    (('POST',), r'^/api/users/rider/location/', LOW, True),
+    (('POST',), r'^/api/users/auth/', NORMAL, False),
+]
+
+
+def queue_latency_ms(request, now=None):
+    """
+    Time the request spent queued before reaching Django, from the proxy's
+    ``X-Request-Start`` header (``t=<epoch seconds|ms|µs>``), or None.
+    """
+    header = request.META.get('HTTP_X_REQUEST_START', '')
+    try:
+        started = float(header.removeprefix('t='))
+    except ValueError:
+        return None
+    # Normalise microsecond or millisecond timestamps to seconds
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    now = time.time() if now is None else now
+    return max(0.0, (now - started) * 1000)
+
+
+class QueueLatencyMonitor:
+    """Exponentially weighted moving average of queue latency for this process"""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, latency_ms):
+        with self._lock:
+            self.value += self.alpha * (latency_ms - self.value)
+        return self.value
+
+
+class LoadSheddingMiddleware:
+    """
+    Reject low-priority traffic with 503 while queue latency is above the
+    threshold for its priority, so order placement keeps its capacity during
+    spikes. Priorities come from ``LOAD_SHEDDING_RULES``; unmatched requests
+    are ``normal`` when authenticated and ``low`` otherwise. A request is
+    authenticated when it carries a valid JWT access token (signature and
+    expiry are checked, no query is made), and only while shedding could
+    apply. ``critical`` requests are never shed. Needs the proxy to send
+    ``X-Request-Start`` (e.g. nginx: ``proxy_set_header X-Request-Start "t=${msec}";``).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'LOAD_SHEDDING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.thresholds = getattr(settings, 'LOAD_SHEDDING_THRESHOLDS_MS', DEFAULT_SHEDDING_THRESHOLDS_MS)
+        self.rules = [
+            (frozenset(methods), re.compile(pattern), priority, authenticated_only)
+            for methods, pattern, priority, authenticated_only
+            in getattr(settings, 'LOAD_SHEDDING_RULES', DEFAULT_SHEDDING_RULES)
+        ]
+        self.authentication = JWTAuthentication()
+        self.monitor = QueueLatencyMonitor()
+
+    def is_authenticated(self, request):
+        """Whether the request carries a valid access token; the user is not loaded"""
+        header = self.authentication.get_header(request)
+        try:
+            raw_token = header and self.authentication.get_raw_token(header)
+            if not raw_token:
+                return False
+            self.authentication.get_validated_token(raw_token)
+        except AuthenticationFailed:
+            return False
+        return True
+
+    def priority(self, request):
+        authenticated = self.is_authenticated(request)
+        for methods, pattern, priority, authenticated_only in self.rules:
+            if request.method in methods and pattern.match(request.path_info):
+                if authenticated or not authenticated_only:
+                    return priority
+                break
+        return NORMAL if authenticated else LOW
+
+    def __call__(self, request):
+        latency = queue_latency_ms(request)
+        if latency is not None:
+            self.monitor.observe(latency)
+
+        # Nothing is shed below the lowest threshold, so skip classifying
+        if self.monitor.value <= min(self.thresholds.values(), default=math.inf):
+            return self.get_response(request)
+        threshold = self.thresholds.get(self.priority(request))
+        if threshold is not None and self.monitor.value > threshold:
+            response = JsonResponse(
+                {'detail': 'The service is busy. Please retry shortly.'}, status=503
+            )
+            response['Retry-After'] = str(max(1, math.ceil(self.monitor.value / 1000)))
+            return response
+        return self.get_response(request)
@@ -0,0 +1,75 @@
+"""
+pytest plugin for query-count scaling checks and lazy-load detection
+(requires pytest-django).
+
+Loaded by backend/conftest.py. With it:
+
+- the generated ``ListEndpointQueryScalingTests`` in foodieasy_backend/tests.py
+  cover every router list endpoint, with sizes from ``--query-scaling-sizes``
+- the ``query_scaling`` fixture checks any code path::
+
+      def test_menu_serializer(query_scaling):
+          query_scaling(make_menu_items, lambda: MenuItemSerializer(MenuItem.objects.all(), many=True).data)
+
+- ``--lazy-loads=log|raise`` runs the whole session in that lazy-load mode
+  (foodieasy_backend.lazyload); in ``log`` mode the per-call-site counts are
+  printed at the end of the run
+- the ``strict_relations`` fixture makes lazy loads raise inside one test
+"""
+import pytest
+
+from . import lazyload, testing
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--query-scaling-sizes',
+        default=','.join(str(size) for size in testing.DEFAULT_SIZES),
+        help='Comma-separated fixture sizes for query scaling checks (default: 1,10,100)',
+    )
+    parser.addoption(
+        '--lazy-loads',
+        default=lazyload.OFF,
+        choices=lazyload.MODES,
+        help='Lazy relation load mode for the whole session (default: off)',
+    )
+
+
+def pytest_configure(config):
+    testing.configured_sizes = tuple(
+        int(size) for size in config.getoption('query_scaling_sizes').split(',')
+    )
+
+
+@pytest.fixture
+def query_scaling(db):
+    """``query_scaling(setup, run, slack=0)``: fail if run()'s query count grows with setup(n)"""
+    def check(setup, run, slack=0):
+        return testing.check_queries_do_not_scale(setup, run, slack=slack)
+    return check
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _lazy_load_mode(request):
+    mode = request.config.getoption('lazy_loads')
+    if mode == lazyload.OFF:
+        yield
+        return
+    with lazyload.strict_relations(mode):
+        yield
+
+
+@pytest.fixture
+def strict_relations():
+    """Lazy relation loads raise LazyLoadError for the duration of the test"""
+    with lazyload.strict_relations(lazyload.RAISE):
+        yield
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    counts = lazyload.lazy_load_counts()
+    if not counts:
+        return
+    terminalreporter.section('lazy relation loads')
+    for (relation, site), count in sorted(counts.items(), key=lambda entry: -entry[1]):
+        terminalreporter.write_line(f'{count:6d}  {relation}  at {site}')
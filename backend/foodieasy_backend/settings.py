@@ -50,10 +50,14 @@ INSTALLED_APPS = [
     'users',
     'restaurants',
     'orders',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'foodieasy_backend.middleware.LoadSheddingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'foodieasy_backend.middleware.CompressionMiddleware',
+    'foodieasy_backend.lazyload.LazyLoadMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,7 +72,7 @@ ROOT_URLCONF = 'foodieasy_backend.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'foodieasy_backend' / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -100,6 +104,36 @@ DATABASES = {
     }
 }
 
+
+def shard_database(url):
+    """DATABASES entry for a shard URL: postgres://... or sqlite:///path (local testing)"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': parsed.path}
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': parsed.path.replace('/', ''),
+        'USER': parsed.username,
+        'PASSWORD': parsed.password,
+        'HOST': parsed.hostname,
+        'PORT': parsed.port or 5432,
+        'OPTIONS': dict(parse_qsl(parsed.query)),
+    }
+
+
+# Restaurant shards (foodieasy_backend.sharding), e.g.
+# SHARD_DATABASE_URLS="shard_1=postgres://...,shard_2=postgres://..."
+# Shard numbers follow the list order and must never change: append new
+# shards at the end, then run `manage.py rebalance_shards`.
+DATABASE_ROUTERS = ['foodieasy_backend.sharding.RestaurantShardRouter']
+RESTAURANT_SHARDS = {'default': 0}
+for shard_number, shard_entry in enumerate(filter(None, os.getenv('SHARD_DATABASE_URLS', '').split(',')), start=1):
+    shard_alias, _, shard_url = shard_entry.strip().partition('=')
+    DATABASES[shard_alias] = shard_database(shard_url)
+    RESTAURANT_SHARDS[shard_alias] = shard_number
+# {restaurant_id: alias} for restaurants that must live on a specific shard
+RESTAURANT_SHARD_PINS = {}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -164,6 +198,22 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'foodieasy_backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'foodieasy_backend.throttling.AnonBucketThrottle',
+        'foodieasy_backend.throttling.UserBucketThrottle',
+    ),
+    # Proxies in front of the app that append to X-Forwarded-For. With 0,
+    # throttles key on REMOTE_ADDR and ignore the (client-supplied) header.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
+    'DEFAULT_PARSER_CLASSES': (
+        'foodieasy_backend.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 # JWT Settings
@@ -174,3 +224,79 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
+
+# Cache shared by every server process (catalogue payloads, rider summaries,
+# facet counts and the version numbers that invalidate them). Set REDIS_URL
+# in production. Without it each process has a private memory cache and
+# SHARED_CACHE is off, so those payloads are computed on every request:
+# a write in one process could not invalidate another process's copy.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+SHARED_CACHE = bool(REDIS_URL)
+
+# Idempotency-Key settings (orders.idempotency): how long responses are kept,
+# and after how long an unfinished request is treated as abandoned
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(seconds=60)
+
+# Seconds each process caches an owner's kitchen dashboard (orders.dashboard)
+OWNER_DASHBOARD_TTL = 5
+
+# Opening hours are entered in this zone; seconds each process keeps its
+# compiled schedule index (restaurants.schedule). Schedule edits reach other
+# processes through the shared cache, or else only when their index expires
+RESTAURANT_TIME_ZONE = os.getenv('RESTAURANT_TIME_ZONE', TIME_ZONE)
+SCHEDULE_INDEX_TTL = 60 * 15 if SHARED_CACHE else 60
+
+# Order event outbox (orders.outbox)
+ORDER_OUTBOX_SINKS = ['orders.outbox.FileSink']
+ORDER_OUTBOX_FILE = BASE_DIR / 'var' / 'order_events.ndjson'
+
+# Background jobs (jobs.queue); run them with `manage.py run_worker`
+JOBS_EAGER = False
+JOBS_SCHEDULE = {
+    'orders.drain_outbox': {'every': timedelta(seconds=10)},
+    'orders.purge_idempotency_keys': {'every': timedelta(hours=1)},
+    'jobs.purge_jobs': {'every': timedelta(hours=1)},
+}
+# Succeeded and failed jobs are deleted this long after they finish
+JOBS_RETENTION = timedelta(days=7)
+
+# Warm the catalogue cache when each server process starts (restaurants.cache)
+WARM_CACHES_ON_STARTUP = os.getenv('WARM_CACHES_ON_STARTUP', 'False') == 'True'
+
+# Response compression (foodieasy_backend.middleware)
+COMPRESSION_MIN_SIZE = 1024
+BROTLI_QUALITY = 5
+
+# Token-bucket throttling (foodieasy_backend.throttling): refill rate and burst size
+THROTTLE_BUCKET_STORE = 'foodieasy_backend.throttling.LocalBucketStore'
+THROTTLE_BUCKETS = {
+    'anon': {'rate': '120/min', 'burst': 60},
+    'user': {'rate': '300/min', 'burst': 100},
+    'role:admin': {'rate': '1200/min', 'burst': 300},
+    'role:restaurant_owner': {'rate': '600/min', 'burst': 200},
+    'auth': {'rate': '10/min', 'burst': 10},
+    'rider_location': {'rate': '1/s', 'burst': 5},
+}
+
+# Priority load shedding (foodieasy_backend.middleware); queue latency in ms
+LOAD_SHEDDING_ENABLED = True
+LOAD_SHEDDING_THRESHOLDS_MS = {'low': 250, 'normal': 1000}
+
+# Lazy relation load detection (foodieasy_backend.lazyload): off, log or raise,
+# plus the fraction of requests sampled in log mode
+LAZY_LOAD_MODE = os.getenv('LAZY_LOAD_MODE', 'off')
+LAZY_LOAD_SAMPLE_RATE = float(os.getenv('LAZY_LOAD_SAMPLE_RATE', '0'))
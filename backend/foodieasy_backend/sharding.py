@@ -0,0 +1,453 @@
+"""
+Restaurant sharding across database aliases.
+
+Orders, order items, order outbox events and menu items live on the shard
+that owns their restaurant. Users and restaurants stay on ``default`` and
+are copied to every shard (reference tables), so joins and foreign keys
+inside a shard keep working.
+
+- ``RESTAURANT_SHARDS`` maps database aliases to stable shard numbers;
+  restaurants are placed on a consistent-hash ring over the aliases, so
+  adding a shard moves only about 1/n of them. ``RESTAURANT_SHARD_PINS``
+  places individual restaurants (e.g. a big chain on a dedicated shard).
+- ``RestaurantShardRouter`` routes sharded models by the instance they
+  belong to, otherwise by the shard activated for the current request with
+  ``use_shard()``/``ShardRoutingMixin``.
+- ``fan_out()`` evaluates a queryset on every shard and merges the rows.
+- Each shard numbers rows from ``shard number << 40`` (reserved after
+  ``migrate``), so primary keys are unique across shards and rows can move.
+- ``manage.py rebalance_shards`` moves restaurants whose shard changed.
+
+With only ``default`` configured, the default, none of this does anything.
+"""
+import bisect
+import contextvars
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from operator import attrgetter, itemgetter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+DEFAULT_VNODES = 64
+ID_RANGE_BITS = 40
+
+SHARDED_MODELS = frozenset({
+    'orders.order', 'orders.orderitem', 'orders.orderevent', 'restaurants.menuitem',
+})
+# Kept on default and copied to every shard
+REFERENCE_MODELS = ('users.customuser', 'restaurants.restaurant')
+
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+_rings = {}
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent-hash ring with ``vnodes`` points per node"""
+
+    def __init__(self, nodes, vnodes=DEFAULT_VNODES):
+        points = sorted((_hash(f'{node}#{i}'), node) for node in nodes for i in range(vnodes))
+        self.nodes = tuple(nodes)
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        if not self._nodes:
+            raise ValueError('The hash ring has no nodes')
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+def get_shards():
+    """``{alias: shard number}``"""
+    return getattr(settings, 'RESTAURANT_SHARDS', None) or {DEFAULT_DB_ALIAS: 0}
+
+
+def shard_aliases():
+    return list(get_shards())
+
+
+def is_sharded():
+    return len(get_shards()) > 1
+
+
+def get_ring():
+    nodes = tuple(sorted(get_shards()))
+    if nodes not in _rings:
+        _rings[nodes] = HashRing(nodes, getattr(settings, 'RESTAURANT_SHARD_VNODES', DEFAULT_VNODES))
+    return _rings[nodes]
+
+
+def shard_for_restaurant(restaurant_id):
+    """Alias of the shard that owns ``restaurant_id``"""
+    pinned = getattr(settings, 'RESTAURANT_SHARD_PINS', {}).get(int(restaurant_id))
+    if pinned:
+        return pinned
+    if not is_sharded():
+        return shard_aliases()[0]
+    return get_ring().node_for(int(restaurant_id))
+
+
+def current_shard():
+    """Shard activated for the current request or block, or None"""
+    return _current_shard.get()
+
+
+def activate_shard(alias):
+    """Route unhinted sharded queries to ``alias``; returns a token for ``deactivate_shard``"""
+    return _current_shard.set(alias)
+
+
+def deactivate_shard(token):
+    _current_shard.reset(token)
+
+
+@contextmanager
+def use_shard(alias):
+    token = activate_shard(alias)
+    try:
+        yield alias
+    finally:
+        deactivate_shard(token)
+
+
+def write_alias(model, **hints):
+    """Database a write of ``model`` goes to, for ``transaction.atomic(using=...)``"""
+    return router.db_for_write(model, **hints)
+
+
+class RestaurantShardRouter:
+    """Database router for ``SHARDED_MODELS``; other models use default"""
+
+    def _shard_for_instance(self, instance):
+        label = instance._meta.label_lower
+        if label == 'restaurants.restaurant':
+            return shard_for_restaurant(instance.pk) if instance.pk is not None else None
+        if label not in SHARDED_MODELS:
+            return None
+        if instance._state.db:
+            return instance._state.db
+        restaurant_id = getattr(instance, 'restaurant_id', None)
+        if restaurant_id is not None:
+            return shard_for_restaurant(restaurant_id)
+        # New order items and events follow a cached parent (e.g. item.order)
+        for field in instance._meta.concrete_fields:
+            if field.is_relation and field.is_cached(instance):
+                parent = field.get_cached_value(instance)
+                if parent is not None and parent._meta.label_lower in SHARDED_MODELS:
+                    return self._shard_for_instance(parent)
+        return None
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in SHARDED_MODELS or not is_sharded():
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            alias = self._shard_for_instance(instance)
+            if alias:
+                return alias
+        return current_shard()
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded():
+            return None
+        if model._meta.label_lower in REFERENCE_MODELS:
+            # Shard copies are read-only; saves go to default and replicate
+            return DEFAULT_DB_ALIAS
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Reference rows exist on every shard, so cross-alias relations are fine
+        if is_sharded():
+            shards = get_shards()
+            if obj1._state.db in shards and obj2._state.db in shards:
+                return True
+        return None
+
+
+class ShardedQuerySet(QuerySet):
+    """
+    QuerySet for sharded models. ``create()`` and ``bulk_create()`` on a
+    queryset without an explicit database put each row on the shard of its
+    restaurant (or parent), which the router cannot do from the model alone.
+    """
+
+    def create(self, **kwargs):
+        if self._db is not None or not is_sharded():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        return self.using(write_alias(self.model, instance=obj)).create(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None or not is_sharded():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        groups = {}
+        for obj in objs:
+            groups.setdefault(write_alias(self.model, instance=obj), []).append(obj)
+        for alias, group in groups.items():
+            self.using(alias).bulk_create(group, *args, **kwargs)
+        return objs
+
+
+def fan_out(queryset, limit=None):
+    """
+    Evaluate ``queryset`` on every shard and merge the rows in its ordering
+    (plain field orderings only). Each shard returns at most ``limit`` rows,
+    as does the result. Shards are queried in parallel, except inside a
+    transaction, whose uncommitted rows other threads could not see.
+    """
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return list(queryset.using(aliases[0])[:limit] if limit else queryset.using(aliases[0]))
+
+    def run(alias):
+        shard_queryset = queryset.using(alias)
+        return list(shard_queryset[:limit] if limit else shard_queryset)
+
+    if any(connections[alias].in_atomic_block for alias in aliases):
+        results = [run(alias) for alias in aliases]
+    else:
+        def run_in_thread(alias):
+            try:
+                return run(alias)
+            finally:
+                connections.close_all()
+        with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+            results = list(pool.map(run_in_thread, aliases))
+
+    rows = [row for result in results for row in result]
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    for field in reversed([field for field in ordering if isinstance(field, str) and field != '?']):
+        name = field.lstrip('-')
+        getter = itemgetter(name) if queryset._fields else attrgetter(name.replace('__', '.'))
+        # NULLs sort last ascending and first descending, as in PostgreSQL
+        rows.sort(
+            key=lambda row, getter=getter: (True, 0) if getter(row) is None else (False, getter(row)),
+            reverse=field.startswith('-')
+        )
+    return rows[:limit] if limit else rows
+
+
+def locate(model, pk):
+    """Alias of the shard holding ``model`` row ``pk``, or None"""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return aliases[0]
+    # Try the shard whose id range the row was created in first
+    owners = {number: alias for alias, number in get_shards().items()}
+    home = owners.get(pk >> ID_RANGE_BITS)
+    if home:
+        aliases = [home] + [alias for alias in aliases if alias != home]
+    for alias in aliases:
+        if model._base_manager.using(alias).filter(pk=pk).exists():
+            return alias
+    return None
+
+
+def reserve_id_range(model, alias):
+    """Start ``model``'s id sequence on ``alias`` at its shard's range"""
+    number = get_shards().get(alias)
+    if not number:
+        return
+    base = number << ID_RANGE_BITS
+    connection = connections[alias]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'SELECT setval(pg_get_serial_sequence(%s, %s), '
+                f'GREATEST(%s, (SELECT COALESCE(MAX({connection.ops.quote_name(model._meta.pk.column)}), 0) '
+                f'FROM {connection.ops.quote_name(table)})))',
+                [connection.ops.quote_name(table), model._meta.pk.column, base]
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s', [base, table])
+            if not cursor.rowcount:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, base])
+
+
+def sharded_models():
+    return [apps.get_model(label) for label in sorted(SHARDED_MODELS)]
+
+
+def copy_rows(model, rows, alias, overwrite=True):
+    """
+    Insert ``rows`` (``{attname: value}`` dicts) on ``alias``. Rows already
+    there are updated, or left alone with ``overwrite=False``.
+    """
+    if not rows:
+        return
+    objs = [model(**row) for row in rows]
+    manager = model._base_manager.using(alias)
+    if not overwrite:
+        manager.bulk_create(objs, ignore_conflicts=True)
+        return
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    manager.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=[model._meta.pk.name],
+        update_fields=[field.name for field in fields],
+    )
+
+
+def sync_reference_tables(batch_size=1000):
+    """Copy every reference row from default to the other shards (e.g. a new one)"""
+    targets = [alias for alias in shard_aliases() if alias != DEFAULT_DB_ALIAS]
+    copied = 0
+    for label in REFERENCE_MODELS:
+        model = apps.get_model(label)
+        last_pk = None
+        while True:
+            rows = model._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk')
+            if last_pk is not None:
+                rows = rows.filter(pk__gt=last_pk)
+            rows = list(rows.values()[:batch_size])
+            if not rows:
+                break
+            for alias in targets:
+                copy_rows(model, rows, alias)
+            copied += len(rows)
+            last_pk = rows[-1][model._meta.pk.attname]
+    return copied
+
+
+def misplaced_restaurants(restaurant_ids=None):
+    """``[(restaurant_id, source alias, target alias)]`` for rows on the wrong shard"""
+    misplaced = []
+    for alias in shard_aliases():
+        found = set()
+        for model in (apps.get_model('orders.order'), apps.get_model('restaurants.menuitem')):
+            rows = model._base_manager.using(alias)
+            if restaurant_ids:
+                rows = rows.filter(restaurant_id__in=restaurant_ids)
+            found.update(rows.order_by().values_list('restaurant_id', flat=True).distinct())
+        misplaced.extend(
+            (restaurant_id, alias, shard_for_restaurant(restaurant_id))
+            for restaurant_id in sorted(found)
+            if shard_for_restaurant(restaurant_id) != alias
+        )
+    return misplaced
+
+
+def move_restaurant(restaurant_id, source, target, batch_size=500):
+    """
+    Move a restaurant's menu items and orders (with their items and outbox
+    events) from ``source`` to ``target``; returns ``(menu items, orders)``.
+    Orders move in batches, each copied to ``target`` before it is deleted
+    from ``source``, so an interrupted move is finished by running it again.
+    Rows already on ``target`` are newer than the source copy and are kept.
+    """
+    Order = apps.get_model('orders.order')
+    OrderItem = apps.get_model('orders.orderitem')
+    OrderEvent = apps.get_model('orders.orderevent')
+    MenuItem = apps.get_model('restaurants.menuitem')
+
+    menu_items = MenuItem._base_manager.using(source).filter(restaurant_id=restaurant_id)
+    menu_rows = list(menu_items.values())
+    copy_rows(MenuItem, menu_rows, target, overwrite=False)
+
+    moved = 0
+    while True:
+        with transaction.atomic(using=source):
+            orders = Order._base_manager.using(source).filter(restaurant_id=restaurant_id)
+            ids = list(orders.order_by('id').select_for_update().values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            items = OrderItem._base_manager.using(source).filter(order_id__in=ids)
+            events = OrderEvent._base_manager.using(source).filter(order_id__in=ids)
+            with transaction.atomic(using=target):
+                copy_rows(Order, list(orders.filter(id__in=ids).values()), target, overwrite=False)
+                copy_rows(OrderItem, list(items.values()), target, overwrite=False)
+                copy_rows(OrderEvent, list(events.values()), target, overwrite=False)
+            events.delete()
+            items.delete()
+            orders.filter(id__in=ids).delete()
+        moved += len(ids)
+
+    menu_items.delete()
+    return len(menu_rows), moved
+
+
+def _row(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def _replicate_save(sender, instance, using, raw=False, **kwargs):
+    if raw or using != DEFAULT_DB_ALIAS or not is_sharded():
+        return
+    row = _row(instance)
+
+    def replicate():
+        for alias in shard_aliases():
+            if alias != DEFAULT_DB_ALIAS:
+                copy_rows(sender, [row], alias)
+    transaction.on_commit(replicate, using=using)
+
+
+def _replicate_delete(sender, instance, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not is_sharded():
+        return
+    pk = instance.pk
+
+    def replicate():
+        for alias in shard_aliases():
+            if alias != DEFAULT_DB_ALIAS:
+                sender._base_manager.using(alias).filter(pk=pk).delete()
+    transaction.on_commit(replicate, using=using)
+
+
+def _reserve_after_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    for model in sender.get_models():
+        if model._meta.label_lower in SHARDED_MODELS:
+            reserve_id_range(model, using)
+
+
+def connect_signals():
+    """Copy reference rows to shards on save/delete; reserve id ranges after migrate"""
+    for label in REFERENCE_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(_replicate_save, sender=model, dispatch_uid=f'shard-replicate-save:{label}')
+        post_delete.connect(_replicate_delete, sender=model, dispatch_uid=f'shard-replicate-delete:{label}')
+    post_migrate.connect(_reserve_after_migrate, dispatch_uid='shard-reserve-id-ranges')
+
+
+class ShardRoutingMixin:
+    """
+    APIView mixin that activates ``get_shard(request)`` for the request, so
+    unhinted queries on sharded models go to that shard. List it after
+    ConditionalResponseMixin so validators run on the shard too.
+    """
+
+    def get_shard(self, request):
+        """Alias for this request's restaurant-scoped queries, or None"""
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        self._shard_token = None
+        super().initial(request, *args, **kwargs)
+        if is_sharded():
+            alias = self.get_shard(request)
+            if alias:
+                self._shard_token = activate_shard(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, '_shard_token', None) is not None:
+            deactivate_shard(self._shard_token)
+            self._shard_token = None
+        return response
@@ -0,0 +1,18 @@
+"""
+Settings for the test suite: the regular settings plus two SQLite shard
+databases, so the sharding tests have somewhere to put rows.
+
+``RESTAURANT_SHARDS`` is left unsharded; tests that need shards enable them
+with ``override_settings``. Run the suite with
+``python manage.py test --settings=foodieasy_backend.test_settings``
+(pytest picks this module up from pytest.ini).
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+
+for _alias in ('shard_1', 'shard_2'):
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'var' / f'{_alias}.sqlite3',
+    }
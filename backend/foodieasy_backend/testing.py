@@ -0,0 +1,279 @@
+"""
+Query-count scaling assertions for tests.
+
+``assertQueriesDoNotScale`` runs the same code against growing fixture
+sizes (1, 10, 100 rows by default), each inside a rolled-back savepoint,
+and fails when the number of queries grows with the number of rows. The
+failure report lists the SQL fingerprints (literals replaced by ``?``)
+whose count grew, with the project stack frames that issued them, which
+points straight at the lazy relation access responsible.
+
+``list_endpoints()`` discovers every router ``list`` route and
+``ROW_FACTORIES`` knows how to create rows for each model, so every list
+endpoint can be checked without writing a test per endpoint (see
+foodieasy_backend/tests.py and the pytest plugin in
+foodieasy_backend.pytest_plugin).
+"""
+import re
+import traceback
+from collections import Counter
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APIClient
+
+from .lazyload import RAISE, strict_relations
+
+
+DEFAULT_SIZES = (1, 10, 100)
+MAX_FRAMES = 4
+
+# Fixture sizes used when none are passed; the pytest plugin can override them
+configured_sizes = DEFAULT_SIZES
+
+_SELECT_LIST = re.compile(r'^SELECT .*? FROM ', re.DOTALL)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\?|%s)(?:, ?(?:\?|%s))*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalise SQL so queries differing only in literals compare equal"""
+    sql = _SELECT_LIST.sub('SELECT ... FROM ', sql)
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _project_frames(stack):
+    """The innermost project frames of a stack, skipping this module"""
+    base_dir = str(Path(settings.BASE_DIR).resolve())
+    frames = [
+        frame for frame in stack
+        if frame.filename.startswith(base_dir)
+        and frame.filename != __file__
+        and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('manage.py')
+    ]
+    return [
+        f'{Path(frame.filename).relative_to(base_dir)}:{frame.lineno} in {frame.name}'
+        for frame in frames[-MAX_FRAMES:]
+    ]
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that records SQL and where it came from"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, _project_frames(traceback.extract_stack()[:-1])))
+        return execute(sql, params, many, context)
+
+    @property
+    def fingerprints(self):
+        return Counter(fingerprint(sql) for sql, _ in self.queries)
+
+    def frames_for(self, query_fingerprint):
+        for sql, frames in self.queries:
+            if fingerprint(sql) == query_fingerprint:
+                return frames
+        return []
+
+
+def record_queries(func):
+    """Run ``func()`` and return the QueryRecorder of the queries it issued"""
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        func()
+    return recorder
+
+
+def scaling_report(recorders):
+    """Explain which fingerprints grew between the smallest and largest size"""
+    sizes = sorted(recorders)
+    small, large = recorders[sizes[0]], recorders[sizes[-1]]
+    counts = ', '.join(f'N={size}: {len(recorders[size].queries)}' for size in sizes)
+    lines = [f'Query count grows with N ({counts}).', 'Fingerprints that scale:']
+
+    small_counts = small.fingerprints
+    for query_fingerprint, count in large.fingerprints.most_common():
+        if count <= small_counts.get(query_fingerprint, 0):
+            continue
+        lines.append(f'  {small_counts.get(query_fingerprint, 0)} -> {count}  {query_fingerprint[:300]}')
+        for frame in large.frames_for(query_fingerprint):
+            lines.append(f'        at {frame}')
+    return '\n'.join(lines)
+
+
+def check_queries_do_not_scale(setup, run, sizes=None, slack=0):
+    """
+    Call ``setup(n)`` then ``run()`` for each size inside a savepoint that is
+    rolled back afterwards. Raises AssertionError with a report when the
+    largest size issues more than ``slack`` queries over the smallest.
+    Throttling is disabled and the cache cleared so every run does real work.
+    """
+    sizes = sizes or configured_sizes
+    recorders = {}
+    with override_settings(THROTTLE_BUCKETS={}):
+        for size in sizes:
+            with transaction.atomic():
+                setup(size)
+                cache.clear()
+                recorders[size] = record_queries(run)
+                transaction.set_rollback(True)
+
+    smallest, largest = min(sizes), max(sizes)
+    if len(recorders[largest].queries) > len(recorders[smallest].queries) + slack:
+        raise AssertionError(scaling_report(recorders))
+    return recorders
+
+
+class QueryScalingMixin:
+    """TestCase mixin exposing ``assertQueriesDoNotScale``"""
+    scaling_sizes = None
+
+    def assertQueriesDoNotScale(self, setup, run, sizes=None, slack=0):
+        try:
+            return check_queries_do_not_scale(setup, run, sizes or self.scaling_sizes, slack)
+        except AssertionError as exc:
+            self.fail(str(exc))
+
+
+# Fixture factories -------------------------------------------------------
+
+def _users(role, count, prefix):
+    User = get_user_model()
+    # No password hashing: these users never log in
+    return User.objects.bulk_create([
+        User(email=f'{prefix}{i}@scaling.test', role=role, first_name=prefix, last_name=str(i))
+        for i in range(count)
+    ])
+
+
+def make_restaurants(n):
+    """n restaurants, each with its own owner, two menu items and an estimate"""
+    from orders.models import DeliveryEstimate
+    from restaurants.models import Restaurant, MenuItem
+
+    owners = _users('RESTAURANT_OWNER', n, 'owner')
+    restaurants = Restaurant.objects.bulk_create([
+        Restaurant(owner=owner, name=f'Restaurant {i}', address='1 Main St', phone_number='0')
+        for i, owner in enumerate(owners)
+    ])
+    MenuItem.objects.bulk_create([
+        MenuItem(restaurant=restaurant, name=f'Item {j}', price=Decimal('9.50'))
+        for restaurant in restaurants
+        for j in range(2)
+    ])
+    DeliveryEstimate.objects.bulk_create([
+        DeliveryEstimate(restaurant=restaurant) for restaurant in restaurants
+    ])
+    return restaurants
+
+
+def make_menu_items(n):
+    """n menu items spread over restaurants of their own"""
+    from restaurants.models import MenuItem
+
+    restaurants = make_restaurants(max(1, n // 10))
+    return MenuItem.objects.bulk_create([
+        MenuItem(restaurant=restaurants[i % len(restaurants)], name=f'Extra {i}', price=Decimal('4.00'))
+        for i in range(n)
+    ])
+
+
+def make_orders(n):
+    """n orders with distinct customers, riders and restaurants, two items each"""
+    from orders.models import Order, OrderItem
+
+    restaurants = make_restaurants(n)
+    customers = _users('CUSTOMER', n, 'customer')
+    riders = _users('RIDER', n, 'rider')
+    orders = Order.objects.bulk_create([
+        Order(
+            customer=customers[i], restaurant=restaurants[i], rider=riders[i],
+            status='OUT_FOR_DELIVERY', total_amount=Decimal('19.00'), delivery_address='2 High St'
+        )
+        for i in range(n)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, menu_item=menu_item, menu_item_name=menu_item.name,
+            menu_item_category=menu_item.category, quantity=1, price_at_order=menu_item.price
+        )
+        for order in orders
+        for menu_item in order.restaurant.menu_items.all()
+    ])
+    return orders
+
+
+# Model label -> (row factory, role of the user making the request or None for anonymous)
+ROW_FACTORIES = {
+    'restaurants.restaurant': (make_restaurants, None),
+    'restaurants.menuitem': (make_menu_items, None),
+    'orders.order': (make_orders, 'ADMIN'),
+}
+
+
+# List endpoint discovery ---------------------------------------------------
+
+def _walk(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            yield route, pattern
+
+
+def list_endpoints():
+    """
+    ``[(name, path, viewset class)]`` for every router ``list`` route that
+    takes no URL arguments (format-suffix variants are skipped).
+    """
+    endpoints = []
+    for route, pattern in _walk(get_resolver().url_patterns):
+        callback = pattern.callback
+        actions = getattr(callback, 'actions', None) or {}
+        if actions.get('get') != 'list' or '(?P<' in route:
+            continue
+        path = '/' + route.replace('^', '').replace('$', '')
+        endpoints.append((pattern.name, path, callback.cls))
+    return endpoints
+
+
+def check_list_endpoint(path, viewset, sizes=None, slack=0):
+    """
+    Assert GET ``path`` issues the same number of queries for every size.
+    Runs in strict mode, so a lazy relation load fails at the line responsible.
+    """
+    model = viewset.queryset.model
+    try:
+        factory, role = ROW_FACTORIES[model._meta.label_lower]
+    except KeyError:
+        raise AssertionError(
+            f'No row factory for {model._meta.label}; add one to ROW_FACTORIES '
+            f'in foodieasy_backend.testing so {path} is covered.'
+        )
+
+    client = APIClient()
+    if role:
+        user = _users(role, 1, f'{role.lower()}-viewer')[0]
+        client.force_authenticate(user)
+
+    def run():
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+
+    with strict_relations(RAISE):
+        return check_queries_do_not_scale(factory, run, sizes, slack)
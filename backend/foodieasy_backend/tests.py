@@ -0,0 +1,512 @@
+import csv
+import gzip
+import json
+import os
+from contextlib import ExitStack
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from orders.admin import OrderAdmin
+from orders.models import Order
+from orders.tasks import export_orders
+from restaurants.models import MenuItem, Restaurant
+from users.admin import CustomUserAdmin
+from .admin_performance import DrilldownQuerySet, EstimatedCountPaginator
+from .lazyload import LOG, LazyLoadError, lazy_load_counts, strict_relations
+from .middleware import CompressionMiddleware, LoadSheddingMiddleware, brotli, choose_encoding
+from .renderers import FastJSONParser, FastJSONRenderer
+from .sharding import (
+    HashRing, RestaurantShardRouter, fan_out, is_sharded, locate, reserve_id_range,
+    shard_for_restaurant, sharded_models, use_shard,
+)
+from .testing import check_list_endpoint, list_endpoints, make_orders
+from .throttling import AuthThrottle
+
+
+class ListEndpointQueryScalingTests(TestCase):
+    """
+    Every router ``list`` endpoint must issue the same number of queries for
+    1, 10 and 100 rows. Test methods are generated from the URLconf, so new
+    list endpoints are covered automatically.
+    """
+
+
+def _scaling_test(path, viewset):
+    def test(self):
+        try:
+            check_list_endpoint(path, viewset)
+        except AssertionError as exc:
+            self.fail(str(exc))
+    test.__doc__ = f'GET {path} does not scale its query count with N'
+    return test
+
+
+for _name, _path, _viewset in list_endpoints():
+    setattr(
+        ListEndpointQueryScalingTests,
+        f"test_{_name.replace('-', '_')}_queries_do_not_scale",
+        _scaling_test(_path, _viewset)
+    )
+
+
+class LazyLoadDetectionTests(TestCase):
+    """Strict mode reports implicit relation queries with their call site"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        make_orders(2)
+    
+    def test_lazy_foreign_key_raises_in_strict_mode(self):
+        order = Order.objects.first()
+        with strict_relations():
+            with self.assertRaisesMessage(LazyLoadError, 'Order.customer at foodieasy_backend/tests.py'):
+                order.customer
+    
+    def test_selected_and_prefetched_relations_are_allowed(self):
+        with strict_relations():
+            for order in Order.objects.select_related('customer').prefetch_related('items__menu_item'):
+                order.customer.email
+                [item.menu_item.name for item in order.items.all()]
+    
+    def test_reverse_one_to_one_and_deferred_fields_are_detected(self):
+        order = Order.objects.select_related('restaurant').only('id', 'restaurant__name').first()
+        with strict_relations():
+            with self.assertRaisesMessage(LazyLoadError, 'Restaurant.delivery_estimate'):
+                order.restaurant.delivery_estimate
+            with self.assertRaisesMessage(LazyLoadError, 'Order.status (deferred)'):
+                order.status
+    
+    def test_log_mode_counts_per_call_site(self):
+        before = lazy_load_counts()
+        with strict_relations(LOG), self.assertLogs('foodieasy_backend.lazyload', 'WARNING'):
+            for order in Order.objects.all():
+                order.restaurant
+        
+        new = {key: count - before.get(key, 0) for key, count in lazy_load_counts().items()
+               if count != before.get(key, 0)}
+        [((relation, site), count)] = new.items()
+        self.assertEqual(relation, 'Order.restaurant')
+        self.assertIn('in test_log_mode_counts_per_call_site', site)
+        self.assertEqual(count, 2)
+
+
+THREE_SHARDS = {'default': 0, 'shard_1': 1, 'shard_2': 2}
+
+
+class HashRingTests(SimpleTestCase):
+    """Restaurant placement on the consistent-hash ring"""
+    
+    def test_placement_is_stable_and_balanced(self):
+        ring = HashRing(['a', 'b', 'c'])
+        placement = [ring.node_for(key) for key in range(3000)]
+        self.assertEqual(placement, [HashRing(['c', 'b', 'a']).node_for(key) for key in range(3000)])
+        for node in 'abc':
+            self.assertGreater(placement.count(node), 600)
+    
+    def test_adding_a_node_moves_about_one_in_n_keys(self):
+        before, after = HashRing(['a', 'b', 'c']), HashRing(['a', 'b', 'c', 'd'])
+        moved = [key for key in range(3000) if before.node_for(key) != after.node_for(key)]
+        self.assertLess(len(moved), 3000 * 0.35)
+        self.assertTrue(all(after.node_for(key) == 'd' for key in moved))
+    
+    @override_settings(RESTAURANT_SHARDS=THREE_SHARDS, RESTAURANT_SHARD_PINS={7: 'shard_2'})
+    def test_pins_override_the_ring(self):
+        self.assertEqual(shard_for_restaurant(7), 'shard_2')
+        self.assertIn(shard_for_restaurant(8), THREE_SHARDS)
+    
+    @override_settings(RESTAURANT_SHARDS={'default': 0})
+    def test_unsharded_everything_is_on_default(self):
+        self.assertEqual(shard_for_restaurant(123), 'default')
+
+
+@override_settings(RESTAURANT_SHARDS=THREE_SHARDS)
+class RestaurantShardRouterTests(SimpleTestCase):
+    
+    def setUp(self):
+        self.router = RestaurantShardRouter()
+    
+    def test_rows_follow_their_restaurant(self):
+        menu_item = MenuItem(restaurant_id=42)
+        self.assertEqual(self.router.db_for_write(MenuItem, instance=menu_item), shard_for_restaurant(42))
+        order = Order(restaurant_id=42)
+        self.assertEqual(self.router.db_for_read(Order, instance=order), shard_for_restaurant(42))
+    
+    def test_unhinted_queries_use_the_active_shard(self):
+        self.assertIsNone(self.router.db_for_read(Order))
+        with use_shard('shard_1'):
+            self.assertEqual(self.router.db_for_read(Order), 'shard_1')
+            # Reference tables are written on default only
+            self.assertEqual(self.router.db_for_write(Restaurant), 'default')
+            self.assertIsNone(self.router.db_for_read(Restaurant))
+
+
+@skipUnless(set(THREE_SHARDS) <= set(connections), 'needs foodieasy_backend.test_settings')
+@override_settings(RESTAURANT_SHARDS=THREE_SHARDS)
+class ShardedOrderTests(TestCase):
+    """Runs on the SQLite shard databases of foodieasy_backend.test_settings"""
+    databases = '__all__'
+    
+    def setUp(self):
+        # Test databases are migrated before the shards are switched on
+        for alias in THREE_SHARDS:
+            for model in sharded_models():
+                reserve_id_range(model, alias)
+        
+        User = get_user_model()
+        # Saved one by one so the users and restaurants are copied to every shard
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer = User.objects.create_user(email='customer@sharded.test', role='CUSTOMER')
+            self.admin = User.objects.create_user(email='admin@sharded.test', role='ADMIN')
+            self.rider = User.objects.create_user(email='rider@sharded.test', role='RIDER')
+            self.restaurants = [
+                Restaurant.objects.create(
+                    owner=User.objects.create_user(email=f'owner{i}@sharded.test', role='RESTAURANT_OWNER'),
+                    name=f'Restaurant {i}', address='1 Main St', phone_number='0'
+                )
+                for i in range(6)
+            ]
+    
+    def place_orders(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        for restaurant in self.restaurants:
+            menu_item = MenuItem.objects.create(restaurant=restaurant, name='Item', price='9.50')
+            response = client.post('/api/orders/', {
+                'restaurant': restaurant.id,
+                'delivery_address': '2 High St',
+                'items': [{'menu_item': menu_item.id, 'quantity': 1}],
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+        return fan_out(Order.objects.filter(customer=self.customer))
+    
+    def test_orders_are_created_and_found_on_their_restaurants_shard(self):
+        orders = self.place_orders()
+        self.assertTrue(is_sharded())
+        self.assertEqual(len(orders), 6)
+        for order in orders:
+            self.assertEqual(order._state.db, shard_for_restaurant(order.restaurant_id))
+            self.assertEqual(locate(Order, order.id), order._state.db)
+        
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.get('/api/orders/')
+        self.assertEqual([row['id'] for row in response.data], [order.id for order in orders])
+        
+        self.assertIsNone(locate(Order, 'abc'))
+        self.assertEqual(client.get('/api/orders/abc/').status_code, 404)
+    
+    def test_exports_read_every_shard(self):
+        orders = self.place_orders()
+        self.assertGreater(len({order._state.db for order in orders}), 1)
+        all_ids = sorted(order.id for order in orders)
+        
+        def exported_ids(content):
+            return [int(row['order_id']) for row in csv.DictReader(StringIO(content))]
+        
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/orders/export/')
+        self.assertEqual(exported_ids(b''.join(response.streaming_content).decode()), all_ids)
+        
+        # The owner's restaurant on a shard other than default
+        order = next(order for order in orders if order._state.db != 'default')
+        client.force_authenticate(order.restaurant.owner)
+        response = client.get('/api/orders/export/?file_format=ndjson')
+        documents = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([document['order_id'] for document in documents], [order.id])
+        
+        with TemporaryDirectory() as directory:
+            command_path = os.path.join(directory, 'command.csv')
+            call_command('export_orders', output=command_path, stderr=StringIO())
+            task_path = os.path.join(directory, 'task.csv')
+            export_orders(task_path)
+            for path in (command_path, task_path):
+                with open(path, encoding='utf-8', newline='') as exported:
+                    self.assertEqual(exported_ids(exported.read()), all_ids)
+
+    
+    def test_rider_summaries_add_up_every_shard(self):
+        orders = self.place_orders()
+        active = orders.pop()
+        self.assertGreater(len({order._state.db for order in orders}), 1)
+        now = timezone.now()
+        for minutes, order in enumerate(orders, start=1):
+            Order.objects.using(order._state.db).filter(pk=order.pk).update(
+                rider=self.rider, status='DELIVERED',
+                picked_up_at=now - timedelta(minutes=minutes * 10), delivered_at=now
+            )
+        Order.objects.using(active._state.db).filter(pk=active.pk).update(
+            rider=self.rider, status='OUT_FOR_DELIVERY', picked_up_at=now
+        )
+        
+        client = APIClient()
+        client.force_authenticate(self.rider)
+        summary = client.get('/api/orders/rider_summary/').data
+        self.assertEqual(summary['today']['deliveries'], 5)
+        self.assertEqual(summary['today']['delivered_value'], '47.50')
+        self.assertEqual(summary['totals']['deliveries'], 5)
+        self.assertEqual(summary['totals']['average_delivery_minutes'], 30.0)
+        self.assertEqual(summary['active_job']['order_id'], active.id)
+    
+    def test_catalogue_counts_menu_items_once_per_shard(self):
+        for count, restaurant in enumerate(self.restaurants):
+            MenuItem.objects.bulk_create([
+                MenuItem(restaurant=restaurant, name=f'Item {i}', price='9.50') for i in range(count)
+            ])
+        with ExitStack() as stack:
+            queries = {
+                alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in THREE_SHARDS
+            }
+            response = APIClient().get('/api/restaurants/')
+        
+        self.assertEqual(
+            {row['name']: row['menu_items_count'] for row in response.data},
+            {restaurant.name: count for count, restaurant in enumerate(self.restaurants)}
+        )
+        for alias, captured in queries.items():
+            # Besides the ETag's MAX(updated_at), one grouped count at most
+            counts = [
+                query['sql'] for query in captured.captured_queries
+                if 'restaurants_menuitem' in query['sql'] and 'MAX(' not in query['sql']
+            ]
+            self.assertLessEqual(len(counts), 1, alias)
+
+class FastJSONRendererTests(SimpleTestCase):
+    """orjson output and parsing must match DRF's stdlib implementations"""
+    
+    payload = {
+        'created_at': datetime(2025, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc),
+        'local': datetime(2025, 1, 2, 3, 4, 5, tzinfo=ZoneInfo('Asia/Kathmandu')),
+        'naive': datetime(2025, 1, 2, 3, 4, 5, 120),
+        'day': date(2025, 1, 2),
+        'opens_at': time(9, 30, 0, 4500),
+        'duration': timedelta(minutes=35),
+        'total': Decimal('19.50'),
+        'token': UUID('12345678-1234-5678-1234-567812345678'),
+        'label': gettext_lazy('Pending'),
+        'text': 'line\u2028separator \u00e9',
+        'nested': [{1: None}, (True, 1.5)],
+    }
+    
+    def test_output_matches_drf_byte_for_byte(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+    
+    def test_indented_output_is_equivalent(self):
+        context = {'indent': 2}
+        rendered = FastJSONRenderer().render(self.payload, 'application/json', context)
+        self.assertIn(b'\n  "created_at"', rendered)
+        self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render(self.payload)))
+    
+    def test_parser_matches_drf(self):
+        body = '{"price": 9.5, "name": "Crème", "ids": [1, 2]}'.encode()
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body))
+        )
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"price": '))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Brotli or gzip negotiated from Accept-Encoding"""
+    
+    body = b'{"restaurants": [' + b'{"name": "Noodle Bar"}, ' * 50 + b'{}]}'
+    
+    def compress(self, accept_encoding, response=None):
+        response = response or HttpResponse(self.body, content_type='application/json')
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+    
+    def test_encoding_follows_preferences_and_q_values(self):
+        candidates = ('br', 'gzip')
+        self.assertEqual(choose_encoding('gzip, deflate, br', candidates), 'br')
+        self.assertEqual(choose_encoding('br;q=0.5, gzip', candidates), 'gzip')
+        self.assertEqual(choose_encoding('*;q=0.1', candidates), 'br')
+        self.assertIsNone(choose_encoding('identity, br;q=0, gzip;q=0', candidates))
+    
+    def test_gzip_bodies_decode_to_the_original(self):
+        response = self.compress('gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+    
+    @skipUnless(brotli, 'needs the brotli package')
+    def test_brotli_is_preferred_when_accepted(self):
+        response = self.compress('gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.body)
+    
+    def test_etags_become_weak(self):
+        response = HttpResponse(self.body, content_type='application/json')
+        response['ETag'] = '"abc"'
+        self.assertEqual(self.compress('gzip', response)['ETag'], 'W/"abc"')
+    
+    def test_small_binary_and_encoded_responses_are_left_alone(self):
+        small = HttpResponse(b'{}', content_type='application/json')
+        image = HttpResponse(self.body, content_type='image/png')
+        encoded = HttpResponse(self.body, content_type='application/json')
+        encoded['Content-Encoding'] = 'gzip'
+        for response in (small, image, encoded):
+            with self.subTest(content_type=response['Content-Type']):
+                self.assertIs(self.compress('br, gzip', response).content, response.content)
+        self.assertFalse(self.compress('identity').has_header('Content-Encoding'))
+    
+    def test_streaming_responses_are_gzipped_chunk_by_chunk(self):
+        lines = [b'{"order_id": %d}\n' % number for number in range(200)]
+        response = StreamingHttpResponse(iter(lines), content_type='application/x-ndjson')
+        response = self.compress('br, gzip', response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(lines))
+
+
+class ClientIdentTests(SimpleTestCase):
+    """IP-keyed throttles cannot be dodged with a forged X-Forwarded-For"""
+    
+    def ident(self, forwarded_for):
+        request = RequestFactory().post(
+            '/api/users/auth/login/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded_for
+        )
+        return AuthThrottle().get_ident(request)
+    
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        self.assertEqual(self.ident('1.2.3.4'), '10.0.0.1')
+    
+    def test_the_entry_added_by_the_proxy_is_used_behind_one(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            self.assertEqual(self.ident('1.2.3.4, 203.0.113.9'), '203.0.113.9')
+
+
+@override_settings(LOAD_SHEDDING_THRESHOLDS_MS={'low': 250, 'normal': 1000})
+class LoadSheddingTests(SimpleTestCase):
+    """Priorities are assigned from verified credentials, not their presence"""
+    
+    def setUp(self):
+        self.middleware = LoadSheddingMiddleware(lambda request: HttpResponse('ok'))
+        token = AccessToken()
+        token['user_id'] = 1
+        self.valid = f'Bearer {token}'
+    
+    def status_at(self, latency_ms, method, path, authorization=None):
+        self.middleware.monitor.value = latency_ms
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        request = getattr(RequestFactory(), method.lower())(path, **headers)
+        return self.middleware(request).status_code
+    
+    def test_orders_are_critical_only_for_authenticated_requests(self):
+        self.assertEqual(self.status_at(5000, 'POST', '/api/orders/', self.valid), 200)
+        self.assertEqual(self.status_at(5000, 'POST', '/api/orders/'), 503)
+        self.assertEqual(self.status_at(5000, 'POST', '/api/orders/', 'Bearer forged'), 503)
+    
+    def test_forged_credentials_are_low_priority(self):
+        self.assertEqual(self.status_at(500, 'GET', '/api/restaurants/', self.valid), 200)
+        self.assertEqual(self.status_at(500, 'GET', '/api/restaurants/', 'Bearer forged'), 503)
+        self.assertEqual(self.status_at(500, 'GET', '/api/restaurants/', 'Basic abc'), 503)
+        # Logging in needs no credentials
+        self.assertEqual(self.status_at(500, 'POST', '/api/users/auth/login/'), 200)
+    
+    def test_nothing_is_classified_below_the_lowest_threshold(self):
+        with mock.patch.object(self.middleware, 'priority') as priority:
+            self.assertEqual(self.status_at(100, 'GET', '/api/restaurants/'), 200)
+        priority.assert_not_called()
+
+
+class LargeTableAdminTests(TestCase):
+    """Changelist counts, date drilldowns and index-friendly search"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = [
+            User.objects.create_user(
+                email=email, first_name=first_name, last_name=last_name, phone_number=phone,
+                date_joined=datetime(2025, month, day, 12, tzinfo=dt_timezone.utc)
+            )
+            for email, first_name, last_name, phone, month, day in [
+                ('ada@example.com', 'Ada', 'Lovelace', '9801000000', 1, 15),
+                ('alan@example.com', 'Alan', 'Turing', '9802000000', 4, 2),
+                ('grace@example.com', 'Grace', 'Hopper', '9801999999', 4, 20),
+            ]
+        ]
+    
+    def search(self, term, model_admin=None):
+        model_admin = model_admin or CustomUserAdmin(get_user_model(), admin.site)
+        results, may_have_duplicates = model_admin.get_search_results(
+            RequestFactory().get('/admin/'), model_admin.model.objects.all(), term
+        )
+        self.assertFalse(may_have_duplicates)
+        return results
+    
+    def test_prefix_search_covers_names_and_phone_numbers(self):
+        for term, expected in [
+            ('ada@', [0]), ('lovel', [0]), ('al', [1]), ('Gra', [2]),
+            ('hopper', [2]), ('9801', [0, 2]), (str(self.users[1].id), [1]), ('ring', []),
+        ]:
+            with self.subTest(term=term):
+                self.assertEqual(
+                    sorted(self.search(term).values_list('id', flat=True)),
+                    [self.users[index].id for index in expected]
+                )
+    
+    def test_related_prefixes_are_resolved_to_ids_first(self):
+        order_admin = OrderAdmin(Order, admin.site)
+        customer = self.users[0]
+        restaurant = Restaurant.objects.create(
+            owner=self.users[1], name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        order = Order.objects.create(
+            customer=customer, restaurant=restaurant, total_amount='9.50', delivery_address='2 High St'
+        )
+        with CaptureQueriesContext(connections['default']) as queries:
+            results = list(self.search('noodle', order_admin))
+        self.assertEqual(results, [order])
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+        self.assertEqual(list(self.search('ada', order_admin)), [order])
+    
+    def test_drilldown_lists_periods_between_min_and_max(self):
+        queryset = get_user_model().objects.all()
+        queryset.__class__ = DrilldownQuerySet
+        self.assertEqual(
+            queryset.dates('date_joined', 'month'),
+            [date(2025, month, 1) for month in (1, 2, 3, 4)]
+        )
+        self.assertEqual(queryset.dates('date_joined', 'year'), [date(2025, 1, 1)])
+        april = queryset.filter(date_joined__month=4)
+        self.assertEqual(
+            april.datetimes('date_joined', 'day'),
+            [datetime(2025, 4, day) for day in range(2, 21)]
+        )
+        self.assertEqual(queryset.none().dates('date_joined', 'month'), [])
+    
+    def test_large_unfiltered_counts_use_the_estimate(self):
+        users = get_user_model().objects.order_by('-date_joined')
+        with mock.patch('foodieasy_backend.admin_performance.estimated_row_count', return_value=250000):
+            with self.assertNumQueries(0):
+                self.assertEqual(EstimatedCountPaginator(users, 100).count, 250000)
+            self.assertEqual(EstimatedCountPaginator(users.filter(first_name='Ada'), 100).count, 1)
+        with mock.patch('foodieasy_backend.admin_performance.estimated_row_count', return_value=500):
+            self.assertEqual(EstimatedCountPaginator(users, 100).count, 3)
+        with mock.patch('foodieasy_backend.admin_performance.estimated_row_count', return_value=None):
+            self.assertEqual(EstimatedCountPaginator(users, 100).count, 3)
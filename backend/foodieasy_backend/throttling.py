@@ -0,0 +1,187 @@
+"""
+Token-bucket throttles for DRF.
+
+Each budget (``scope``) is a bucket that refills at ``rate`` and holds at
+most ``burst`` tokens; a request spends one token. Budgets are configured
+in ``THROTTLE_BUCKETS``:
+
+- ``anon``: unauthenticated requests, per client IP (``REMOTE_ADDR``, or
+  the ``X-Forwarded-For`` entry added by the last of DRF's ``NUM_PROXIES``)
+- ``user`` / ``role:<role>``: authenticated requests, per user, with an
+  optional per-role override (e.g. ``role:rider``)
+- named scopes (``auth``, ``rider_location``) for specific endpoints
+
+Buckets live in the store named by ``THROTTLE_BUCKET_STORE``: the default
+``LocalBucketStore`` is exact but per process; ``CacheBucketStore`` shares
+buckets across processes through a Django cache (Redis, Memcached).
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+
+DEFAULT_BUCKET_STORE = 'foodieasy_backend.throttling.LocalBucketStore'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'120/min' -> tokens per second; the period's first letter is used, as in DRF"""
+    count, period = rate.split('/')
+    return int(count) / PERIODS[period.strip()[0].lower()]
+
+
+def _refill(state, rate, burst, now):
+    tokens, updated = state[:2] if state else (burst, now)
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+class LocalBucketStore:
+    """In-process buckets guarded by a lock; each server process has its own budget"""
+    max_buckets = 100000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst, now):
+        """Spend one token. Returns ``(allowed, seconds_until_next_token)``"""
+        with self._lock:
+            tokens = _refill(self._buckets.get(key), rate, burst, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Remember when the bucket will be full again, for pruning
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self._buckets) > self.max_buckets:
+                self._prune(now)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no information
+        for key, (_, _, full_at) in list(self._buckets.items()):
+            if full_at <= now:
+                del self._buckets[key]
+
+
+class CacheBucketStore:
+    """
+    Buckets in the ``THROTTLE_CACHE`` cache, shared by every process. The
+    read-modify-write is not atomic, so simultaneous requests from one
+    client can overspend by a token or two.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+    def consume(self, key, rate, burst, now):
+        tokens = _refill(self.cache.get(key), rate, burst, now)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # A bucket left alone for this long is full again and can expire
+        self.cache.set(key, (tokens, now), math.ceil(burst / rate) + 1)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = getattr(settings, 'THROTTLE_BUCKET_STORE', DEFAULT_BUCKET_STORE)
+                _store = import_string(path)()
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class; subclasses choose the bucket with ``get_bucket``"""
+    scope = None
+
+    def get_bucket(self, request, view):
+        """Return ``(scope, ident)`` or None to skip throttling this request"""
+        raise NotImplementedError
+
+    def get_budget(self, scope):
+        config = getattr(settings, 'THROTTLE_BUCKETS', {}).get(scope)
+        if not config:
+            return None
+        return parse_rate(config['rate']), config['burst']
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        bucket = self.get_bucket(request, view)
+        if bucket is None:
+            return True
+        scope, ident = bucket
+        budget = self.get_budget(scope)
+        if budget is None:
+            return True
+
+        allowed, retry_after = get_bucket_store().consume(
+            f'throttle:{scope}:{ident}', *budget, time.time()
+        )
+        if not allowed:
+            self.retry_after = retry_after
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonBucketThrottle(TokenBucketThrottle):
+    """Per-IP budget for unauthenticated requests"""
+    scope = 'anon'
+
+    def get_bucket(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.scope, self.get_ident(request)
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    """Per-user budget, using ``role:<role>`` when that scope is configured"""
+    scope = 'user'
+
+    def get_bucket(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return None
+        role_scope = f'role:{user.role.lower()}'
+        if role_scope in getattr(settings, 'THROTTLE_BUCKETS', {}):
+            return role_scope, user.pk
+        return self.scope, user.pk
+
+
+class ScopedBucketThrottle(TokenBucketThrottle):
+    """Budget named by ``scope`` (or the view's ``throttle_scope``), per user or IP"""
+
+    def get_bucket(self, request, view):
+        scope = self.scope or getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return None
+        user = request.user
+        if user and user.is_authenticated:
+            return scope, f'user:{user.pk}'
+        return scope, f'ip:{self.get_ident(request)}'
+
+
+class AuthThrottle(ScopedBucketThrottle):
+    """Register/login attempts, always per IP so credential stuffing is bounded"""
+    scope = 'auth'
+
+    def get_bucket(self, request, view):
+        return self.scope, self.get_ident(request)
+
+
+class RiderLocationThrottle(ScopedBucketThrottle):
+    """High-frequency rider location pings get their own budget"""
+    scope = 'rider_location'
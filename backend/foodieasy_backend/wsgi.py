@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodieasy_backend.settings')
 
 application = get_wsgi_application()
+
+# Warm the catalogue cache in the background (WARM_CACHES_ON_STARTUP)
+from restaurants.cache import start_background_warmup  # noqa: E402
+start_background_warmup()
@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Admin configuration for Job"""
+    list_display = ['id', 'name', 'status', 'run_at', 'attempts', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'unique_key']
+    readonly_fields = ['created_at', 'finished_at', 'locked_at', 'locked_by', 'last_error']
+    ordering = ['-id']
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Delete succeeded and failed jobs older than JOBS_RETENTION in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Keep finished jobs this many days (default: JOBS_RETENTION)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows deleted per statement (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        retention = (
+            timedelta(days=options['days']) if options['days'] is not None
+            else getattr(settings, 'JOBS_RETENTION', timedelta(days=7))
+        )
+        batch_size = options['batch_size']
+        finished = Job.objects.filter(
+            status__in=('SUCCEEDED', 'FAILED'), finished_at__lt=timezone.now() - retention
+        )
+        total = 0
+
+        while True:
+            ids = list(finished.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted, _ = Job.objects.filter(id__in=ids).delete()
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Purged {total} finished jobs.'))
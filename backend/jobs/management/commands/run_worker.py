@@ -0,0 +1,112 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.queue import claim_jobs, enqueue_periodic, execute_job, worker_id
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs on a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Jobs run at the same time (default: 4)',
+        )
+        parser.add_argument(
+            '--pool',
+            choices=['thread', 'process'],
+            default='thread',
+            help='Run jobs on threads or separate processes (default: thread)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait for new jobs when idle (default: 1.0)',
+        )
+        parser.add_argument(
+            '--lease',
+            type=int,
+            default=600,
+            help='Seconds before a RUNNING job of a dead worker is retried (default: 600)',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no jobs are due instead of polling forever',
+        )
+        parser.add_argument(
+            '--no-schedule',
+            action='store_true',
+            help='Do not queue the periodic jobs from JOBS_SCHEDULE',
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        lease = timedelta(seconds=options['lease'])
+        worker = worker_id()
+
+        if options['pool'] == 'process':
+            # Spawned children start from a fresh interpreter, so set Django
+            # up there before any job (and its models) is unpickled
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+
+        self.stdout.write(f'Worker {worker} started ({options["pool"]} pool, concurrency {concurrency})')
+        last_slots = {}
+        in_flight = set()
+        processed = 0
+
+        try:
+            while True:
+                if not options['no_schedule']:
+                    enqueue_periodic(last_slots=last_slots)
+
+                free = concurrency - len(in_flight)
+                job_ids = claim_jobs(free, lease, worker) if free else []
+                for job_id in job_ids:
+                    in_flight.add(pool.submit(execute_job, job_id))
+
+                if not in_flight:
+                    if options['burst']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, in_flight = wait(
+                    in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    try:
+                        future.result()
+                    except Exception:
+                        # execute_job records task errors itself; this is its own
+                        # bookkeeping failing (e.g. the database went away). The
+                        # job stays RUNNING and is retried when its lease expires.
+                        logger.exception('Could not record the outcome of a job')
+                        continue
+                    processed += 1
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping; waiting for running jobs to finish...')
+        finally:
+            pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Ran {processed} jobs.'))
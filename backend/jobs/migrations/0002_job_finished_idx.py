@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 20:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('status__in', ['SUCCEEDED', 'FAILED'])), fields=['finished_at'], name='job_finished_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    Job model - one deferred call of a registered task (see jobs.queue).
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100, help_text='Registered task name')
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    
+    # Scheduling and retries
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    unique_key = models.CharField(
+        max_length=200,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text='Optional de-duplication key (used for periodic jobs)'
+    )
+    
+    # Worker bookkeeping
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(
+                fields=['run_at', 'id'],
+                condition=models.Q(status='QUEUED'),
+                name='job_queued_idx'
+            ),
+            models.Index(
+                fields=['locked_at'],
+                condition=models.Q(status='RUNNING'),
+                name='job_running_idx'
+            ),
+            # purge_jobs deletes finished jobs by age
+            models.Index(
+                fields=['finished_at'],
+                condition=models.Q(status__in=['SUCCEEDED', 'FAILED']),
+                name='job_finished_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()}) #{self.id}"
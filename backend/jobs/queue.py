@@ -0,0 +1,219 @@
+"""
+Database-backed background jobs.
+
+Functions decorated with ``@task`` are registered by name; ``.delay()`` and
+``.schedule()`` insert a ``Job`` row, which commits (or rolls back) with the
+caller's transaction. The ``run_worker`` command claims due jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` (several workers can run side by side)
+and executes them on a thread or process pool. Failed jobs are retried with
+exponential backoff until ``max_attempts``; jobs whose worker died are
+reclaimed once their lease expires. Periodic jobs are configured with
+``JOBS_SCHEDULE`` and de-duplicated across workers by ``Job.unique_key``;
+finished jobs are deleted by the ``purge_jobs`` command after
+``JOBS_RETENTION``.
+
+With ``JOBS_EAGER = True`` jobs run inline, which is handy for tests and
+single-process development.
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 60 * 60
+DEFAULT_LEASE = timedelta(minutes=10)
+
+_registry = {}
+
+
+class UnknownTaskError(LookupError):
+    """Raised when a job names a task that is not registered"""
+
+
+class Task:
+    """A registered task; call it directly to run inline"""
+
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue the task to run as soon as a worker is free"""
+        return enqueue(self.name, args, kwargs)
+
+    def schedule(self, run_at, *args, **kwargs):
+        """Queue the task to run at ``run_at`` (a datetime or timedelta from now)"""
+        return enqueue(self.name, args, kwargs, run_at=run_at)
+
+
+def task(name=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register a function as a background task under ``name``"""
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[task_name] = Task(func, task_name, max_attempts)
+        return _registry[task_name]
+    return register
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise UnknownTaskError(f"No task registered as '{name}'")
+
+
+def is_eager():
+    return getattr(settings, 'JOBS_EAGER', False)
+
+
+def enqueue(name, args=(), kwargs=None, run_at=None, unique_key=None):
+    """
+    Insert a job for the registered task ``name``. Returns the Job, or None
+    when ``unique_key`` is already taken (or the job ran eagerly).
+    """
+    registered = get_task(name)
+    kwargs = kwargs or {}
+
+    if is_eager():
+        registered(*args, **kwargs)
+        return None
+
+    if isinstance(run_at, timedelta):
+        run_at = timezone.now() + run_at
+    job = Job(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        run_at=run_at or timezone.now(),
+        max_attempts=registered.max_attempts,
+        unique_key=unique_key,
+    )
+    if unique_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def enqueue_periodic(now=None, last_slots=None):
+    """
+    Queue one job per ``JOBS_SCHEDULE`` entry for the current interval.
+    Safe to call from every worker: the unique key is the task name plus the
+    interval slot, so each slot is queued once. ``last_slots`` lets a worker
+    skip entries it already queued for this slot.
+    """
+    now = now or timezone.now()
+    last_slots = {} if last_slots is None else last_slots
+    queued = []
+    for name, options in getattr(settings, 'JOBS_SCHEDULE', {}).items():
+        every = options['every'].total_seconds()
+        slot = int(now.timestamp() // every)
+        if last_slots.get(name) == slot:
+            continue
+        last_slots[name] = slot
+        job = enqueue(
+            name,
+            options.get('args', ()),
+            options.get('kwargs'),
+            unique_key=f'periodic:{name}:{slot}',
+        )
+        if job:
+            queued.append(job)
+    return queued
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_jobs(limit, lease=DEFAULT_LEASE, worker=None):
+    """
+    Mark up to ``limit`` due jobs RUNNING and return their ids. Also picks up
+    RUNNING jobs whose lease expired because their worker went away.
+
+    The attempt is counted here rather than when the job finishes, so a job
+    that kills its worker every time still runs out of attempts: once it has
+    none left, an expired lease fails it instead of running it again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Job.objects.filter(
+                Q(status='QUEUED', run_at__lte=now)
+                | Q(status='RUNNING', locked_at__lt=now - lease)
+            ).order_by('run_at', 'id').select_for_update(skip_locked=True)
+            .values_list('id', 'status', 'attempts', 'max_attempts')[:limit]
+        )
+        lost = [
+            job_id for job_id, status, attempts, max_attempts in rows
+            if status == 'RUNNING' and attempts >= max_attempts
+        ]
+        ids = [job_id for job_id, *_ in rows if job_id not in lost]
+        if lost:
+            logger.error('Jobs %s failed permanently: their worker went away', lost)
+            Job.objects.filter(id__in=lost).update(
+                status='FAILED', locked_at=None, finished_at=now,
+                last_error='Worker went away while running the job'
+            )
+        if ids:
+            Job.objects.filter(id__in=ids).update(
+                status='RUNNING', locked_at=now, locked_by=worker or worker_id(),
+                attempts=F('attempts') + 1
+            )
+    return ids
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(MAX_BACKOFF_SECONDS, 2 ** attempts))
+
+
+def execute_job(job_id):
+    """
+    Run one claimed job and record the outcome. Used by both the thread and
+    the process pool, so it only takes the job id.
+    """
+    close_old_connections()
+    try:
+        # Attempts were counted when the job was claimed
+        job = Job.objects.get(id=job_id)
+        try:
+            get_task(job.name)(*job.args, **job.kwargs)
+        except Exception as exc:
+            job.last_error = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+            if job.attempts >= job.max_attempts:
+                logger.exception('Job %s (%s) failed permanently', job.id, job.name)
+                job.status = 'FAILED'
+                job.finished_at = timezone.now()
+            else:
+                logger.warning('Job %s (%s) failed, retrying: %s', job.id, job.name, job.last_error)
+                job.status = 'QUEUED'
+                job.run_at = timezone.now() + _backoff(job.attempts)
+        else:
+            job.status = 'SUCCEEDED'
+            job.finished_at = timezone.now()
+        job.locked_at = None
+        job.save(update_fields=['status', 'run_at', 'last_error', 'locked_at', 'finished_at'])
+        return job.status
+    finally:
+        close_old_connections()
@@ -0,0 +1,11 @@
+"""
+Background tasks for the jobs app itself (run by ``manage.py run_worker``).
+"""
+from django.core.management import call_command
+
+from .queue import task
+
+
+@task('jobs.purge_jobs')
+def purge_jobs():
+    call_command('purge_jobs', verbosity=0)
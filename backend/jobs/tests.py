@@ -0,0 +1,115 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim_jobs, enqueue, enqueue_periodic, execute_job, task
+
+
+calls = []
+
+
+@task('jobs.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task('jobs.tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    """Claiming, running, retrying and purging jobs"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claimed_jobs_run_once_and_count_their_attempt(self):
+        job = enqueue('jobs.tests.record', ['a'])
+        later = enqueue('jobs.tests.record', ['b'], run_at=timedelta(hours=1))
+
+        self.assertEqual(claim_jobs(10, worker='w1'), [job.id])
+        self.assertEqual(claim_jobs(10, worker='w2'), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('RUNNING', 1, 'w1'))
+
+        self.assertEqual(execute_job(job.id), 'SUCCEEDED')
+        self.assertEqual(calls, ['a'])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'QUEUED')
+
+    def test_failures_back_off_then_fail_permanently(self):
+        job = enqueue('jobs.tests.fail')
+        claim_jobs(1)
+        before = timezone.now()
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertEqual(execute_job(job.id), 'QUEUED')
+        job.refresh_from_db()
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=2))
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        claim_jobs(1)
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(execute_job(job.id), 'FAILED')
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+
+    def test_jobs_of_a_lost_worker_are_reclaimed_until_out_of_attempts(self):
+        job = enqueue('jobs.tests.fail')
+        lease = timedelta(minutes=10)
+        claim_jobs(1, lease)
+        self.assertEqual(claim_jobs(1, lease), [])
+
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - 2 * lease)
+        self.assertEqual(claim_jobs(1, lease), [job.id])
+
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - 2 * lease)
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(claim_jobs(1, lease), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(JOBS_SCHEDULE={'jobs.tests.record': {'every': timedelta(minutes=5), 'args': ['tick']}})
+    def test_periodic_jobs_are_queued_once_per_slot(self):
+        now = timezone.now()
+        self.assertEqual(len(enqueue_periodic(now)), 1)
+        self.assertEqual(enqueue_periodic(now), [])
+        self.assertEqual(len(enqueue_periodic(now + timedelta(minutes=5))), 1)
+
+    def test_purge_deletes_only_old_finished_jobs(self):
+        old = timezone.now() - timedelta(days=30)
+        jobs = Job.objects.bulk_create([
+            Job(name='jobs.tests.record', status=job_status, finished_at=finished_at)
+            for job_status, finished_at in [
+                ('SUCCEEDED', old), ('FAILED', old), ('SUCCEEDED', timezone.now()), ('QUEUED', None),
+            ]
+        ])
+
+        call_command('purge_jobs', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            set(Job.objects.values_list('id', flat=True)), {jobs[2].id, jobs[3].id}
+        )
+
+    def test_worker_logs_bookkeeping_errors_and_keeps_going(self):
+        enqueue('jobs.tests.record', ['a'])
+        enqueue('jobs.tests.record', ['b'])
+        stdout = StringIO()
+        with mock.patch(
+            'jobs.management.commands.run_worker.execute_job', side_effect=DatabaseError('gone')
+        ), self.assertLogs('jobs.management.commands.run_worker', 'ERROR') as logs:
+            call_command('run_worker', '--burst', '--no-schedule', '--poll-interval=0.01', stdout=stdout)
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('✓ Ran 0 jobs.', stdout.getvalue())
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'RUNNING'})
@@ -1,5 +1,21 @@
 from django.contrib import admin
 from .models import Order, OrderItem
+from foodieasy_backend.admin_performance import LargeTableAdminMixin, RelatedIdFilter
+
+
+class RestaurantIdFilter(RelatedIdFilter):
+    title = 'restaurant id'
+    parameter_name = 'restaurant_id'
+
+
+class CustomerIdFilter(RelatedIdFilter):
+    title = 'customer id'
+    parameter_name = 'customer_id'
+
+
+class OrderIdFilter(RelatedIdFilter):
+    title = 'order id'
+    parameter_name = 'order_id'
 
 
 class OrderItemInline(admin.TabularInline):
@@ -8,6 +24,7 @@ class OrderItemInline(admin.TabularInline):
     """
     model = OrderItem
     extra = 0
+    raw_id_fields = ['menu_item']
     readonly_fields = ['price_at_order', 'subtotal']
     fields = ['menu_item', 'quantity', 'price_at_order', 'subtotal']
     
@@ -17,7 +34,7 @@ class OrderItemInline(admin.TabularInline):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin interface for Order model.
     """
@@ -25,8 +42,12 @@ class OrderAdmin(admin.ModelAdmin):
         'id', 'customer', 'restaurant', 'status',
         'total_amount', 'rider', 'created_at'
     ]
-    list_filter = ['status', 'created_at', 'restaurant']
-    search_fields = ['customer__email', 'restaurant__name', 'delivery_address']
+    list_filter = ['status', RestaurantIdFilter, CustomerIdFilter]
+    search_fields = ['=id', '^customer__email', '^restaurant__name']
+    search_help_text = 'Order id, or the start of a customer email or restaurant name.'
+    date_hierarchy = 'created_at'
+    raw_id_fields = ['customer', 'rider']
+    autocomplete_fields = ['restaurant']
     readonly_fields = [
         'created_at', 'prepared_at', 'picked_up_at',
         'delivered_at', 'cancelled_at', 'total_amount'
@@ -59,13 +80,16 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin interface for OrderItem model.
     """
     list_display = ['id', 'order', 'menu_item', 'quantity', 'price_at_order', 'subtotal']
-    list_filter = ['order__status', 'order__created_at']
-    search_fields = ['order__id', 'menu_item__name']
+    list_filter = ['order__status', OrderIdFilter]
+    search_fields = ['=order_id', '^menu_item__name']
+    search_help_text = 'Order id, or the start of a menu item name.'
+    date_hierarchy = 'order__created_at'
+    raw_id_fields = ['order', 'menu_item']
     readonly_fields = ['price_at_order', 'subtotal']
     
     def subtotal(self, obj):
@@ -75,4 +99,7 @@ class OrderItemAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         """Optimize queryset with select_related"""
         qs = super().get_queryset(request)
-        return qs.select_related('order', 'menu_item')
+        # Order and MenuItem __str__ read the customer and restaurant
+        return qs.select_related(
+            'order__customer', 'order__restaurant', 'menu_item__restaurant'
+        )
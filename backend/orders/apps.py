@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        # Register state machine side-effect hooks
+        from . import hooks  # noqa: F401
+        
+        # Reference-table replication and id ranges for restaurant shards
+        from foodieasy_backend.sharding import connect_signals
+        connect_signals()
@@ -0,0 +1,112 @@
+"""
+Archival of terminal orders.
+
+DELIVERED and CANCELLED orders older than a cutoff are copied into
+``ArchivedOrder``/``ArchivedOrderItem`` and deleted from the hot tables in
+small batches. Each batch is its own transaction, so the job can be stopped
+at any point and simply re-run to resume; rows already copied by an earlier
+attempt are skipped on conflict. The archive tables stay on ``default``
+when orders are sharded; each shard is archived separately.
+"""
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce, NullIf
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+
+TERMINAL_STATUSES = ('DELIVERED', 'CANCELLED')
+
+ARCHIVED_ORDER_FIELDS = [
+    'id', 'customer_id', 'restaurant_id', 'rider_id', 'status', 'total_amount',
+    'delivery_address', 'created_at', 'prepared_at', 'picked_up_at',
+    'delivered_at', 'cancelled_at', 'cancellation_reason',
+]
+
+
+def _snapshot(field):
+    """
+    The item's copy of its menu item's ``field``, or the menu item's current
+    value for items older than the copy (the menu is on the same shard here,
+    unlike the archive, so this is the last chance to join it)
+    """
+    return Coalesce(NullIf(f'menu_item_{field}', Value('')), f'menu_item__{field}', Value(''))
+
+
+def archivable_orders(cutoff, using=None):
+    """Terminal orders created before ``cutoff`` (on database ``using``)"""
+    return Order.objects.using(using).filter(status__in=TERMINAL_STATUSES, created_at__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size, using=None):
+    """
+    Move up to ``batch_size`` archivable orders from database ``using`` into
+    the archive tables. Returns the number of orders moved (0 when nothing is left).
+    """
+    using = using or DEFAULT_DB_ALIAS
+    orders = Order.objects.using(using)
+    items = OrderItem.objects.using(using)
+    with transaction.atomic(using=using), transaction.atomic(using=DEFAULT_DB_ALIAS):
+        ids = list(
+            archivable_orders(cutoff, using)
+            .order_by('id')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        ArchivedOrder.objects.bulk_create(
+            [
+                ArchivedOrder(**row)
+                for row in orders.filter(id__in=ids).values(*ARCHIVED_ORDER_FIELDS)
+            ],
+            ignore_conflicts=True
+        )
+        ArchivedOrderItem.objects.bulk_create(
+            [
+                ArchivedOrderItem(
+                    id=item_id,
+                    order_id=order_id,
+                    menu_item_id=menu_item_id,
+                    menu_item_name=menu_item_name,
+                    menu_item_category=menu_item_category,
+                    quantity=quantity,
+                    price_at_order=price_at_order,
+                )
+                for (
+                    item_id, order_id, menu_item_id, menu_item_name, menu_item_category,
+                    quantity, price_at_order
+                ) in items.filter(order_id__in=ids).annotate(
+                    snapshot_name=_snapshot('name'), snapshot_category=_snapshot('category')
+                ).values_list(
+                    'id', 'order_id', 'menu_item_id', 'snapshot_name', 'snapshot_category',
+                    'quantity', 'price_at_order'
+                )
+            ],
+            ignore_conflicts=True
+        )
+
+        items.filter(order_id__in=ids).delete()
+        orders.filter(id__in=ids).delete()
+
+    return len(ids)
+
+
+def archived_orders_for(user):
+    """
+    Archived orders visible to ``user``, mirroring OrderViewSet.get_queryset.
+    """
+    queryset = ArchivedOrder.objects.select_related(
+        'customer', 'restaurant', 'rider'
+    ).prefetch_related('items')
+
+    if user.role == 'ADMIN':
+        return queryset
+    if user.role == 'CUSTOMER':
+        return queryset.filter(customer=user)
+    if user.role == 'RESTAURANT_OWNER' and hasattr(user, 'restaurant'):
+        return queryset.filter(restaurant=user.restaurant)
+    if user.role == 'RIDER':
+        return queryset.filter(rider=user)
+    return queryset.none()
@@ -0,0 +1,102 @@
+"""
+Live kitchen metrics for restaurant owners.
+
+Everything on the dashboard comes from one query grouped by status over the
+restaurant's active orders plus today's and the last hour's. Kitchen
+displays poll every few seconds, so results are kept in a small in-process
+cache per restaurant for ``OWNER_DASHBOARD_TTL`` seconds; a cache shared
+between processes would cost a network round trip for data this fresh.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Order
+from .rider_stats import _duration_minutes, _money
+from .state_machine import CANCELLED, STATUSES, TERMINAL_STATUSES
+
+
+DEFAULT_TTL = 5
+MAX_CACHED_RESTAURANTS = 1000
+PREP_WINDOW = timedelta(hours=1)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def build_dashboard(restaurant_id, now=None):
+    """Run the dashboard query for one restaurant (uncached)"""
+    now = now or timezone.now()
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    prep_since = now - PREP_WINDOW
+
+    placed_today = Q(created_at__gte=today)
+    # Prep time as in orders.eta: placed -> picked up by the rider
+    picked_up_recently = Q(picked_up_at__gte=prep_since)
+    rows = (
+        Order.objects.filter(restaurant_id=restaurant_id)
+        .filter(~Q(status__in=TERMINAL_STATUSES) | placed_today | picked_up_recently)
+        .values('status')
+        .annotate(
+            orders=Count('id', filter=~Q(status__in=TERMINAL_STATUSES) | placed_today),
+            oldest=Min('created_at'),
+            revenue=Sum('total_amount', filter=placed_today & ~Q(status=CANCELLED)),
+            prepared=Count('id', filter=picked_up_recently),
+            prep_time=Avg(
+                ExpressionWrapper(F('picked_up_at') - F('created_at'), output_field=DurationField()),
+                filter=picked_up_recently
+            ),
+        )
+        .order_by()
+    )
+
+    counts = dict.fromkeys(STATUSES, 0)
+    oldest_pending = None
+    revenue = None
+    prepared, prep_total = 0, timedelta()
+    for row in rows:
+        counts[row['status']] = row['orders']
+        if row['status'] == 'PENDING':
+            oldest_pending = row['oldest']
+        if row['revenue'] is not None:
+            revenue = (revenue or 0) + row['revenue']
+        if row['prepared']:
+            prepared += row['prepared']
+            prep_total += row['prep_time'] * row['prepared']
+
+    return {
+        'restaurant_id': restaurant_id,
+        'generated_at': now,
+        # Active statuses count every open order, DELIVERED/CANCELLED only today's
+        'counts': counts,
+        'queue_length': counts['PENDING'] + counts['PREPARING'],
+        'oldest_pending_minutes': _duration_minutes(now - oldest_pending) if oldest_pending else None,
+        'average_prep_minutes_last_hour': _duration_minutes(prep_total / prepared) if prepared else None,
+        'revenue_today': _money(revenue),
+    }
+
+
+def get_dashboard(restaurant_id):
+    """Return the dashboard, from this process's cache when fresh enough"""
+    ttl = getattr(settings, 'OWNER_DASHBOARD_TTL', DEFAULT_TTL)
+    now = time.monotonic()
+    cached = _cache.get(restaurant_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    dashboard = build_dashboard(restaurant_id)
+    with _cache_lock:
+        if len(_cache) >= MAX_CACHED_RESTAURANTS:
+            for key in [key for key, (expires, _) in _cache.items() if expires <= now] or list(_cache):
+                del _cache[key]
+        _cache[restaurant_id] = (now + ttl, dashboard)
+    return dashboard
+
+
+def clear_dashboard_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,243 @@
+"""
+Delivery ETA estimation from historical order timestamps.
+
+Each restaurant keeps two streaming quantile sketches (P-square estimators)
+that are updated once per delivered order:
+
+- prep time: ``created_at`` -> ``picked_up_at`` (kitchen queue, cooking and
+  hand-off to the rider)
+- delivery time: ``picked_up_at`` -> ``delivered_at``
+
+Sketches have a fixed size, so updating them never rescans history, and the
+resulting medians / 90th percentiles are materialised on ``DeliveryEstimate``
+so serving an ETA is a single column read.
+"""
+import math
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+
+ETA_QUANTILES = (0.5, 0.9)
+# Deliveries required before a learned estimate replaces the owner's own
+MIN_SAMPLES = 20
+ACTIVE_STATUSES = ('PENDING', 'PREPARING', 'READY_FOR_PICKUP', 'OUT_FOR_DELIVERY')
+
+
+class P2Quantile:
+    """
+    P-square estimator for a single quantile (Jain & Chlamtac, 1985).
+
+    Keeps five markers regardless of how many observations are added.
+    """
+
+    def __init__(self, p, count=0, heights=None, positions=None, desired=None):
+        self.p = p
+        self.count = count
+        self.heights = list(heights or [])
+        self.positions = list(positions or [1, 2, 3, 4, 5])
+        self.desired = list(desired or [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5])
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    @classmethod
+    def from_dict(cls, data, p):
+        """Restore an estimator from its serialised state"""
+        if not data:
+            return cls(p)
+        return cls(
+            p,
+            count=data['count'],
+            heights=data['heights'],
+            positions=data['positions'],
+            desired=data['desired'],
+        )
+
+    def to_dict(self):
+        """Serialise estimator state for storage in a JSONField"""
+        return {
+            'count': self.count,
+            'heights': self.heights,
+            'positions': self.positions,
+            'desired': self.desired,
+        }
+
+    def add(self, value):
+        """Add one observation"""
+        self.count += 1
+
+        # Bootstrap with the first five observations
+        if self.count <= 5:
+            self.heights.append(value)
+            self.heights.sort()
+            return
+
+        q, n = self.heights, self.positions
+
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= value < q[i + 1])
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Adjust the three middle markers if they drifted from their desired position
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = self._linear(i, step)
+                q[i] = candidate
+                n[i] += step
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+    def value(self):
+        """Return the current quantile estimate, or None without data"""
+        if not self.count:
+            return None
+        if self.count <= 5:
+            index = min(len(self.heights) - 1, int(round(self.p * (len(self.heights) - 1))))
+            return self.heights[index]
+        return self.heights[2]
+
+
+class DurationSketch:
+    """
+    Set of P-square estimators tracking ``ETA_QUANTILES`` for one duration.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.estimators = {
+            p: P2Quantile.from_dict(state.get(str(p)), p) for p in ETA_QUANTILES
+        }
+
+    def add(self, seconds):
+        for estimator in self.estimators.values():
+            estimator.add(seconds)
+
+    def quantile(self, p):
+        return self.estimators[p].value()
+
+    def to_dict(self):
+        return {str(p): estimator.to_dict() for p, estimator in self.estimators.items()}
+
+
+def _minutes(seconds):
+    """Round seconds up to whole minutes"""
+    if seconds is None:
+        return None
+    return max(1, int(math.ceil(seconds / 60)))
+
+
+def observe(estimate, prep_seconds, delivery_seconds):
+    """
+    Feed one delivered order into an estimate's sketches and refresh the
+    materialised minute columns. Does not save.
+    """
+    prep = DurationSketch(estimate.prep_sketch)
+    delivery = DurationSketch(estimate.delivery_sketch)
+    prep.add(prep_seconds)
+    delivery.add(delivery_seconds)
+
+    estimate.prep_sketch = prep.to_dict()
+    estimate.delivery_sketch = delivery.to_dict()
+    estimate.sample_count += 1
+    estimate.prep_minutes = _minutes(prep.quantile(0.5))
+    estimate.delivery_minutes = _minutes(delivery.quantile(0.5))
+    estimate.eta_low_minutes = _minutes(prep.quantile(0.5) + delivery.quantile(0.5))
+    estimate.eta_high_minutes = _minutes(prep.quantile(0.9) + delivery.quantile(0.9))
+
+
+def order_durations(created_at, picked_up_at, delivered_at):
+    """
+    Return (prep_seconds, delivery_seconds) for a delivered order, or None
+    if its timestamps are incomplete or inconsistent.
+    """
+    if not (created_at and picked_up_at and delivered_at):
+        return None
+    prep = (picked_up_at - created_at).total_seconds()
+    delivery = (delivered_at - picked_up_at).total_seconds()
+    if prep < 0 or delivery < 0:
+        return None
+    return prep, delivery
+
+
+def record_delivery(order):
+    """
+    Update the restaurant's delivery estimate with a freshly delivered order.
+    """
+    from .models import DeliveryEstimate
+
+    durations = order_durations(order.created_at, order.picked_up_at, order.delivered_at)
+    if durations is None:
+        return
+
+    with transaction.atomic():
+        DeliveryEstimate.objects.get_or_create(restaurant_id=order.restaurant_id)
+        estimate = DeliveryEstimate.objects.select_for_update().get(
+            restaurant_id=order.restaurant_id
+        )
+        observe(estimate, *durations)
+        estimate.save()
+
+
+def is_reliable(estimate):
+    """Return True once an estimate has seen enough deliveries to be served"""
+    return (
+        estimate is not None
+        and estimate.sample_count >= MIN_SAMPLES
+        and estimate.eta_low_minutes is not None
+    )
+
+
+def format_estimate(estimate, fallback=None):
+    """Format an estimate as a "25-40 min" string like ``Restaurant.delivery_time``"""
+    if not is_reliable(estimate):
+        return fallback
+    low, high = estimate.eta_low_minutes, estimate.eta_high_minutes
+    if high is None or high <= low:
+        return f"{low} min"
+    return f"{low}-{high} min"
+
+
+def estimate_for_order(order, estimate, now=None):
+    """
+    Return live ETA information for an active order, or None when the order
+    is finished or the restaurant has no delivery history yet.
+    """
+    if order.status not in ACTIVE_STATUSES or not is_reliable(estimate):
+        return None
+
+    now = now or timezone.now()
+    if order.picked_up_at:
+        eta = order.picked_up_at + timedelta(minutes=estimate.delivery_minutes)
+    else:
+        eta = order.created_at + timedelta(
+            minutes=estimate.prep_minutes + estimate.delivery_minutes
+        )
+
+    return {
+        'estimated_delivery_at': eta,
+        'minutes_remaining': max(0, int(math.ceil((eta - now).total_seconds() / 60))),
+        'based_on_orders': estimate.sample_count,
+    }
@@ -0,0 +1,193 @@
+"""
+Streaming order exports (CSV and NDJSON).
+
+Rows are produced by generators over ``QuerySet.iterator(chunk_size=...)``,
+which uses a server-side cursor on PostgreSQL, so exports run in constant
+memory however many orders match. The same generators back the ``export``
+API action and the ``export_orders`` management command.
+
+Archived orders (see orders.archive) are exported alongside live ones: both
+are read in order id order and merged as they stream, so moving an order to
+the archive never drops it from a report. Live orders not bound to a
+database with ``using()`` are read from every shard and merged the same way
+(ids are unique across shards). Exports stream after the request's shard
+has been deactivated, so nothing may rely on it.
+"""
+import csv
+import heapq
+import json
+from datetime import datetime, time
+from operator import attrgetter, itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from foodieasy_backend.sharding import shard_aliases
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 2000
+
+CSV_COLUMNS = [
+    ('order_id', 'order_id'),
+    ('created_at', 'order__created_at'),
+    ('status', 'order__status'),
+    ('restaurant_id', 'order__restaurant_id'),
+    ('restaurant_name', 'order__restaurant__name'),
+    ('customer_email', 'order__customer__email'),
+    ('rider_email', 'order__rider__email'),
+    ('total_amount', 'order__total_amount'),
+    ('delivery_address', 'order__delivery_address'),
+    ('prepared_at', 'order__prepared_at'),
+    ('picked_up_at', 'order__picked_up_at'),
+    ('delivered_at', 'order__delivered_at'),
+    ('cancelled_at', 'order__cancelled_at'),
+    ('item_id', 'id'),
+    ('menu_item_id', 'menu_item_id'),
+    ('menu_item_name', 'menu_item_name'),
+    ('quantity', 'quantity'),
+    ('price_at_order', 'price_at_order'),
+]
+
+
+class ExportFilterError(ValueError):
+    """Raised for malformed export filter values"""
+
+
+def _parse_bound(value, end_of_day=False):
+    """Parse an ISO date or datetime into an aware datetime"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ExportFilterError(f"Invalid date '{value}'. Use YYYY-MM-DD or ISO 8601.")
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_orders(queryset, since=None, until=None, statuses=None, restaurant=None):
+    """
+    Apply export filters. Dates filter ``created_at`` by range so the
+    created_at index is usable; ``statuses`` is a list of status codes.
+    """
+    if since:
+        queryset = queryset.filter(created_at__gte=_parse_bound(since))
+    if until:
+        queryset = queryset.filter(created_at__lte=_parse_bound(until, end_of_day=True))
+    if statuses:
+        valid = dict(Order.STATUS_CHOICES)
+        unknown = [code for code in statuses if code not in valid]
+        if unknown:
+            raise ExportFilterError(f"Unknown status: {', '.join(unknown)}")
+        queryset = queryset.filter(status__in=statuses)
+    if restaurant:
+        try:
+            queryset = queryset.filter(restaurant_id=int(restaurant))
+        except (TypeError, ValueError):
+            raise ExportFilterError(f"Invalid restaurant id '{restaurant}'.")
+    return queryset
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _on_shards(orders):
+    """``orders`` as given when bound to a database, otherwise once per shard"""
+    if orders._db is not None:
+        return [orders]
+    return [orders.using(alias) for alias in shard_aliases()]
+
+
+def _item_rows(model, orders, chunk_size):
+    return model.objects.using(orders.db).filter(
+        order__in=orders.values('id')
+    ).order_by('order_id', 'id').values_list(
+        *[lookup for _, lookup in CSV_COLUMNS]
+    ).iterator(chunk_size=chunk_size)
+
+
+def iter_csv(orders, chunk_size=DEFAULT_CHUNK_SIZE, archived=None):
+    """
+    Yield CSV lines, one per order item, for the given order queryset and,
+    when given, the ``archived`` order queryset
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in CSV_COLUMNS])
+
+    sources = [_item_rows(OrderItem, shard, chunk_size) for shard in _on_shards(orders)]
+    if archived is not None:
+        sources.append(_item_rows(ArchivedOrderItem, archived, chunk_size))
+
+    for row in heapq.merge(*sources, key=itemgetter(0)):
+        yield writer.writerow(
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in row
+        )
+
+
+def _order_document(order):
+    return {
+        'order_id': order.id,
+        'created_at': order.created_at,
+        'status': order.status,
+        'restaurant_id': order.restaurant_id,
+        'restaurant_name': order.restaurant.name,
+        'customer_email': order.customer.email,
+        'rider_email': order.rider.email if order.rider else None,
+        'total_amount': order.total_amount,
+        'delivery_address': order.delivery_address,
+        'prepared_at': order.prepared_at,
+        'picked_up_at': order.picked_up_at,
+        'delivered_at': order.delivered_at,
+        'cancelled_at': order.cancelled_at,
+        'cancellation_reason': order.cancellation_reason,
+        'items': [
+            {
+                'item_id': item.id,
+                'menu_item_id': item.menu_item_id,
+                'menu_item_name': item.menu_item_name,
+                'quantity': item.quantity,
+                'price_at_order': item.price_at_order,
+            }
+            for item in order.items.all()
+        ],
+    }
+
+
+def _ordered(orders, chunk_size):
+    return orders.select_related(
+        'customer', 'restaurant', 'rider'
+    ).prefetch_related('items').order_by('id').iterator(chunk_size=chunk_size)
+
+
+def iter_ndjson(orders, chunk_size=DEFAULT_CHUNK_SIZE, archived=None):
+    """Yield one JSON document per order, with nested items, live and ``archived``"""
+    sources = [_ordered(shard, chunk_size) for shard in _on_shards(orders)]
+    if archived is not None:
+        sources.append(_ordered(archived, chunk_size))
+
+    for order in heapq.merge(*sources, key=attrgetter('id')):
+        yield json.dumps(_order_document(order), cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_export(orders, export_format, chunk_size=DEFAULT_CHUNK_SIZE, archived=None):
+    if export_format == 'csv':
+        return iter_csv(orders, chunk_size, archived)
+    if export_format == 'ndjson':
+        return iter_ndjson(orders, chunk_size, archived)
+    raise ExportFilterError(f"Unknown export format '{export_format}'. Use csv or ndjson.")
+
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
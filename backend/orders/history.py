@@ -0,0 +1,111 @@
+"""
+Precomputed customer order history.
+
+Terminal orders never change again, so each customer's DELIVERED and
+CANCELLED orders are kept as one compact JSON list in
+``CustomerOrderHistory`` (item names and restaurant names copied in), and
+reading the history is one primary key lookup whatever its length. Orders
+are added by a background job that a transition hook queues when they are
+delivered or cancelled; a customer without a row yet is built from their
+live and archived orders on first read. Active orders are always read live.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from foodieasy_backend.sharding import fan_out
+
+from .models import ArchivedOrder, CustomerOrderHistory, Order
+from .state_machine import TERMINAL_STATUSES
+
+
+def history_entry(order):
+    """Compact representation of a terminal order (live or archived)"""
+    items = [
+        {
+            'menu_item': item.menu_item_id,
+            'name': item.menu_item_name,
+            'quantity': item.quantity,
+            'price_at_order': item.price_at_order,
+        }
+        for item in order.items.all()
+    ]
+    return {
+        'id': order.id,
+        'restaurant': order.restaurant_id,
+        'restaurant_name': order.restaurant.name,
+        'status': order.status,
+        'total_amount': order.total_amount,
+        'item_count': sum(item['quantity'] for item in items),
+        'items': items,
+        'created_at': order.created_at,
+        'delivered_at': order.delivered_at,
+        'cancelled_at': order.cancelled_at,
+        'cancellation_reason': order.cancellation_reason,
+    }
+
+
+def _live_entries(orders):
+    orders = orders.filter(status__in=TERMINAL_STATUSES).select_related(
+        'restaurant'
+    ).prefetch_related('items')
+    return [history_entry(order) for order in fan_out(orders)]
+
+
+def _archived_entries(customer_id):
+    orders = ArchivedOrder.objects.filter(customer_id=customer_id).select_related(
+        'restaurant'
+    ).prefetch_related('items')
+    return [history_entry(order) for order in orders]
+
+
+def _merge(entries, new_entries):
+    """Stored ``entries`` plus ``new_entries`` (which win on id), newest first"""
+    # Round-trip new entries so dates compare as the ISO strings stored ones hold
+    by_id = {entry['id']: entry for entry in entries}
+    by_id.update((entry['id'], json.loads(json.dumps(entry, cls=DjangoJSONEncoder))) for entry in new_entries)
+    return sorted(by_id.values(), key=lambda entry: (entry['created_at'], entry['id']), reverse=True)
+
+
+def rebuild_history(customer_id):
+    """Recompute a customer's history from their live and archived orders"""
+    entries = _merge([], _archived_entries(customer_id) + _live_entries(
+        Order.objects.filter(customer_id=customer_id)
+    ))
+    history, _ = CustomerOrderHistory.objects.update_or_create(
+        customer_id=customer_id, defaults={'orders': entries}
+    )
+    return history
+
+
+def record_terminal_orders(order_ids, using=None):
+    """Add orders that just became DELIVERED/CANCELLED to their customers' histories"""
+    by_customer = {}
+    for entry, customer_id in (
+        (history_entry(order), order.customer_id)
+        for order in Order.objects.using(using).filter(
+            id__in=order_ids, status__in=TERMINAL_STATUSES
+        ).select_related('restaurant').prefetch_related('items')
+    ):
+        by_customer.setdefault(customer_id, []).append(entry)
+
+    for customer_id, entries in by_customer.items():
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            history = CustomerOrderHistory.objects.select_for_update().filter(
+                customer_id=customer_id
+            ).first()
+            if history is None:
+                # No history yet: build it whole (it already includes these orders)
+                rebuild_history(customer_id)
+                continue
+            history.orders = _merge(history.orders, entries)
+            history.save(update_fields=['orders', 'updated_at'])
+
+
+def get_history(customer):
+    """The customer's terminal orders, newest first"""
+    history = CustomerOrderHistory.objects.filter(customer=customer).first()
+    if history is None:
+        history = rebuild_history(customer.id)
+    return history.orders
@@ -0,0 +1,30 @@
+"""
+Post-commit side effects of order status transitions.
+
+Registered with the state machine when the orders app is ready. Anything
+that is not needed for the response is queued as a background job (see
+orders.tasks) so the request returns as soon as the transition commits.
+"""
+from .rider_stats import invalidate_rider_summary
+from .state_machine import on_transition, CANCELLED, DELIVERED
+from .tasks import record_deliveries, record_order_history
+
+
+@on_transition(DELIVERED)
+def update_delivery_estimates(event):
+    """Feed delivered orders into their restaurant's ETA sketches"""
+    record_deliveries.delay(event.order_ids, using=event.using)
+
+
+@on_transition()
+def invalidate_rider_summaries(event):
+    """Any status change can alter a rider's summary or active job"""
+    rider_ids = {order.rider_id for order in event.get_orders()} - {None}
+    for rider_id in rider_ids:
+        invalidate_rider_summary(rider_id)
+
+
+@on_transition(DELIVERED, CANCELLED)
+def update_order_history(event):
+    """Finished orders join their customers' precomputed history"""
+    record_order_history.delay(event.order_ids, using=event.using)
@@ -0,0 +1,156 @@
+"""
+Idempotency-Key support for unsafe order endpoints.
+
+A client sends ``Idempotency-Key: <unique value>`` with a POST. The first
+request reserves the key (a unique row per user), runs the view and stores
+the response. Retries with the same key and body replay the stored response
+without re-running validation or writes. A retry that arrives while the
+original is still running gets 409, and reusing a key for a different
+request gets 422. A request that never finished (its worker died) holds
+the key for ``IDEMPOTENCY_LOCK_TIMEOUT`` only; the next retry after that
+takes the key over and runs the request again.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Response headers stored with the body and replayed with it
+REPLAYED_RESPONSE_HEADERS = ('Location',)
+
+
+def get_key_ttl():
+    """Return how long stored responses are kept"""
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', timedelta(hours=24))
+
+
+def get_lock_timeout():
+    """Return how long an unfinished request keeps its key from retries"""
+    return getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', timedelta(seconds=60))
+
+
+def request_fingerprint(request):
+    """Hash the parts of a request that must match for a replay"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    raw = f"{request.method}\n{request.path}\n{body}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _reserve(user, key, fingerprint):
+    """
+    Insert an in-progress record for the key. Returns (record, created).
+    The unique constraint makes concurrent duplicates lose the race here.
+    """
+    from .models import IdempotencyKey
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                fingerprint=fingerprint,
+                expires_at=now + get_key_ttl()
+            ), True
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if existing is not None and existing.expires_at <= now:
+        # Expired but not yet purged: treat the key as fresh
+        existing.delete()
+        return _reserve(user, key, fingerprint)
+    return existing, False
+
+
+def _reclaim(record):
+    """
+    Take over an unfinished record older than the lock timeout. The update
+    is conditional on the old timestamp, so of several concurrent retries
+    only one wins. Returns True if this request now owns the key.
+    """
+    from .models import IdempotencyKey
+
+    now = timezone.now()
+    if record.created_at > now - get_lock_timeout():
+        return False
+    claimed = IdempotencyKey.objects.filter(
+        pk=record.pk, status_code__isnull=True, created_at=record.created_at
+    ).update(created_at=now, expires_at=now + get_key_ttl())
+    return bool(claimed)
+
+
+def idempotent(view_method):
+    """
+    Decorator for ViewSet methods/actions that honours the Idempotency-Key
+    header. Requests without the header run unchanged.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        record, created = _reserve(request.user, key, fingerprint)
+
+        if not created:
+            if record is None:
+                # Lost a race with a purge; the client can safely retry
+                return Response(
+                    {'error': 'Request with this Idempotency-Key is being processed.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {'error': f'{IDEMPOTENCY_HEADER} was already used for a different request.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status_code is not None:
+                return Response(
+                    record.response_body,
+                    status=record.status_code,
+                    headers={**record.response_headers, REPLAYED_HEADER: 'true'}
+                )
+            if not _reclaim(record):
+                return Response(
+                    {'error': 'Request with this Idempotency-Key is being processed.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            # Server errors are not final; let the client retry for real
+            record.delete()
+        else:
+            record.status_code = response.status_code
+            record.response_body = response.data
+            record.response_headers = {
+                name: response[name] for name in REPLAYED_RESPONSE_HEADERS if response.has_header(name)
+            }
+            record.save(update_fields=['status_code', 'response_body', 'response_headers'])
+
+        return response
+
+    return wrapper
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from foodieasy_backend.sharding import shard_aliases
+from orders.archive import archivable_orders, archive_batch
+
+
+class Command(BaseCommand):
+    help = 'Move delivered/cancelled orders older than N days into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Archive terminal orders created more than this many days ago (default: 90)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Orders moved per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches; re-run to resume',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many orders would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must be >= 0 and --batch-size must be >= 1.')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = sum(archivable_orders(cutoff, alias).count() for alias in shard_aliases())
+            self.stdout.write(f'{count} orders created before {cutoff:%Y-%m-%d %H:%M} would be archived.')
+            return
+
+        total = batches = 0
+        aliases = shard_aliases()
+        while aliases and (options['max_batches'] is None or batches < options['max_batches']):
+            moved = archive_batch(cutoff, options['batch_size'], using=aliases[0])
+            if not moved:
+                # This shard is done; continue with the next one
+                aliases.pop(0)
+                continue
+            total += moved
+            batches += 1
+            self.stdout.write(f'  Batch {batches}: archived {moved} orders ({total} total)')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Archived {total} orders in {batches} batches.'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Subquery
+
+from foodieasy_backend.sharding import shard_aliases
+from orders.models import OrderItem
+from restaurants.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Copy menu item names and categories onto order items created before they were snapshotted'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Order items updated per statement (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be >= 1.')
+
+        total = 0
+        for alias in shard_aliases():
+            items = OrderItem.objects.using(alias)
+            menu_items = MenuItem.objects.using(alias).filter(pk=OuterRef('menu_item_id'))
+            last_id = 0
+            while True:
+                # Walk the primary key so each batch starts where the last one ended
+                ids = list(
+                    items.filter(id__gt=last_id, menu_item_name='', menu_item__isnull=False)
+                    .order_by('id')
+                    .values_list('id', flat=True)[:options['batch_size']]
+                )
+                if not ids:
+                    break
+                updated = items.filter(id__in=ids).update(
+                    menu_item_name=Subquery(menu_items.values('name')[:1]),
+                    menu_item_category=Subquery(menu_items.values('category')[:1]),
+                )
+                total += updated
+                last_id = ids[-1]
+                self.stdout.write(f'  {alias}: snapshotted {updated} order items ({total} total)')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Snapshotted {total} order items.'))
@@ -0,0 +1,112 @@
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from foodieasy_backend.middleware import brotli
+from foodieasy_backend.renderers import FastJSONRenderer, FastJSONParser, orjson
+from orders.models import Order
+from orders.serializers import OrderSerializer
+from restaurants.models import Restaurant
+from restaurants.serializers import RestaurantSerializer
+
+
+class _Stream:
+    """Minimal stream for parser benchmarks"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON renderers and compression: bytes on the wire and CPU per response'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=200,
+            help='Orders in the OrderSerializer payload (default: 200)',
+        )
+        parser.add_argument(
+            '--restaurants',
+            type=int,
+            default=20,
+            help='Restaurants (with menus) in the RestaurantSerializer payload (default: 20)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Timed repetitions per measurement (default: 50)',
+        )
+
+    def cpu_ms(self, func, repeat):
+        """Average CPU milliseconds per call"""
+        func()
+        started = time.process_time()
+        for _ in range(repeat):
+            result = func()
+        return (time.process_time() - started) * 1000 / repeat, result
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; FastJSONRenderer falls back to DRF.'))
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed; only gzip is measured.'))
+
+        payloads = {
+            'orders': OrderSerializer(
+                Order.objects.select_related('customer', 'restaurant', 'rider')
+                .prefetch_related('items')
+                .order_by('-created_at')[:options['orders']],
+                many=True
+            ).data,
+            'restaurants': RestaurantSerializer(
+                Restaurant.objects.select_related('owner', 'delivery_estimate')
+                .prefetch_related('menu_items')[:options['restaurants']],
+                many=True
+            ).data,
+        }
+
+        for name, data in payloads.items():
+            if not data:
+                self.stdout.write(self.style.WARNING(f'No rows for the {name} payload; skipping.'))
+                continue
+
+            drf_ms, drf_body = self.cpu_ms(lambda: JSONRenderer().render(data), repeat)
+            fast_ms, fast_body = self.cpu_ms(lambda: FastJSONRenderer().render(data), repeat)
+            if json.loads(drf_body) != json.loads(fast_body):
+                self.stderr.write(self.style.ERROR(f'{name}: renderers disagree on the decoded payload!'))
+
+            parse_drf_ms, _ = self.cpu_ms(lambda: json.loads(drf_body), repeat)
+            parse_fast_ms, _ = self.cpu_ms(lambda: FastJSONParser().parse(_Stream(fast_body)), repeat)
+
+            self.stdout.write(f'\n{name} ({len(data)} rows)')
+            self.stdout.write(f'  render   DRF json  {drf_ms:8.2f} ms   {len(drf_body):>10,} bytes')
+            self.stdout.write(f'  render   orjson    {fast_ms:8.2f} ms   {len(fast_body):>10,} bytes')
+            self.stdout.write(f'  parse    DRF json  {parse_drf_ms:8.2f} ms')
+            self.stdout.write(f'  parse    orjson    {parse_fast_ms:8.2f} ms')
+
+            gzip_ms, gzipped = self.cpu_ms(lambda: gzip.compress(fast_body, compresslevel=6), repeat)
+            self.stdout.write(
+                f'  gzip     level 6   {gzip_ms:8.2f} ms   {len(gzipped):>10,} bytes'
+                f'  ({len(gzipped) / len(fast_body):.0%})'
+            )
+            if brotli is not None:
+                for quality in (4, 5, 11):
+                    br_ms, compressed = self.cpu_ms(
+                        lambda: brotli.compress(fast_body, quality=quality), repeat
+                    )
+                    self.stdout.write(
+                        f'  brotli   q{quality:<2}       {br_ms:8.2f} ms   {len(compressed):>10,} bytes'
+                        f'  ({len(compressed) / len(fast_body):.0%})'
+                    )
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark complete.'))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodieasy_backend.sharding import shard_aliases
+from orders.outbox import drain_batch, get_sinks
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending order lifecycle events from the outbox to the configured sinks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Events claimed per transaction (default: 100)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=10,
+            help='Give up on an event after this many failed deliveries (default: 10)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new events instead of exiting when the outbox is empty',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep between polls when idle with --loop (default: 1.0)',
+        )
+
+    def handle(self, *args, **options):
+        sinks = get_sinks()
+        total = 0
+
+        while True:
+            # Every restaurant shard keeps its own outbox
+            claimed = sum(
+                drain_batch(sinks, options['batch_size'], options['max_attempts'], using=alias)
+                for alias in shard_aliases()
+            )
+            total += claimed
+            if claimed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Processed {total} outbox events.'))
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodieasy_backend.sharding import (
+    misplaced_restaurants,
+    move_restaurant,
+    reserve_id_range,
+    shard_aliases,
+    sharded_models,
+    sync_reference_tables,
+)
+
+
+class Command(BaseCommand):
+    help = 'Move restaurants whose menu items and orders sit on a shard other than their own'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restaurant',
+            type=int,
+            action='append',
+            help='Only move this restaurant id (may be repeated)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Orders moved per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--sync-reference',
+            action='store_true',
+            help='First copy all users and restaurants from default to every shard (needed for a new shard)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the restaurants that would move',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be >= 1.')
+
+        misplaced = misplaced_restaurants(options['restaurant'])
+        if options['dry_run']:
+            for restaurant_id, source, target in misplaced:
+                self.stdout.write(f'  Restaurant {restaurant_id}: {source} -> {target}')
+            self.stdout.write(f'{len(misplaced)} restaurants would be moved.')
+            return
+
+        if options['sync_reference']:
+            copied = sync_reference_tables()
+            self.stdout.write(f'  Copied {copied} reference rows to the shards')
+
+        # Keep ids from the shard being moved to inside its own range
+        for alias in shard_aliases():
+            for model in sharded_models():
+                reserve_id_range(model, alias)
+
+        orders_moved = 0
+        for restaurant_id, source, target in misplaced:
+            menu_items, orders = move_restaurant(restaurant_id, source, target, options['batch_size'])
+            orders_moved += orders
+            self.stdout.write(
+                f'  Restaurant {restaurant_id}: {source} -> {target} '
+                f'({menu_items} menu items, {orders} orders)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Moved {len(misplaced)} restaurants ({orders_moved} orders).'
+        ))
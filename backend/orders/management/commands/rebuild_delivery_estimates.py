@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from orders.eta import order_durations, observe
+from orders.models import Order, DeliveryEstimate
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-restaurant delivery estimates from delivered order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restaurant',
+            type=int,
+            help='Only rebuild the estimate for this restaurant id',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched per database round trip (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.filter(
+            status='DELIVERED',
+            picked_up_at__isnull=False,
+            delivered_at__isnull=False,
+        )
+        if options['restaurant']:
+            orders = orders.filter(restaurant_id=options['restaurant'])
+
+        rows = orders.order_by('restaurant_id', 'delivered_at').values_list(
+            'restaurant_id', 'created_at', 'picked_up_at', 'delivered_at'
+        ).iterator(chunk_size=options['chunk_size'])
+
+        # Sketches are fixed-size, so memory stays flat however long the history is
+        estimates = {}
+        for restaurant_id, created_at, picked_up_at, delivered_at in rows:
+            durations = order_durations(created_at, picked_up_at, delivered_at)
+            if durations is None:
+                continue
+            estimate = estimates.get(restaurant_id)
+            if estimate is None:
+                estimate = estimates[restaurant_id] = DeliveryEstimate(restaurant_id=restaurant_id)
+            observe(estimate, *durations)
+
+        for restaurant_id, estimate in estimates.items():
+            DeliveryEstimate.objects.update_or_create(
+                restaurant_id=restaurant_id,
+                defaults={
+                    'prep_sketch': estimate.prep_sketch,
+                    'delivery_sketch': estimate.delivery_sketch,
+                    'sample_count': estimate.sample_count,
+                    'prep_minutes': estimate.prep_minutes,
+                    'delivery_minutes': estimate.delivery_minutes,
+                    'eta_low_minutes': estimate.eta_low_minutes,
+                    'eta_high_minutes': estimate.eta_high_minutes,
+                },
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Rebuilt delivery estimates for {len(estimates)} restaurants.')
+        )
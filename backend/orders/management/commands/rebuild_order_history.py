@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from orders.history import rebuild_history
+
+
+class Command(BaseCommand):
+    help = "Recompute customers' precomputed order history from their live and archived orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customer',
+            type=int,
+            action='append',
+            help='Only rebuild this customer id (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        customers = get_user_model().objects.filter(role='CUSTOMER')
+        if options['customer']:
+            customers = customers.filter(id__in=options['customer'])
+
+        total = 0
+        for customer_id in customers.order_by('id').values_list('id', flat=True).iterator():
+            rebuild_history(customer_id)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt order history for {total} customers.'))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        ('restaurants', '0003_restaurant_delivery_time_restaurant_is_open'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryEstimate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prep_sketch', models.JSONField(default=dict)),
+                ('delivery_sketch', models.JSONField(default=dict)),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('prep_minutes', models.PositiveIntegerField(blank=True, null=True)),
+                ('delivery_minutes', models.PositiveIntegerField(blank=True, null=True)),
+                ('eta_low_minutes', models.PositiveIntegerField(blank=True, null=True)),
+                ('eta_high_minutes', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('restaurant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_estimate', to='restaurants.restaurant')),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_archivedorder'),
+        ('restaurants', '0003_restaurant_delivery_time_restaurant_is_open'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_orde_status_c6dd84_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_orde_custome_59b6fb_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_orde_restaur_79a0fa_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_orde_rider_i_cec2cd_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at'], name='orders_orde_status_079368_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at'], name='orders_orde_custome_413d7d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', '-created_at'], name='orders_orde_restaur_7d58ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'status', '-created_at'], name='orders_orde_restaur_1f1679_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['rider', '-created_at'], name='orders_orde_rider_i_3d13fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('rider__isnull', True), ('status', 'READY_FOR_PICKUP')), fields=['-created_at'], name='order_awaiting_rider_idx'),
+        ),
+    ]
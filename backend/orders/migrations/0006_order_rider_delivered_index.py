@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_access_path_indexes'),
+        ('restaurants', '0003_restaurant_delivery_time_restaurant_is_open'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['rider', 'delivered_at'], name='orders_orde_rider_i_d2030a_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 19:38
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_orderevent'),
+        ('users', '0002_date_joined_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerOrderHistory',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_history', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('orders', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Customer order histories',
+            },
+        ),
+    ]
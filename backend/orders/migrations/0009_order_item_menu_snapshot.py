@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_customer_order_history'),
+        ('restaurants', '0005_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='menu_item_category',
+            field=models.CharField(blank=True, default='', help_text='Category of the item at the time of order', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='menu_item_name',
+            field=models.CharField(blank=True, default='', help_text='Name of the item at the time of order', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='menu_item',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='restaurants.menuitem'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_idempotency_response_headers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='menu_item_category',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
@@ -1,7 +1,13 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from decimal import Decimal
 
+from foodieasy_backend.sharding import ShardedQuerySet
+
+from .state_machine import can_transition
+
 
 class Order(models.Model):
     """
@@ -58,14 +64,29 @@ class Order(models.Model):
     # Cancellation reason (if applicable)
     cancellation_reason = models.TextField(blank=True, default='')
     
+    # Rows live on their restaurant's shard (foodieasy_backend.sharding)
+    objects = ShardedQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        # Each index matches an OrderViewSet access path so filters and the
+        # default -created_at ordering are served without sorting. Foreign
+        # keys already get single-column indexes from Django.
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['status']),
-            models.Index(fields=['customer']),
-            models.Index(fields=['restaurant']),
-            models.Index(fields=['rider']),
+            models.Index(fields=['status', '-created_at']),
+            models.Index(fields=['customer', '-created_at']),
+            models.Index(fields=['restaurant', '-created_at']),
+            models.Index(fields=['restaurant', 'status', '-created_at']),
+            models.Index(fields=['rider', '-created_at']),
+            # Rider summaries aggregate over a rider's recent deliveries
+            models.Index(fields=['rider', 'delivered_at']),
+            # Riders' pending_orders: ready orders nobody has claimed yet
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(status='READY_FOR_PICKUP', rider__isnull=True),
+                name='order_awaiting_rider_idx'
+            ),
         ]
     
     def __str__(self):
@@ -80,21 +101,14 @@ class Order(models.Model):
         """
         Check if order can transition to the new status.
         """
-        valid_transitions = {
-            'PENDING': ['PREPARING', 'CANCELLED'],
-            'PREPARING': ['READY_FOR_PICKUP', 'CANCELLED'],
-            'READY_FOR_PICKUP': ['OUT_FOR_DELIVERY', 'CANCELLED'],
-            'OUT_FOR_DELIVERY': ['DELIVERED'],
-            'DELIVERED': [],
-            'CANCELLED': [],
-        }
-        
-        return new_status in valid_transitions.get(self.status, [])
+        return can_transition(self.status, new_status)
 
 
 class OrderItem(models.Model):
     """
-    OrderItem model - represents an item in an order.
+    OrderItem model - represents an item in an order. The menu item's name
+    and category are copied in when ordering, like its price, so reading an
+    order never joins the menu and menu items can be removed afterwards.
     """
     order = models.ForeignKey(
         Order,
@@ -103,9 +117,22 @@ class OrderItem(models.Model):
     )
     menu_item = models.ForeignKey(
         'restaurants.MenuItem',
-        on_delete=models.PROTECT,
+        on_delete=models.SET_NULL,
+        null=True,
         related_name='order_items'
     )
+    menu_item_name = models.CharField(
+        max_length=200,
+        blank=True,
+        default='',
+        help_text='Name of the item at the time of order'
+    )
+    menu_item_category = models.CharField(
+        max_length=20,
+        blank=True,
+        default='',
+        help_text='Category of the item at the time of order'
+    )
     quantity = models.PositiveIntegerField(default=1)
     price_at_order = models.DecimalField(
         max_digits=10,
@@ -113,13 +140,241 @@ class OrderItem(models.Model):
         help_text='Price of the item at the time of order'
     )
     
+    # Rows live on their restaurant's shard (foodieasy_backend.sharding)
+    objects = ShardedQuerySet.as_manager()
+    
     class Meta:
         ordering = ['id']
     
     def __str__(self):
-        return f"{self.quantity}x {self.menu_item.name} in Order #{self.order.id}"
+        return f"{self.quantity}x {self.menu_item_name} in Order #{self.order_id}"
+    
+    def save(self, *args, **kwargs):
+        if self.menu_item_id and not self.menu_item_name:
+            self.snapshot_menu_item(self.menu_item)
+        super().save(*args, **kwargs)
+    
+    def snapshot_menu_item(self, menu_item):
+        """Copy the menu item's name and category (bulk_create skips save())"""
+        self.menu_item_name = menu_item.name
+        self.menu_item_category = menu_item.category
     
     @property
     def subtotal(self):
         """Calculate subtotal for this item"""
         return self.quantity * self.price_at_order
+
+
+class DeliveryEstimate(models.Model):
+    """
+    DeliveryEstimate model - per-restaurant delivery time distribution
+    learned from delivered orders (see orders.eta).
+    """
+    restaurant = models.OneToOneField(
+        'restaurants.Restaurant',
+        on_delete=models.CASCADE,
+        related_name='delivery_estimate'
+    )
+    
+    # Serialised streaming quantile sketches (seconds)
+    prep_sketch = models.JSONField(default=dict)
+    delivery_sketch = models.JSONField(default=dict)
+    sample_count = models.PositiveIntegerField(default=0)
+    
+    # Materialised estimates (minutes) so reads never touch the sketches
+    prep_minutes = models.PositiveIntegerField(null=True, blank=True)
+    delivery_minutes = models.PositiveIntegerField(null=True, blank=True)
+    eta_low_minutes = models.PositiveIntegerField(null=True, blank=True)
+    eta_high_minutes = models.PositiveIntegerField(null=True, blank=True)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Delivery estimate for restaurant #{self.restaurant_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    IdempotencyKey model - remembers the response to a keyed request so
+    client retries are replayed instead of re-executed (see orders.idempotency).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(
+        max_length=64,
+        help_text='SHA-256 of the request method, path and body'
+    )
+    
+    # Null until the original request finishes
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    response_headers = models.JSONField(default=dict, blank=True)
+    
+    # Reset when an abandoned request's key is taken over by a retry
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+    
+    def __str__(self):
+        return f"Idempotency key {self.key} for user #{self.user_id}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    ArchivedOrder model - a DELIVERED or CANCELLED order moved out of the hot
+    orders table by the archive_orders command. Keeps the original order id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_orders'
+    )
+    restaurant = models.ForeignKey(
+        'restaurants.Restaurant',
+        on_delete=models.CASCADE,
+        related_name='archived_orders'
+    )
+    rider = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_deliveries'
+    )
+    
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    delivery_address = models.TextField()
+    
+    # Timestamps copied from the original order
+    created_at = models.DateTimeField()
+    prepared_at = models.DateTimeField(null=True, blank=True)
+    picked_up_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+    cancellation_reason = models.TextField(blank=True, default='')
+    
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', '-created_at']),
+            models.Index(fields=['restaurant', '-created_at']),
+            models.Index(fields=['rider', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Archived order #{self.id}"
+    
+    def get_status_display(self):
+        return dict(Order.STATUS_CHOICES).get(self.status, self.status)
+
+
+class ArchivedOrderItem(models.Model):
+    """
+    ArchivedOrderItem model - an item of an archived order. The menu item
+    reference is kept without a constraint, with its name and category
+    copied alongside, so archived history never blocks menu changes.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    menu_item = models.ForeignKey(
+        'restaurants.MenuItem',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+'
+    )
+    menu_item_name = models.CharField(max_length=200)
+    menu_item_category = models.CharField(max_length=20, blank=True, default='')
+    quantity = models.PositiveIntegerField()
+    price_at_order = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.quantity}x {self.menu_item_name} in archived order #{self.order_id}"
+    
+    @property
+    def subtotal(self):
+        return self.quantity * self.price_at_order
+
+
+class OrderEvent(models.Model):
+    """
+    OrderEvent model - transactional outbox of order lifecycle events.
+    Rows are written in the same transaction as the change they describe
+    and delivered to sinks by the drain_outbox command (see orders.outbox).
+    """
+    EVENT_CHOICES = [
+        ('order.created', 'Order created'),
+        ('order.status_changed', 'Order status changed'),
+        ('order.rider_assigned', 'Rider assigned'),
+    ]
+    
+    event_type = models.CharField(max_length=50, choices=EVENT_CHOICES)
+    # Plain id rather than a foreign key: events outlive archived orders
+    order_id = models.BigIntegerField()
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Delivery bookkeeping
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    
+    # Rows live on their restaurant's shard (foodieasy_backend.sharding)
+    objects = ShardedQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(dispatched_at__isnull=True),
+                name='order_event_undispatched_idx'
+            ),
+            models.Index(fields=['order_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} for order #{self.order_id}"
+
+
+class CustomerOrderHistory(models.Model):
+    """
+    CustomerOrderHistory model - a customer's DELIVERED and CANCELLED orders
+    (live and archived) precomputed into one JSON list, newest first, so
+    order history is a single primary key read however long it is.
+    Maintained by orders.history when orders reach a terminal status.
+    """
+    customer = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='order_history'
+    )
+    orders = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'Customer order histories'
+    
+    def __str__(self):
+        return f"Order history of user #{self.customer_id}"
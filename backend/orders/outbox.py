@@ -0,0 +1,192 @@
+"""
+Transactional outbox for order lifecycle events.
+
+``record_*`` helpers insert ``OrderEvent`` rows inside the caller's
+transaction, so an event exists if and only if the change it describes was
+committed. The ``drain_outbox`` command claims undispatched rows with
+``SELECT ... FOR UPDATE SKIP LOCKED`` (several workers can run side by
+side), hands them to every configured sink and marks them dispatched.
+Delivery is at-least-once: consumers should de-duplicate on the event id.
+
+Sinks are configured with ``ORDER_OUTBOX_SINKS`` (dotted paths).
+"""
+import json
+import logging
+import os
+import queue
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OrderEvent
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SINKS = ['orders.outbox.FileSink']
+MAX_BACKOFF_SECONDS = 60 * 30
+
+
+def record_order_created(order, items):
+    """Record an order.created event; ``items`` are the created OrderItems"""
+    # Events live next to their order, on its restaurant's shard
+    return OrderEvent.objects.using(order._state.db).create(
+        event_type='order.created',
+        order_id=order.id,
+        payload={
+            'order_id': order.id,
+            'customer_id': order.customer_id,
+            'restaurant_id': order.restaurant_id,
+            'total_amount': order.total_amount,
+            'items': [
+                {
+                    'menu_item_id': item.menu_item_id,
+                    'quantity': item.quantity,
+                    'price_at_order': item.price_at_order,
+                }
+                for item in items
+            ],
+        }
+    )
+
+
+def record_transition(event):
+    """Record one order.status_changed event per order in a state machine Transition"""
+    payload = {
+        'from_status': event.from_status,
+        'to_status': event.to_status,
+        'at': event.at or timezone.now(),
+        'actor': event.actor,
+    }
+    if event.to_status == 'CANCELLED':
+        payload['cancellation_reason'] = event.values.get('cancellation_reason', '')
+
+    OrderEvent.objects.using(event.using).bulk_create([
+        OrderEvent(
+            event_type='order.status_changed',
+            order_id=order_id,
+            payload={'order_id': order_id, **payload}
+        )
+        for order_id in event.order_ids
+    ])
+
+
+def record_rider_assigned(order, assigned_by):
+    return OrderEvent.objects.using(order._state.db).create(
+        event_type='order.rider_assigned',
+        order_id=order.id,
+        payload={
+            'order_id': order.id,
+            'rider_id': order.rider_id,
+            'assigned_by': assigned_by.id,
+        }
+    )
+
+
+def event_message(event):
+    """The document handed to sinks for one event"""
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'order_id': event.order_id,
+        'created_at': event.created_at,
+        'payload': event.payload,
+    }
+
+
+class BaseSink:
+    """
+    Destination for outbox events. ``send`` receives a list of messages and
+    must raise if any of them could not be delivered.
+    """
+
+    def send(self, messages):
+        raise NotImplementedError
+
+
+class FileSink(BaseSink):
+    """Append events as NDJSON to ``ORDER_OUTBOX_FILE``; a local stand-in for a broker"""
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'ORDER_OUTBOX_FILE', 'order_events.ndjson')
+
+    def send(self, messages):
+        directory = os.path.dirname(os.fspath(self.path))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as output:
+            for message in messages:
+                output.write(json.dumps(message, cls=DjangoJSONEncoder) + '\n')
+            output.flush()
+            os.fsync(output.fileno())
+
+
+# In-process queue shared by every QueueSink, for local consumers and tests
+event_queue = queue.Queue()
+
+
+class QueueSink(BaseSink):
+    """Put events on the in-process ``event_queue``"""
+
+    def send(self, messages):
+        for message in messages:
+            event_queue.put(message)
+
+
+class LogSink(BaseSink):
+    """Log each event at INFO level"""
+
+    def send(self, messages):
+        for message in messages:
+            logger.info('Order event %s: %s', message['type'], json.dumps(message, cls=DjangoJSONEncoder))
+
+
+def get_sinks():
+    paths = getattr(settings, 'ORDER_OUTBOX_SINKS', DEFAULT_SINKS)
+    return [import_string(path)() for path in paths]
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(MAX_BACKOFF_SECONDS, 2 ** attempts))
+
+
+def drain_batch(sinks, batch_size=100, max_attempts=10, using=None):
+    """
+    Claim and deliver one batch of events from database ``using`` (each
+    restaurant shard has its own outbox). Returns the number of events
+    claimed (0 when nothing is due).
+    """
+    now = timezone.now()
+    using = using or DEFAULT_DB_ALIAS
+    with transaction.atomic(using=using):
+        events = list(
+            OrderEvent.objects.using(using).filter(
+                dispatched_at__isnull=True,
+                available_at__lte=now,
+                attempts__lt=max_attempts
+            ).order_by('available_at', 'id').select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not events:
+            return 0
+
+        messages = [event_message(event) for event in events]
+        try:
+            for sink in sinks:
+                sink.send(messages)
+        except Exception as exc:
+            logger.exception('Outbox delivery failed for %d events', len(events))
+            for event in events:
+                event.attempts += 1
+                event.available_at = now + _backoff(event.attempts)
+                event.last_error = f'{type(exc).__name__}: {exc}'
+            OrderEvent.objects.using(using).bulk_update(events, ['attempts', 'available_at', 'last_error'])
+            return len(events)
+
+        OrderEvent.objects.using(using).filter(id__in=[event.id for event in events]).update(
+            dispatched_at=timezone.now()
+        )
+    return len(events)
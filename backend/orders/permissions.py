@@ -1,12 +1,14 @@
 from rest_framework import permissions
 
+from .state_machine import actor_for, may_request
+
 
 class IsOrderCustomer(permissions.BasePermission):
     """
     Permission to check if user is the customer of the order.
     """
     def has_object_permission(self, request, view, obj):
-        return obj.customer == request.user
+        return obj.customer_id == request.user.id
 
 
 class IsOrderRestaurant(permissions.BasePermission):
@@ -14,7 +16,7 @@ class IsOrderRestaurant(permissions.BasePermission):
     Permission to check if user is the owner of the restaurant in the order.
     """
     def has_object_permission(self, request, view, obj):
-        return hasattr(request.user, 'restaurant') and obj.restaurant.owner == request.user
+        return hasattr(request.user, 'restaurant') and obj.restaurant.owner_id == request.user.id
 
 
 class IsOrderRider(permissions.BasePermission):
@@ -22,33 +24,14 @@ class IsOrderRider(permissions.BasePermission):
     Permission to check if user is the rider assigned to the order.
     """
     def has_object_permission(self, request, view, obj):
-        return obj.rider == request.user
+        return obj.rider_id == request.user.id
 
 
 class CanUpdateOrderStatus(permissions.BasePermission):
     """
     Permission to check if user can update order status based on their role.
+    Role rules live in orders.state_machine.
     """
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        new_status = request.data.get('status')
-        
-        # Admin can update to any status
-        if user.role == 'ADMIN':
-            return True
-        
-        # Restaurant owner can update to PREPARING, READY_FOR_PICKUP, CANCELLED
-        if hasattr(user, 'restaurant') and obj.restaurant.owner == user:
-            allowed_statuses = ['PREPARING', 'READY_FOR_PICKUP', 'CANCELLED']
-            return new_status in allowed_statuses
-        
-        # Rider can update to OUT_FOR_DELIVERY, DELIVERED
-        if obj.rider == user and user.role == 'RIDER':
-            allowed_statuses = ['OUT_FOR_DELIVERY', 'DELIVERED']
-            return new_status in allowed_statuses
-        
-        # Customer can only cancel (PENDING orders only)
-        if obj.customer == user and user.role == 'CUSTOMER':
-            return new_status == 'CANCELLED' and obj.status == 'PENDING'
-        
-        return False
+        actor = actor_for(request.user, obj)
+        return actor is not None and may_request(actor, obj.status, request.data.get('status'))
@@ -0,0 +1,104 @@
+"""
+Reordering a past order.
+
+The past order's lines are checked against the restaurant's current menu in
+one query, priced at today's prices and written with one INSERT for the
+order and one for all of its items, instead of resubmitting the cart through
+OrderCreateSerializer item by item.
+"""
+from django.db import transaction
+
+from foodieasy_backend.sharding import shard_for_restaurant
+from restaurants.models import MenuItem
+from restaurants.schedule import is_open_now
+
+from .models import Order, OrderItem
+from .outbox import record_order_created
+
+
+AVAILABLE = 'available'
+UNAVAILABLE = 'unavailable'
+REMOVED = 'removed'
+
+
+class ReorderError(Exception):
+    """The order cannot be placed again; ``items`` is the per-item diff, if any"""
+
+    def __init__(self, message, items=None):
+        super().__init__(message)
+        self.items = items or []
+
+
+def diff_items(order, menu_items):
+    """
+    One row per item of ``order`` comparing it with the current menu
+    (``{id: MenuItem}``): its availability, and its old and current price.
+    """
+    rows = []
+    for item in order.items.all():
+        menu_item = menu_items.get(item.menu_item_id)
+        if menu_item is None:
+            availability = REMOVED
+        elif not menu_item.is_available:
+            availability = UNAVAILABLE
+        else:
+            availability = AVAILABLE
+        rows.append({
+            'menu_item': item.menu_item_id,
+            'menu_item_name': menu_item.name if menu_item else item.menu_item_name,
+            'quantity': item.quantity,
+            'status': availability,
+            # Rendered like the serializers' money fields
+            'price_at_order': str(item.price_at_order),
+            'current_price': str(menu_item.price) if menu_item else None,
+        })
+    return rows
+
+
+def reorder(order, customer, delivery_address=None, partial=False):
+    """
+    Place ``order`` (live or archived, with ``items`` prefetched) again for
+    ``customer``. Raises ReorderError with the item diff when some items
+    can no longer be ordered, unless ``partial`` is set and at least one can.
+    """
+    restaurant = order.restaurant
+    if not is_open_now(restaurant):
+        raise ReorderError(f"{restaurant.name} is not accepting orders right now.")
+
+    shard = shard_for_restaurant(restaurant.id)
+    menu_item_ids = {item.menu_item_id for item in order.items.all()} - {None}
+    menu_items = MenuItem.objects.using(shard).filter(
+        restaurant_id=restaurant.id, id__in=menu_item_ids
+    ).only('id', 'name', 'category', 'price', 'is_available').in_bulk()
+
+    rows = diff_items(order, menu_items)
+    lines = [
+        (menu_items[row['menu_item']], row['quantity'])
+        for row in rows if row['status'] == AVAILABLE
+    ]
+    if not lines:
+        raise ReorderError('None of the items of this order are available any more.', rows)
+    if len(lines) < len(rows) and not partial:
+        raise ReorderError('Some items of this order are no longer available.', rows)
+
+    with transaction.atomic(using=shard):
+        new_order = Order.objects.using(shard).create(
+            customer=customer,
+            restaurant=restaurant,
+            delivery_address=delivery_address or order.delivery_address,
+            status='PENDING',
+            total_amount=sum(menu_item.price * quantity for menu_item, quantity in lines),
+        )
+        items = OrderItem.objects.using(shard).bulk_create([
+            OrderItem(
+                order=new_order,
+                menu_item=menu_item,
+                menu_item_name=menu_item.name,
+                menu_item_category=menu_item.category,
+                quantity=quantity,
+                price_at_order=menu_item.price,
+            )
+            for menu_item, quantity in lines
+        ])
+        record_order_created(new_order, items)
+    return new_order, rows
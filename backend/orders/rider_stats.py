@@ -0,0 +1,155 @@
+"""
+Rider delivery summaries computed with aggregate queries.
+
+A rider delivers for restaurants on every shard, so each query runs on
+every shard (see foodieasy_backend.sharding) and the per-day buckets,
+totals and active jobs are merged in Python.
+
+Summaries are cached per rider. Instead of tracking every cached key, each
+rider has a version number in the cache that is bumped whenever one of
+their orders changes status or they are assigned an order; stale entries
+are simply never read again and expire on their own. Keys also carry the
+local date, so "today" and the per-day window roll over at midnight rather
+than when the entry expires.
+
+As with catalogue payloads (restaurants.cache), summaries are only cached
+when ``SHARED_CACHE`` is set: the version is bumped by whichever process
+handled the change, and a per-process cache would let every other process
+keep serving the old summary.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from foodieasy_backend.sharding import fan_out, shard_aliases
+
+from .models import Order
+
+
+SUMMARY_CACHE_TIMEOUT = 60 * 10
+MAX_SUMMARY_DAYS = 30
+ACTIVE_JOB_STATUSES = ('READY_FOR_PICKUP', 'OUT_FOR_DELIVERY')
+
+
+def _version_key(rider_id):
+    return f'rider-summary-version:{rider_id}'
+
+
+def invalidate_rider_summary(rider_id):
+    """Make any cached summary for the rider stale"""
+    if rider_id is None:
+        return
+    try:
+        cache.incr(_version_key(rider_id))
+    except ValueError:
+        cache.set(_version_key(rider_id), 1, None)
+
+
+def _duration_minutes(duration):
+    if duration is None:
+        return None
+    return round(duration.total_seconds() / 60, 1)
+
+
+def _money(value):
+    """Render a Decimal sum the way serializers render money fields"""
+    return str((value or Decimal('0')).quantize(Decimal('0.01')))
+
+
+def build_rider_summary(rider_id, days, today=None):
+    """Run the summary queries for one rider (uncached)"""
+    today = today or timezone.localdate()
+    since = timezone.now() - timedelta(days=days)
+    orders = Order.objects.filter(rider_id=rider_id)
+
+    per_day = {}
+    for row in fan_out(
+        orders.filter(status='DELIVERED', delivered_at__gte=since)
+        .annotate(day=TruncDate('delivered_at'))
+        .values('day')
+        .annotate(deliveries=Count('id'), delivered_value=Sum('total_amount'))
+        .order_by('-day')
+    ):
+        deliveries, value = per_day.get(row['day'], (0, Decimal('0')))
+        per_day[row['day']] = (deliveries + row['deliveries'], value + row['delivered_value'])
+
+    totals = {'deliveries': 0, 'cancelled': 0}
+    timed, delivery_time = 0, timedelta()
+    for alias in shard_aliases():
+        shard_totals = orders.using(alias).aggregate(
+            deliveries=Count('id', filter=Q(status='DELIVERED')),
+            cancelled=Count('id', filter=Q(status='CANCELLED')),
+            timed=Count('id', filter=Q(status='DELIVERED', picked_up_at__isnull=False)),
+            average_delivery_time=Avg(
+                ExpressionWrapper(F('delivered_at') - F('picked_up_at'), output_field=DurationField()),
+                filter=Q(status='DELIVERED', picked_up_at__isnull=False)
+            ),
+        )
+        totals['deliveries'] += shard_totals['deliveries']
+        totals['cancelled'] += shard_totals['cancelled']
+        if shard_totals['timed']:
+            timed += shard_totals['timed']
+            delivery_time += shard_totals['average_delivery_time'] * shard_totals['timed']
+
+    active_jobs = fan_out(
+        orders.filter(status__in=ACTIVE_JOB_STATUSES)
+        .order_by('created_at')
+        .values(
+            'id', 'status', 'restaurant_id', 'restaurant__name',
+            'restaurant__address', 'delivery_address', 'picked_up_at', 'created_at'
+        ),
+        limit=1
+    )
+    active_job = active_jobs[0] if active_jobs else None
+
+    deliveries_per_day = [
+        {
+            'date': day,
+            'deliveries': deliveries,
+            'delivered_value': _money(value),
+        }
+        for day, (deliveries, value) in sorted(per_day.items(), reverse=True)
+    ]
+
+    return {
+        'rider_id': rider_id,
+        'days': days,
+        'today': next(
+            (row for row in deliveries_per_day if row['date'] == today),
+            {'date': today, 'deliveries': 0, 'delivered_value': '0.00'}
+        ),
+        'deliveries_per_day': deliveries_per_day,
+        'totals': {
+            'deliveries': totals['deliveries'],
+            'cancelled': totals['cancelled'],
+            'average_delivery_minutes': _duration_minutes(delivery_time / timed) if timed else None,
+        },
+        'active_job': active_job and {
+            'order_id': active_job['id'],
+            'status': active_job['status'],
+            'restaurant_id': active_job['restaurant_id'],
+            'restaurant_name': active_job['restaurant__name'],
+            'restaurant_address': active_job['restaurant__address'],
+            'delivery_address': active_job['delivery_address'],
+            'picked_up_at': active_job['picked_up_at'],
+        },
+    }
+
+
+def get_rider_summary(rider_id, days=7):
+    """Return the rider's summary, from the shared cache when still current"""
+    today = timezone.localdate()
+    if not getattr(settings, 'SHARED_CACHE', False):
+        return build_rider_summary(rider_id, days, today)
+    version = cache.get_or_set(_version_key(rider_id), 1, None)
+    key = f'rider-summary:{rider_id}:{version}:{today.isoformat()}:{days}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_rider_summary(rider_id, days, today)
+        cache.set(key, summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.db import transaction
-from .models import Order, OrderItem
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from .state_machine import can_transition, transition_error_message
+from .outbox import record_order_created
 from restaurants.models import MenuItem
+from restaurants.schedule import is_open_now
+from foodieasy_backend.sharding import shard_for_restaurant
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -11,20 +15,15 @@ class OrderItemSerializer(serializers.ModelSerializer):
     """
     Serializer for order items (read-only).
     """
-    menu_item_name = serializers.SerializerMethodField()
     subtotal = serializers.SerializerMethodField()
     
     class Meta:
         model = OrderItem
         fields = [
-            'id', 'menu_item', 'menu_item_name',
+            'id', 'menu_item', 'menu_item_name', 'menu_item_category',
             'quantity', 'price_at_order', 'subtotal'
         ]
     
-    def get_menu_item_name(self, obj):
-        """Return menu item name"""
-        return obj.menu_item.name
-    
     def get_subtotal(self, obj):
         """Return subtotal for this item"""
         return obj.subtotal
@@ -77,6 +76,35 @@ class OrderSerializer(serializers.ModelSerializer):
         return sum(item.quantity for item in obj.items.all())
 
 
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer for archived order items, shaped like OrderItemSerializer.
+    """
+    subtotal = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ArchivedOrderItem
+        fields = [
+            'id', 'menu_item', 'menu_item_name', 'menu_item_category',
+            'quantity', 'price_at_order', 'subtotal'
+        ]
+    
+    def get_subtotal(self, obj):
+        """Return subtotal for this item"""
+        return obj.subtotal
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    """
+    Serializer for archived orders, producing the same fields as OrderSerializer.
+    """
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+        read_only_fields = OrderSerializer.Meta.fields
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating orders.
@@ -111,12 +139,20 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         restaurant = attrs.get('restaurant')
         items_data = attrs.get('items')
         
+        # Reject orders to closed restaurants before looking at any item
+        if not is_open_now(restaurant):
+            raise serializers.ValidationError(
+                {'restaurant': f"{restaurant.name} is closed right now."}
+            )
+        
+        menu_items = MenuItem.objects.using(shard_for_restaurant(restaurant.id))
+        
         # Verify all menu items belong to the restaurant and are available
         for item in items_data:
             try:
-                menu_item = MenuItem.objects.get(id=item['menu_item'])
+                menu_item = menu_items.get(id=item['menu_item'])
                 
-                if menu_item.restaurant != restaurant:
+                if menu_item.restaurant_id != restaurant.id:
                     raise serializers.ValidationError(
                         f"Menu item '{menu_item.name}' does not belong to this restaurant."
                     )
@@ -133,14 +169,18 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         
         return attrs
     
-    @transaction.atomic
     def create(self, validated_data):
-        """Create order with items in a transaction"""
+        """Create order with items in a transaction on the restaurant's shard"""
+        shard = shard_for_restaurant(validated_data['restaurant'].id)
+        with transaction.atomic(using=shard):
+            return self._create(validated_data, shard)
+    
+    def _create(self, validated_data, shard):
         items_data = validated_data.pop('items')
         request = self.context.get('request')
         
         # Create the order
-        order = Order.objects.create(
+        order = Order.objects.using(shard).create(
             customer=request.user,
             restaurant=validated_data['restaurant'],
             delivery_address=validated_data['delivery_address'],
@@ -149,16 +189,19 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         
         # Create order items and calculate total
         total = 0
+        order_items = []
         for item_data in items_data:
-            menu_item = MenuItem.objects.get(id=item_data['menu_item'])
+            menu_item = MenuItem.objects.using(shard).get(id=item_data['menu_item'])
             quantity = item_data['quantity']
             
-            OrderItem.objects.create(
+            order_items.append(OrderItem.objects.using(shard).create(
                 order=order,
                 menu_item=menu_item,
+                menu_item_name=menu_item.name,
+                menu_item_category=menu_item.category,
                 quantity=quantity,
                 price_at_order=menu_item.price
-            )
+            ))
             
             total += menu_item.price * quantity
         
@@ -166,6 +209,8 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         order.total_amount = total
         order.save(update_fields=['total_amount'])
         
+        record_order_created(order, order_items)
+        
         return order
 
 
@@ -181,9 +226,9 @@ class OrderStatusUpdateSerializer(serializers.Serializer):
         order = self.context.get('order')
         new_status = attrs['status']
         
-        if not order.can_transition_to(new_status):
+        if not can_transition(order.status, new_status):
             raise serializers.ValidationError(
-                f"Cannot transition from {order.get_status_display()} to {dict(Order.STATUS_CHOICES)[new_status]}."
+                transition_error_message(order.status, new_status)
             )
         
         # Require cancellation reason if cancelling
@@ -195,6 +240,38 @@ class OrderStatusUpdateSerializer(serializers.Serializer):
         return attrs
 
 
+class BulkStatusUpdateSerializer(serializers.Serializer):
+    """
+    Serializer for moving many orders to one status.
+    """
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=200
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    cancellation_reason = serializers.CharField(required=False, allow_blank=True)
+    
+    def validate(self, attrs):
+        """Require cancellation reason if cancelling"""
+        if attrs['status'] == 'CANCELLED' and not attrs.get('cancellation_reason'):
+            raise serializers.ValidationError(
+                'Cancellation reason is required when cancelling an order.'
+            )
+        return attrs
+
+
+class ReorderSerializer(serializers.Serializer):
+    """
+    Serializer for placing a past order again.
+    """
+    delivery_address = serializers.CharField(required=False)
+    partial = serializers.BooleanField(
+        default=False,
+        help_text='Order the available items when some are no longer available'
+    )
+
+
 class RiderAssignmentSerializer(serializers.Serializer):
     """
     Serializer for assigning a rider to an order.
@@ -0,0 +1,236 @@
+"""
+Order status state machine.
+
+All transition rules live here as tables built once at import time:
+
+- ``TRANSITIONS``: which statuses each status may move to
+- ``ROLE_TARGETS``: which target statuses each kind of actor may request
+- ``TIMESTAMP_FIELDS``: which ``Order`` timestamp a transition stamps
+
+so validating a transition is a couple of dict/set lookups. Writes are a
+single conditional UPDATE (``WHERE status = <expected>``), which also
+detects concurrent changes, and ``bulk_transition`` moves many orders with
+one UPDATE per source status.
+
+Every transition writes an outbox event in the same transaction (see
+orders.outbox). Side effects (notifications, rollups, cache invalidation)
+register with ``on_transition`` and run after the transaction commits.
+"""
+from collections import defaultdict
+
+from django.db import router, transaction
+from django.utils import timezone
+
+
+PENDING = 'PENDING'
+PREPARING = 'PREPARING'
+READY_FOR_PICKUP = 'READY_FOR_PICKUP'
+OUT_FOR_DELIVERY = 'OUT_FOR_DELIVERY'
+DELIVERED = 'DELIVERED'
+CANCELLED = 'CANCELLED'
+
+STATUSES = (PENDING, PREPARING, READY_FOR_PICKUP, OUT_FOR_DELIVERY, DELIVERED, CANCELLED)
+TERMINAL_STATUSES = frozenset({DELIVERED, CANCELLED})
+
+TRANSITIONS = {
+    PENDING: frozenset({PREPARING, CANCELLED}),
+    PREPARING: frozenset({READY_FOR_PICKUP, CANCELLED}),
+    READY_FOR_PICKUP: frozenset({OUT_FOR_DELIVERY, CANCELLED}),
+    OUT_FOR_DELIVERY: frozenset({DELIVERED}),
+    DELIVERED: frozenset(),
+    CANCELLED: frozenset(),
+}
+
+# Actors are the user's relationship to a specific order
+ADMIN = 'ADMIN'
+RESTAURANT = 'RESTAURANT'
+RIDER = 'RIDER'
+CUSTOMER = 'CUSTOMER'
+
+ROLE_TARGETS = {
+    ADMIN: frozenset(STATUSES),
+    RESTAURANT: frozenset({PREPARING, READY_FOR_PICKUP, CANCELLED}),
+    RIDER: frozenset({OUT_FOR_DELIVERY, DELIVERED}),
+    CUSTOMER: frozenset({CANCELLED}),
+}
+
+# Customers may only cancel orders the kitchen has not started
+ROLE_SOURCES = {
+    CUSTOMER: frozenset({PENDING}),
+}
+
+TIMESTAMP_FIELDS = {
+    PREPARING: 'prepared_at',
+    OUT_FOR_DELIVERY: 'picked_up_at',
+    DELIVERED: 'delivered_at',
+    CANCELLED: 'cancelled_at',
+}
+
+# (actor, current status) -> statuses that actor may request
+_REQUESTABLE = {
+    (actor, source): frozenset()
+    if source not in ROLE_SOURCES.get(actor, STATUSES)
+    else targets
+    for actor, targets in ROLE_TARGETS.items()
+    for source in STATUSES
+}
+
+
+class TransitionError(Exception):
+    """Raised when a transition is not allowed"""
+
+
+class ConcurrentTransitionError(TransitionError):
+    """Raised when the order's status changed before the write landed"""
+
+
+def can_transition(from_status, to_status):
+    """Return True if the state machine allows from_status -> to_status"""
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def actor_for(user, order):
+    """
+    Return the user's actor kind for this order, or None if the user has
+    no relationship to it. Compares ids so no related rows are loaded.
+    """
+    if user.role == 'ADMIN':
+        return ADMIN
+    if order.restaurant.owner_id == user.id:
+        return RESTAURANT
+    if user.role == 'RIDER' and order.rider_id == user.id:
+        return RIDER
+    if user.role == 'CUSTOMER' and order.customer_id == user.id:
+        return CUSTOMER
+    return None
+
+
+def may_request(actor, from_status, to_status):
+    """Return True if the actor may ask for this target status"""
+    return to_status in _REQUESTABLE.get((actor, from_status), ())
+
+
+def transition_error_message(from_status, to_status):
+    """Human-readable rejection message using the status labels"""
+    from .models import Order
+
+    labels = dict(Order.STATUS_CHOICES)
+    return f"Cannot transition from {labels.get(from_status, from_status)} to {labels.get(to_status, to_status)}."
+
+
+def _update_values(to_status, at, cancellation_reason=''):
+    values = {'status': to_status}
+    timestamp_field = TIMESTAMP_FIELDS.get(to_status)
+    if timestamp_field:
+        values[timestamp_field] = at
+    if to_status == CANCELLED:
+        values['cancellation_reason'] = cancellation_reason
+    return values
+
+
+def transition(order, to_status, cancellation_reason='', actor=None):
+    """
+    Move one order to ``to_status`` with a single conditional UPDATE and
+    update the instance in place. Hooks run after commit.
+    """
+    from .models import Order
+
+    from_status = order.status
+    if not can_transition(from_status, to_status):
+        raise TransitionError(transition_error_message(from_status, to_status))
+
+    values = _update_values(to_status, timezone.now(), cancellation_reason)
+    # The order's own database (its restaurant's shard when sharded)
+    using = router.db_for_write(Order, instance=order)
+    with transaction.atomic(using=using):
+        updated = Order.objects.using(using).filter(pk=order.pk, status=from_status).update(**values)
+        if not updated:
+            raise ConcurrentTransitionError('Order status changed, please reload and try again.')
+        for field, value in values.items():
+            setattr(order, field, value)
+        _dispatch(Transition([order.pk], from_status, to_status, values, actor, orders=[order], using=using))
+
+    return order
+
+
+def bulk_transition(orders, to_status, cancellation_reason='', actor=None):
+    """
+    Move every order in the ``orders`` queryset that may reach ``to_status``.
+    Issues one UPDATE per source status. Returns ``(moved, rejected)``, both
+    ``{order_id: from_status}``; rejected orders were not in a status that
+    can reach ``to_status`` and are left untouched.
+    """
+    from .models import Order
+
+    values = _update_values(to_status, timezone.now(), cancellation_reason)
+    moved, rejected = {}, {}
+    using = orders.db
+
+    with transaction.atomic(using=using):
+        groups = defaultdict(list)
+        for order_id, from_status in orders.select_for_update().values_list('id', 'status'):
+            if can_transition(from_status, to_status):
+                groups[from_status].append(order_id)
+            else:
+                rejected[order_id] = from_status
+
+        for from_status, order_ids in groups.items():
+            Order.objects.using(using).filter(id__in=order_ids, status=from_status).update(**values)
+            moved.update((order_id, from_status) for order_id in order_ids)
+            _dispatch(Transition(order_ids, from_status, to_status, values, actor, using=using))
+
+    return moved, rejected
+
+
+class Transition:
+    """
+    What happened in one transition write, passed to hooks. ``orders`` holds
+    the instances when the caller had them; ``get_orders()`` loads them
+    otherwise. ``using`` is the database the write went to.
+    """
+
+    def __init__(self, order_ids, from_status, to_status, values, actor=None, orders=None, using=None):
+        self.order_ids = list(order_ids)
+        self.from_status = from_status
+        self.to_status = to_status
+        self.values = values
+        self.actor = actor
+        self.orders = orders
+        self.using = using
+
+    @property
+    def at(self):
+        return self.values.get(TIMESTAMP_FIELDS.get(self.to_status))
+
+    def get_orders(self):
+        from .models import Order
+        if self.orders is None:
+            self.orders = list(Order.objects.using(self.using).filter(id__in=self.order_ids))
+        return self.orders
+
+
+_hooks = defaultdict(list)
+
+
+def on_transition(*to_statuses):
+    """
+    Register a post-commit hook for transitions into ``to_statuses`` (all
+    statuses when none are given). Hooks receive a ``Transition``.
+    """
+    def register(func):
+        for to_status in to_statuses or STATUSES:
+            if func not in _hooks[to_status]:
+                _hooks[to_status].append(func)
+        return func
+    return register
+
+
+def _dispatch(event):
+    from .outbox import record_transition
+
+    # The outbox row is part of the transition's own transaction...
+    record_transition(event)
+
+    # ...while hooks run after commit; a failing one is logged, never raised
+    for hook in _hooks.get(event.to_status, ()):
+        transaction.on_commit(lambda hook=hook: hook(event), using=event.using, robust=True)
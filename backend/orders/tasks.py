@@ -0,0 +1,50 @@
+"""
+Background tasks for the orders app (run by ``manage.py run_worker``).
+"""
+from django.core.management import call_command
+
+from foodieasy_backend.sharding import shard_aliases
+from jobs.queue import task
+
+from .eta import record_delivery
+from .exports import iter_export, filter_orders
+from .history import record_terminal_orders
+from .models import ArchivedOrder, Order
+from .outbox import drain_batch, get_sinks
+
+
+@task('orders.record_deliveries')
+def record_deliveries(order_ids, using=None):
+    """Feed delivered orders (on database ``using``) into their restaurants' ETA sketches"""
+    for order in Order.objects.using(using).filter(id__in=order_ids, status='DELIVERED'):
+        record_delivery(order)
+
+
+@task('orders.record_order_history')
+def record_order_history(order_ids, using=None):
+    """Add finished orders (on database ``using``) to their customers' precomputed history"""
+    record_terminal_orders(order_ids, using=using)
+
+
+@task('orders.drain_outbox')
+def drain_outbox(batch_size=100):
+    """Deliver everything currently due in the order event outbox"""
+    sinks = get_sinks()
+    for alias in shard_aliases():
+        while drain_batch(sinks, batch_size, using=alias):
+            pass
+
+
+@task('orders.purge_idempotency_keys')
+def purge_idempotency_keys():
+    call_command('purge_idempotency_keys', verbosity=0)
+
+
+@task('orders.export_orders')
+def export_orders(path, file_format='csv', since=None, until=None, statuses=None, restaurant=None):
+    """Write an order export to ``path`` on the worker, e.g. for nightly reports"""
+    orders = filter_orders(Order.objects.all(), since, until, statuses, restaurant)
+    archived = filter_orders(ArchivedOrder.objects.all(), since, until, statuses, restaurant)
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        for chunk in iter_export(orders, file_format, archived=archived):
+            output.write(chunk)
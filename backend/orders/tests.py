@@ -1,3 +1,1145 @@
-from django.test import TestCase
+import csv
+import json
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from jobs.models import Job
+from jobs.queue import claim_jobs, execute_job
+from restaurants.models import MenuItem, Restaurant
+from restaurants.schedule import get_index
+from .archive import archive_batch
+from .dashboard import build_dashboard, clear_dashboard_cache, get_dashboard
+from .eta import P2Quantile, format_estimate
+from .idempotency import idempotent
+from .exports import iter_export
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, DeliveryEstimate, IdempotencyKey, Order, OrderEvent, OrderItem
+)
+from .history import record_terminal_orders
+from .outbox import BaseSink, QueueSink, drain_batch, event_queue
+from .rider_stats import build_rider_summary, get_rider_summary
+from .state_machine import (
+    ConcurrentTransitionError, TransitionError, _hooks, bulk_transition, on_transition, transition
+)
+from .views import OrderViewSet
+
+User = get_user_model()
+
+
+class QueryPlanAssertionsMixin:
+    """
+    EXPLAIN-based assertions for the SQL an endpoint actually runs.
+
+    Supports SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN). On
+    PostgreSQL sequential scans are disabled while explaining so the plan
+    reflects what the planner does once tables are large, not what is
+    cheapest for a small fixture.
+    """
+
+    def capture_order_query(self, client, url):
+        """Request ``url`` and return the SQL of its main orders_order SELECT"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if sql.startswith('SELECT') and 'FROM "orders_order"' in sql:
+                return sql
+        self.fail(f'No orders_order query issued for {url}')
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                return '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertIndexedWithoutSort(self, sql, index_name=None):
+        """
+        Assert the plan scans orders_order through an index and never sorts.
+        ``index_name`` is only checked on PostgreSQL, whose planner accounts
+        for partial index size; SQLite may pick any equally sort-free index.
+        """
+        plan = self.explain(sql)
+        if connection.vendor == 'postgresql':
+            self.assertRegex(plan, r'Index (Only )?Scan', plan)
+            self.assertNotRegex(plan, r'\bSort\b', plan)
+        else:
+            self.assertRegex(plan, r'USING (COVERING )?INDEX', plan)
+            self.assertNotIn('TEMP B-TREE', plan, plan)
+        if index_name and connection.vendor == 'postgresql':
+            self.assertIn(index_name, plan, plan)
+        return plan
+
+
+class OrderQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    """
+    Each OrderViewSet access path must be served by an index in -created_at
+    order, with no sort step.
+    """
+    ORDER_COUNT = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        cls.owners = [
+            User.objects.create_user(
+                email=f'owner{i}@example.com', role='RESTAURANT_OWNER'
+            )
+            for i in range(5)
+        ]
+        cls.restaurants = [
+            Restaurant.objects.create(
+                owner=owner, name=f'Restaurant {i}', address='1 Main St', phone_number='0'
+            )
+            for i, owner in enumerate(cls.owners)
+        ]
+        cls.customers = [
+            User.objects.create_user(email=f'customer{i}@example.com', role='CUSTOMER')
+            for i in range(20)
+        ]
+        cls.riders = [
+            User.objects.create_user(email=f'rider{i}@example.com', role='RIDER')
+            for i in range(10)
+        ]
+        cls.admin = User.objects.create_user(email='admin@example.com', role='ADMIN')
+
+        statuses = [code for code, _ in Order.STATUS_CHOICES]
+        now = timezone.now()
+        orders = []
+        for _ in range(cls.ORDER_COUNT):
+            order_status = rng.choice(statuses)
+            unassigned = (
+                order_status in ('PENDING', 'PREPARING', 'READY_FOR_PICKUP')
+                and rng.random() < 0.8
+            )
+            orders.append(Order(
+                customer=rng.choice(cls.customers),
+                restaurant=rng.choice(cls.restaurants),
+                rider=None if unassigned else rng.choice(cls.riders),
+                status=order_status,
+                total_amount=Decimal('10.00'),
+                delivery_address='2 High St',
+            ))
+        orders = Order.objects.bulk_create(orders)
+        # created_at is auto_now_add, so spread it over 90 days afterwards
+        for order in orders:
+            order.created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=500)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_admin_list(self):
+        sql = self.capture_order_query(self.client_for(self.admin), '/api/orders/')
+        self.assertIndexedWithoutSort(sql)
+
+    def test_admin_list_filtered_by_status(self):
+        sql = self.capture_order_query(self.client_for(self.admin), '/api/orders/?status=DELIVERED')
+        self.assertIndexedWithoutSort(sql)
+
+    def test_customer_orders(self):
+        client = self.client_for(self.customers[0])
+        self.assertIndexedWithoutSort(self.capture_order_query(client, '/api/orders/'))
+        self.assertIndexedWithoutSort(self.capture_order_query(client, '/api/orders/my_orders/'))
+
+    def test_restaurant_owner_orders(self):
+        client = self.client_for(self.owners[0])
+        self.assertIndexedWithoutSort(self.capture_order_query(client, '/api/orders/'))
+        self.assertIndexedWithoutSort(self.capture_order_query(client, '/api/orders/?status=PREPARING'))
+
+    def test_restaurant_owner_pending_orders(self):
+        sql = self.capture_order_query(self.client_for(self.owners[0]), '/api/orders/pending_orders/')
+        self.assertIndexedWithoutSort(sql)
+
+    def test_rider_deliveries(self):
+        sql = self.capture_order_query(self.client_for(self.riders[0]), '/api/orders/')
+        self.assertIndexedWithoutSort(sql)
+
+    def test_rider_pending_orders_use_partial_index(self):
+        sql = self.capture_order_query(self.client_for(self.riders[0]), '/api/orders/pending_orders/')
+        self.assertIndexedWithoutSort(sql, index_name='order_awaiting_rider_idx')
+
+
+class CustomerOrderHistoryTests(TestCase):
+    """Terminal orders come from the precomputed history, active ones live"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='owner@history.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        cls.menu_item = MenuItem.objects.create(restaurant=cls.restaurant, name='Ramen', price=Decimal('9.50'))
+        cls.customer = User.objects.create_user(email='customer@history.test', role='CUSTOMER')
+
+    def place_orders(self, count, order_status):
+        orders = Order.objects.bulk_create([
+            Order(
+                customer=self.customer, restaurant=self.restaurant, status=order_status,
+                total_amount=Decimal('19.00'), delivery_address='2 High St'
+            )
+            for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, menu_item=self.menu_item, menu_item_name='Ramen',
+                menu_item_category='MAIN_COURSE', quantity=2, price_at_order=Decimal('9.50')
+            )
+            for order in orders
+        ])
+        return orders
+
+    def get_history(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.get('/api/orders/history/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_history_is_read_in_constant_queries(self):
+        self.place_orders(3, 'DELIVERED')
+        self.get_history()  # builds the history on first read
+
+        with CaptureQueriesContext(connection) as few:
+            self.get_history()
+        record_terminal_orders([order.id for order in self.place_orders(50, 'DELIVERED')])
+        with CaptureQueriesContext(connection) as many:
+            data = self.get_history()
+
+        self.assertEqual(len(data['history']), 53)
+        self.assertEqual(len(many), len(few))
+
+    def test_finished_orders_move_from_active_to_history(self):
+        [order] = self.place_orders(1, 'OUT_FOR_DELIVERY')
+        data = self.get_history()
+        self.assertEqual([row['id'] for row in data['active']], [order.id])
+        self.assertEqual(data['history'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(order, 'DELIVERED')
+        # The history is updated by a background job, off the request
+        [job] = Job.objects.filter(name='orders.record_order_history')
+        self.assertEqual(self.get_history()['history'], [])
+        claim_jobs(10)
+        self.assertEqual(execute_job(job.id), 'SUCCEEDED')
+
+        data = self.get_history()
+        self.assertEqual(data['active'], [])
+        [entry] = data['history']
+        self.assertEqual(entry['id'], order.id)
+        self.assertEqual(entry['status'], 'DELIVERED')
+        self.assertEqual(entry['restaurant_name'], 'Noodle Bar')
+        self.assertEqual(entry['items'], [
+            {'menu_item': self.menu_item.id, 'name': 'Ramen', 'quantity': 2, 'price_at_order': '9.50'}
+        ])
+
+    def test_order_items_keep_their_snapshot_after_the_menu_item_is_deleted(self):
+        [order] = self.place_orders(1, 'DELIVERED')
+        self.menu_item.delete()
+        client = APIClient()
+        client.force_authenticate(self.customer)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/api/orders/{order.id}/')
+        [item] = response.data['items']
+        self.assertEqual((item['menu_item'], item['menu_item_name']), (None, 'Ramen'))
+        self.assertFalse([query for query in queries if 'restaurants_menuitem' in query['sql']])
+
+
+class ReorderTests(TestCase):
+    """POST /api/orders/{id}/reorder/ clones a past order at current prices"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='owner@reorder.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        cls.customer = User.objects.create_user(email='customer@reorder.test', role='CUSTOMER')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def past_order(self, item_count):
+        menu_items = MenuItem.objects.bulk_create([
+            MenuItem(restaurant=self.restaurant, name=f'Dish {i}', price=Decimal('5.00'))
+            for i in range(item_count)
+        ])
+        order = Order.objects.create(
+            customer=self.customer, restaurant=self.restaurant, status='DELIVERED',
+            total_amount=Decimal('5.00') * item_count, delivery_address='2 High St'
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, menu_item=menu_item, menu_item_name=menu_item.name,
+                quantity=1, price_at_order=menu_item.price
+            )
+            for menu_item in menu_items
+        ])
+        return order, menu_items
+
+    def test_reorder_uses_current_prices_in_constant_queries(self):
+        small, _ = self.past_order(1)
+        large, menu_items = self.past_order(20)
+        MenuItem.objects.filter(id=menu_items[0].id).update(price=Decimal('6.00'))
+        # Built once per process, on first use
+        get_index()
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(f'/api/orders/{small.id}/reorder/', {}, format='json')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.post(f'/api/orders/{large.id}/reorder/', {}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['order']['total_amount'], '101.00')
+        self.assertEqual(response.data['order']['status'], 'PENDING')
+        self.assertEqual(response.data['items'][0]['current_price'], '6.00')
+        self.assertEqual(len(many), len(few))
+
+    def test_unavailable_items_return_a_diff_unless_partial(self):
+        order, menu_items = self.past_order(2)
+        menu_items[1].is_available = False
+        menu_items[1].save()
+        orders_before = Order.objects.count()
+
+        response = self.client.post(f'/api/orders/{order.id}/reorder/', {}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            [row['status'] for row in response.data['items']], ['available', 'unavailable']
+        )
+        self.assertEqual(Order.objects.count(), orders_before)
+
+        response = self.client.post(f'/api/orders/{order.id}/reorder/', {'partial': True}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [item['menu_item'] for item in response.data['order']['items']], [menu_items[0].id]
+        )
+
+    def test_archived_orders_can_be_reordered_and_bad_ids_are_not_found(self):
+        order, _ = self.past_order(1)
+        archive_batch(timezone.now() + timedelta(days=1), batch_size=10)
+
+        response = self.client.post(f'/api/orders/{order.id}/reorder/', {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        for pk in ('abc', '999999'):
+            with self.subTest(pk=pk):
+                response = self.client.post(f'/api/orders/{pk}/reorder/', {}, format='json')
+                self.assertEqual(response.status_code, 404)
+
+
+def exact_quantile(values, p):
+    ordered = sorted(values)
+    return ordered[round(p * (len(ordered) - 1))]
+
+
+class DeliveryEstimateTests(TestCase):
+    """P-square sketches track known quantiles; the rebuild command replays history"""
+
+    def test_p2_estimates_are_close_to_exact_quantiles(self):
+        rng = random.Random(26)
+        samples = {
+            'uniform': [rng.uniform(0, 3600) for _ in range(5000)],
+            'exponential': [rng.expovariate(1 / 900) for _ in range(5000)],
+            'normal': [rng.gauss(1800, 300) for _ in range(5000)],
+        }
+        for name, values in samples.items():
+            for p in (0.5, 0.9):
+                estimator = P2Quantile(p)
+                for value in values:
+                    estimator.add(value)
+                exact = exact_quantile(values, p)
+                with self.subTest(distribution=name, p=p):
+                    self.assertLess(abs(estimator.value() - exact) / exact, 0.03)
+
+    def test_serialised_state_continues_where_it_left_off(self):
+        rng = random.Random(1)
+        values = [rng.uniform(0, 100) for _ in range(200)]
+        whole = P2Quantile(0.9)
+        for value in values:
+            whole.add(value)
+
+        split = P2Quantile(0.9)
+        for value in values[:100]:
+            split.add(value)
+        split = P2Quantile.from_dict(split.to_dict(), 0.9)
+        for value in values[100:]:
+            split.add(value)
+        self.assertEqual(split.value(), whole.value())
+
+    def test_small_samples_use_the_observations_themselves(self):
+        estimator = P2Quantile(0.5)
+        self.assertIsNone(estimator.value())
+        for value in (30, 10, 20):
+            estimator.add(value)
+        self.assertEqual(estimator.value(), 20)
+
+    def test_rebuild_command_replays_delivered_orders(self):
+        owner = User.objects.create_user(email='owner@eta.test', role='RESTAURANT_OWNER')
+        restaurant = Restaurant.objects.create(
+            owner=owner, name='Curry House', address='1 Main St', phone_number='0'
+        )
+        customer = User.objects.create_user(email='customer@eta.test', role='CUSTOMER')
+        orders = Order.objects.bulk_create([
+            Order(
+                customer=customer, restaurant=restaurant, status='DELIVERED',
+                total_amount=Decimal('10.00'), delivery_address='2 High St'
+            )
+            for _ in range(30)
+        ])
+        start = timezone.now() - timedelta(days=1)
+        for i, order in enumerate(orders):
+            created_at = start + timedelta(minutes=i)
+            # 15 minutes in the kitchen, 20 on the road
+            Order.objects.filter(id=order.id).update(
+                created_at=created_at,
+                picked_up_at=created_at + timedelta(minutes=15),
+                delivered_at=created_at + timedelta(minutes=35),
+            )
+        # Incomplete timestamps are skipped
+        Order.objects.filter(id=orders[0].id).update(picked_up_at=None)
+
+        call_command('rebuild_delivery_estimates', stdout=StringIO())
+
+        estimate = DeliveryEstimate.objects.get(restaurant=restaurant)
+        self.assertEqual(estimate.sample_count, 29)
+        self.assertEqual((estimate.prep_minutes, estimate.delivery_minutes), (15, 20))
+        self.assertEqual(format_estimate(estimate), '35 min')
+
+
+class IdempotencyKeyTests(TestCase):
+    """Idempotency-Key replays finished requests and guards unfinished ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='owner@idempotency.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=owner, name='Pizza Place', address='1 Main St', phone_number='0'
+        )
+        cls.menu_item = MenuItem.objects.create(restaurant=cls.restaurant, name='Margherita', price=Decimal('11.00'))
+        cls.customer = User.objects.create_user(email='customer@idempotency.test', role='CUSTOMER')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def place_order(self, key, quantity=1):
+        return self.client.post('/api/orders/', {
+            'restaurant': self.restaurant.id,
+            'delivery_address': '2 High St',
+            'items': [{'menu_item': self.menu_item.id, 'quantity': quantity}],
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_sequential_duplicates_are_replayed(self):
+        first = self.place_order('checkout-1')
+        second = self.place_order('checkout-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 1)
+
+        self.assertEqual(self.place_order('checkout-1', quantity=2).status_code, 422)
+
+    def keyed_request(self):
+        request = APIRequestFactory().post(
+            '/api/test/', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='concurrent'
+        )
+        force_authenticate(request, self.customer)
+        return Request(request, parsers=[JSONParser()])
+
+    def test_concurrent_duplicate_gets_409_then_the_stored_response(self):
+        duplicates = []
+
+        @idempotent
+        def view(viewset, request):
+            if not duplicates:
+                # The same key arrives again while the first request is still running
+                duplicates.append(view(viewset, self.keyed_request()))
+            return Response({'id': 7}, status=201, headers={'Location': '/api/orders/7/'})
+
+        response = view(None, self.keyed_request())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(duplicates[0].status_code, 409)
+
+        replay = view(None, self.keyed_request())
+        self.assertEqual((replay.status_code, replay.data), (201, {'id': 7}))
+        self.assertEqual(replay['Location'], '/api/orders/7/')
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_abandoned_requests_are_taken_over_after_the_lock_timeout(self):
+        self.place_order('checkout-2')
+        # As if the worker died before storing the response
+        record = IdempotencyKey.objects.get(key='checkout-2')
+        IdempotencyKey.objects.filter(id=record.id).update(status_code=None, response_body=None)
+        self.assertEqual(self.place_order('checkout-2').status_code, 409)
+
+        IdempotencyKey.objects.filter(id=record.id).update(
+            created_at=timezone.now() - settings.IDEMPOTENCY_LOCK_TIMEOUT - timedelta(seconds=1)
+        )
+        self.assertEqual(self.place_order('checkout-2').status_code, 201)
+        self.assertEqual(self.place_order('checkout-2')['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 2)
+
+
+class OrderExportTests(TestCase):
+    """CSV and NDJSON exports stream live and archived orders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@export.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        cls.menu_item = MenuItem.objects.create(restaurant=cls.restaurant, name='Ramen', price=Decimal('9.50'))
+        customer = User.objects.create_user(email='customer@export.test', role='CUSTOMER')
+        cls.orders = []
+        for order_status in ('DELIVERED', 'PENDING', 'DELIVERED', 'CANCELLED'):
+            order = Order.objects.create(
+                customer=customer, restaurant=cls.restaurant, status=order_status,
+                total_amount=Decimal('19.00'), delivery_address='2 High St'
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, menu_item=cls.menu_item, menu_item_name='Ramen',
+                    quantity=quantity, price_at_order=Decimal('9.50')
+                )
+                for quantity in (1, 2)
+            ])
+            cls.orders.append(order)
+        # Archives the first, third and fourth order
+        archive_batch(timezone.now() + timedelta(days=1), batch_size=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def export(self, query):
+        response = self.client.get(f'/api/orders/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_one_row_per_item_in_order_id_order(self):
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+        content = self.export('file_format=csv')
+        rows = list(csv.DictReader(StringIO(content)))
+
+        self.assertEqual(
+            [int(row['order_id']) for row in rows],
+            [order.id for order in self.orders for _ in range(2)]
+        )
+        self.assertEqual([row['quantity'] for row in rows[:2]], ['1', '2'])
+        self.assertEqual(rows[0]['restaurant_name'], 'Noodle Bar')
+        self.assertEqual(rows[0]['customer_email'], 'customer@export.test')
+
+    def test_ndjson_has_one_document_per_order(self):
+        lines = self.export('file_format=ndjson&status=DELIVERED,PENDING').splitlines()
+        documents = [json.loads(line) for line in lines]
+
+        self.assertEqual(
+            [document['order_id'] for document in documents], [order.id for order in self.orders[:3]]
+        )
+        self.assertEqual([item['quantity'] for item in documents[1]['items']], [1, 2])
+        self.assertEqual(documents[0]['total_amount'], '19.00')
+
+    def test_rows_are_streamed_in_chunks(self):
+        live = Order.objects.filter(restaurant=self.restaurant)
+        archived = ArchivedOrder.objects.filter(restaurant=self.restaurant)
+        lines = list(iter_export(live, 'csv', chunk_size=1, archived=archived))
+        self.assertEqual(len(lines), 1 + 2 * len(self.orders))
+
+        documents = list(iter_export(live, 'ndjson', chunk_size=1, archived=archived))
+        self.assertEqual(len(documents), len(self.orders))
+
+    def test_invalid_filters_and_roles_are_rejected(self):
+        for query in ('file_format=xml', 'status=LOST', 'since=yesterday', 'restaurant=abc'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/orders/export/?{query}')
+                self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(User.objects.get(email='customer@export.test'))
+        self.assertEqual(self.client.get('/api/orders/export/').status_code, 403)
+
+
+class ArchivedOrderViewTests(TestCase):
+    """Archived orders are still readable through the order endpoints"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='owner@archive.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        cls.customer = User.objects.create_user(email='customer@archive.test', role='CUSTOMER')
+        now = timezone.now()
+        cls.orders = {}
+        for name, order_status, days_ago in [
+            ('stuck', 'PENDING', 30), ('old', 'DELIVERED', 20),
+            ('recent', 'DELIVERED', 10), ('live', 'PENDING', 0),
+        ]:
+            order = Order.objects.create(
+                customer=cls.customer, restaurant=cls.restaurant, status=order_status,
+                total_amount=Decimal('9.50'), delivery_address='2 High St'
+            )
+            Order.objects.filter(id=order.id).update(created_at=now - timedelta(days=days_ago))
+            cls.orders[name] = order.id
+        archive_batch(now - timedelta(days=5), batch_size=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_archived_orders_are_retrieved_and_bad_ids_are_not_found(self):
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        response = self.client.get(f"/api/orders/{self.orders['old']}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.orders['old'])
+
+        for pk in ('abc', '999999'):
+            with self.subTest(pk=pk):
+                self.assertEqual(self.client.get(f'/api/orders/{pk}/').status_code, 404)
+
+    def test_my_orders_interleaves_live_and_archived_by_creation(self):
+        response = self.client.get('/api/orders/my_orders/')
+        self.assertEqual(
+            [order['id'] for order in response.data],
+            [self.orders[name] for name in ('live', 'recent', 'old', 'stuck')]
+        )
+
+
+class OrderTransitionTests(TestCase):
+    """Conditional status writes, their outbox events and post-commit hooks"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@transition.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        cls.customer = User.objects.create_user(email='customer@transition.test', role='CUSTOMER')
+
+    def make_order(self, order_status='PENDING'):
+        return Order.objects.create(
+            customer=self.customer, restaurant=self.restaurant, status=order_status,
+            total_amount=Decimal('9.50'), delivery_address='2 High St'
+        )
+
+    def record_hook(self, *to_statuses):
+        events = []
+        hook = on_transition(*to_statuses)(events.append)
+        for to_status in to_statuses:
+            self.addCleanup(_hooks[to_status].remove, hook)
+        return events
+
+    def test_transition_stamps_the_order_and_records_an_event(self):
+        order = self.make_order()
+        transition(order, 'PREPARING', actor='RESTAURANT')
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PREPARING')
+        self.assertIsNotNone(order.prepared_at)
+        [event] = OrderEvent.objects.filter(order_id=order.id)
+        self.assertEqual(event.event_type, 'order.status_changed')
+        self.assertEqual(
+            (event.payload['from_status'], event.payload['to_status'], event.payload['actor']),
+            ('PENDING', 'PREPARING', 'RESTAURANT')
+        )
+
+        with self.assertRaises(TransitionError):
+            transition(order, 'DELIVERED')
+        self.assertEqual(OrderEvent.objects.filter(order_id=order.id).count(), 1)
+
+    def test_stale_instances_are_rejected(self):
+        order = self.make_order()
+        stale = Order.objects.get(pk=order.pk)
+        transition(order, 'CANCELLED', cancellation_reason='Closed early')
+
+        with self.assertRaises(ConcurrentTransitionError):
+            transition(stale, 'PREPARING')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'CANCELLED')
+        self.assertIsNone(order.prepared_at)
+
+    def test_update_status_returns_409_when_the_order_changed_meanwhile(self):
+        order = self.make_order()
+        get_object = OrderViewSet.get_object
+
+        def get_stale_object(view):
+            found = get_object(view)
+            Order.objects.filter(pk=found.pk).update(status='CANCELLED')
+            return found
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        with mock.patch.object(OrderViewSet, 'get_object', get_stale_object):
+            response = client.post(f'/api/orders/{order.id}/update_status/', {'status': 'PREPARING'})
+        self.assertEqual(response.status_code, 409)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'CANCELLED')
+
+    def test_bulk_transition_updates_once_per_source_status(self):
+        orders = [
+            self.make_order(order_status)
+            for order_status in ('PENDING', 'PENDING', 'PREPARING', 'DELIVERED')
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            moved, rejected = bulk_transition(
+                Order.objects.filter(id__in=[order.id for order in orders]),
+                'CANCELLED', cancellation_reason='Out of stock'
+            )
+
+        self.assertEqual(
+            moved, {orders[0].id: 'PENDING', orders[1].id: 'PENDING', orders[2].id: 'PREPARING'}
+        )
+        self.assertEqual(rejected, {orders[3].id: 'DELIVERED'})
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "orders_order"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            Order.objects.filter(status='CANCELLED', cancellation_reason='Out of stock').count(), 3
+        )
+        self.assertEqual(OrderEvent.objects.filter(event_type='order.status_changed').count(), 3)
+
+    def test_hooks_run_after_commit_once_per_write(self):
+        events = self.record_hook('CANCELLED')
+        single = self.make_order()
+        orders = [self.make_order('PENDING'), self.make_order('PREPARING')]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(single, 'CANCELLED', cancellation_reason='Changed my mind')
+            bulk_transition(
+                Order.objects.filter(id__in=[order.id for order in orders]),
+                'CANCELLED', cancellation_reason='Closed'
+            )
+            self.assertEqual(events, [])
+
+        self.assertEqual(
+            sorted((event.from_status, tuple(event.order_ids)) for event in events),
+            [('PENDING', (single.id,)), ('PENDING', (orders[0].id,)), ('PREPARING', (orders[1].id,))]
+        )
+        self.assertIs(events[0].get_orders()[0], single)
+
+
+class BulkStatusUpdateTests(TestCase):
+    """POST /api/orders/bulk_update_status/ reports a result per requested id"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@bulk-status.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        other = Restaurant.objects.create(
+            owner=User.objects.create_user(email='other@bulk-status.test', role='RESTAURANT_OWNER'),
+            name='Other Bar', address='2 Main St', phone_number='0'
+        )
+        cls.customer = User.objects.create_user(email='customer@bulk-status.test', role='CUSTOMER')
+        cls.orders = {
+            name: Order.objects.create(
+                customer=cls.customer, restaurant=restaurant, status=order_status,
+                total_amount=Decimal('9.50'), delivery_address='2 High St'
+            )
+            for name, restaurant, order_status in [
+                ('pending', cls.restaurant, 'PENDING'),
+                ('preparing', cls.restaurant, 'PREPARING'),
+                ('delivered', cls.restaurant, 'DELIVERED'),
+                ('foreign', other, 'PENDING'),
+            ]
+        }
+
+    def bulk_update(self, user, order_ids, new_status, **extra):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(
+            '/api/orders/bulk_update_status/',
+            {'order_ids': order_ids, 'status': new_status, **extra},
+            format='json'
+        )
+
+    def test_mixed_ids_are_reported_one_by_one(self):
+        ids = {name: order.id for name, order in self.orders.items()}
+        response = self.bulk_update(
+            self.owner,
+            [ids['pending'], ids['delivered'], ids['foreign'], ids['preparing'], 999999, ids['pending']],
+            'CANCELLED', cancellation_reason='Kitchen closed'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(response.data['results'], [
+            {'id': ids['pending'], 'result': 'updated', 'from_status': 'PENDING'},
+            {'id': ids['delivered'], 'result': 'invalid_transition', 'from_status': 'DELIVERED'},
+            {'id': ids['foreign'], 'result': 'not_found'},
+            {'id': ids['preparing'], 'result': 'updated', 'from_status': 'PREPARING'},
+            {'id': 999999, 'result': 'not_found'},
+        ])
+        self.assertEqual(
+            dict(Order.objects.values_list('id', 'status')),
+            {
+                ids['pending']: 'CANCELLED', ids['preparing']: 'CANCELLED',
+                ids['delivered']: 'DELIVERED', ids['foreign']: 'PENDING',
+            }
+        )
+
+    def test_roles_limit_who_may_move_orders_where(self):
+        order_id = self.orders['pending'].id
+        self.assertEqual(self.bulk_update(self.customer, [order_id], 'CANCELLED').status_code, 403)
+        self.assertEqual(self.bulk_update(self.owner, [order_id], 'DELIVERED').status_code, 403)
+        self.assertEqual(self.bulk_update(self.owner, [order_id], 'CANCELLED').status_code, 400)
+        self.assertEqual(self.bulk_update(self.owner, [], 'PREPARING').status_code, 400)
+
+        admin = User.objects.create_user(email='admin@bulk-status.test', role='ADMIN')
+        response = self.bulk_update(admin, [self.orders['foreign'].id], 'PREPARING')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(Order.objects.get(pk=order_id).status, 'PENDING')
+
+
+class RiderSummaryTests(TestCase):
+    """Rider summaries, their shared-cache versioning and the endpoint's access rules"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='owner@rider-summary.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        cls.rider = User.objects.create_user(email='rider@rider-summary.test', role='RIDER')
+        cls.customer = User.objects.create_user(email='customer@rider-summary.test', role='CUSTOMER')
+        now = timezone.now()
+        for rider, order_status, total, picked_up_at, delivered_at in [
+            (cls.rider, 'DELIVERED', '20.00', now - timedelta(minutes=20), now),
+            (cls.rider, 'DELIVERED', '10.00', now - timedelta(minutes=10), now),
+            (cls.rider, 'DELIVERED', '5.00', now - timedelta(days=2, minutes=30), now - timedelta(days=2)),
+            (cls.rider, 'CANCELLED', '8.00', None, None),
+            (cls.rider, 'OUT_FOR_DELIVERY', '12.00', now - timedelta(minutes=5), None),
+            (cls.customer, 'DELIVERED', '99.00', now - timedelta(minutes=5), now),
+        ]:
+            Order.objects.create(
+                customer=cls.customer, restaurant=cls.restaurant, rider=rider, status=order_status,
+                total_amount=Decimal(total), delivery_address='2 High St',
+                picked_up_at=picked_up_at, delivered_at=delivered_at
+            )
+        cls.active = Order.objects.get(rider=cls.rider, status='OUT_FOR_DELIVERY')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_summary(self):
+        summary = build_rider_summary(self.rider.id, 7)
+
+        self.assertEqual(summary['today'], {
+            'date': timezone.localdate(), 'deliveries': 2, 'delivered_value': '30.00'
+        })
+        self.assertEqual([row['deliveries'] for row in summary['deliveries_per_day']], [2, 1])
+        self.assertEqual(summary['totals'], {
+            'deliveries': 3, 'cancelled': 1, 'average_delivery_minutes': 20.0
+        })
+        self.assertEqual(summary['active_job']['order_id'], self.active.id)
+        self.assertEqual(len(build_rider_summary(self.rider.id, 1)['deliveries_per_day']), 1)
+
+    def test_summaries_are_built_per_request_without_a_shared_cache(self):
+        get_rider_summary(self.rider.id)
+        with self.assertNumQueries(3):
+            get_rider_summary(self.rider.id)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_status_changes_invalidate_the_cached_summary(self):
+        first = get_rider_summary(self.rider.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_rider_summary(self.rider.id), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(self.active, 'DELIVERED')
+        summary = get_rider_summary(self.rider.id)
+        self.assertEqual(summary['today']['deliveries'], 3)
+        self.assertIsNone(summary['active_job'])
+
+    @override_settings(SHARED_CACHE=True)
+    def test_today_rolls_over_at_midnight(self):
+        get_rider_summary(self.rider.id)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch('orders.rider_stats.timezone.localdate', return_value=tomorrow):
+            summary = get_rider_summary(self.rider.id)
+        self.assertEqual(summary['today'], {'date': tomorrow, 'deliveries': 0, 'delivered_value': '0.00'})
+
+    def test_riders_see_their_own_summary_and_admins_pick_one(self):
+        client = APIClient()
+        client.force_authenticate(self.rider)
+        response = client.get('/api/orders/rider_summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rider_id'], self.rider.id)
+        self.assertEqual(client.get('/api/orders/rider_summary/?days=31').status_code, 400)
+
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.get('/api/orders/rider_summary/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(email='admin@rider-summary.test', role='ADMIN'))
+        response = client.get(f'/api/orders/rider_summary/?rider={self.rider.id}')
+        self.assertEqual(response.data['totals']['deliveries'], 3)
+        self.assertEqual(client.get('/api/orders/rider_summary/?rider=me').status_code, 400)
+
+
+class OwnerDashboardTests(TestCase):
+    """The kitchen dashboard's grouped aggregate, its per-process cache and access rules"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@dashboard.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        other = Restaurant.objects.create(
+            owner=User.objects.create_user(email='other@dashboard.test', role='RESTAURANT_OWNER'),
+            name='Other Bar', address='2 Main St', phone_number='0'
+        )
+        cls.customer = User.objects.create_user(email='customer@dashboard.test', role='CUSTOMER')
+        cls.now = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+
+        def minutes(count):
+            return cls.now - timedelta(minutes=count)
+
+        for restaurant, order_status, total, created_at, picked_up_at in [
+            (cls.restaurant, 'PENDING', '9.50', minutes(30), None),
+            (cls.restaurant, 'PREPARING', '5.00', minutes(10), None),
+            (cls.restaurant, 'DELIVERED', '20.00', minutes(40), minutes(20)),
+            (cls.restaurant, 'DELIVERED', '10.00', minutes(50), minutes(10)),
+            (cls.restaurant, 'CANCELLED', '100.00', minutes(5), None),
+            # Yesterday's finished orders and other kitchens' orders are left out
+            (cls.restaurant, 'DELIVERED', '40.00', minutes(24 * 60), minutes(24 * 60 - 20)),
+            (cls.restaurant, 'CANCELLED', '40.00', minutes(24 * 60), None),
+            (other, 'PENDING', '7.00', minutes(90), None),
+        ]:
+            order = Order.objects.create(
+                customer=cls.customer, restaurant=restaurant, status=order_status,
+                total_amount=Decimal(total), delivery_address='2 High St', picked_up_at=picked_up_at
+            )
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+
+    def setUp(self):
+        clear_dashboard_cache()
+        self.addCleanup(clear_dashboard_cache)
+
+    def test_one_grouped_query_builds_the_dashboard(self):
+        with self.assertNumQueries(1):
+            dashboard = build_dashboard(self.restaurant.id, now=self.now)
+
+        self.assertEqual(
+            {name: count for name, count in dashboard['counts'].items() if count},
+            {'PENDING': 1, 'PREPARING': 1, 'DELIVERED': 2, 'CANCELLED': 1}
+        )
+        self.assertEqual(dashboard['queue_length'], 2)
+        self.assertEqual(dashboard['oldest_pending_minutes'], 30.0)
+        self.assertEqual(dashboard['average_prep_minutes_last_hour'], 30.0)
+        self.assertEqual(dashboard['revenue_today'], '44.50')
+
+    def test_empty_kitchen(self):
+        restaurant = Restaurant.objects.create(
+            owner=User.objects.create_user(email='empty@dashboard.test', role='RESTAURANT_OWNER'),
+            name='Empty Bar', address='3 Main St', phone_number='0'
+        )
+        dashboard = build_dashboard(restaurant.id, now=self.now)
+        self.assertEqual(set(dashboard['counts'].values()), {0})
+        self.assertIsNone(dashboard['oldest_pending_minutes'])
+        self.assertIsNone(dashboard['average_prep_minutes_last_hour'])
+        self.assertEqual(dashboard['revenue_today'], '0.00')
+
+    def test_dashboards_are_cached_for_the_ttl(self):
+        first = get_dashboard(self.restaurant.id)
+        Order.objects.create(
+            customer=self.customer, restaurant=self.restaurant, status='PENDING',
+            total_amount=Decimal('1.00'), delivery_address='2 High St'
+        )
+        with self.assertNumQueries(0):
+            self.assertIs(get_dashboard(self.restaurant.id), first)
+
+        expired = time.monotonic() + settings.OWNER_DASHBOARD_TTL + 1
+        with mock.patch('orders.dashboard.time.monotonic', return_value=expired):
+            refreshed = get_dashboard(self.restaurant.id)
+        self.assertEqual(refreshed['counts']['PENDING'], first['counts']['PENDING'] + 1)
+
+    def test_owners_see_their_kitchen_and_admins_pick_one(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.get('/api/orders/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['restaurant_id'], self.restaurant.id)
+
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.get('/api/orders/dashboard/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(email='admin@dashboard.test', role='ADMIN'))
+        url = '/api/orders/dashboard/?restaurant={}'
+        self.assertEqual(client.get(url.format(self.restaurant.id)).data['restaurant_id'], self.restaurant.id)
+        self.assertEqual(client.get(url.format('noodles')).status_code, 400)
+        self.assertEqual(client.get(url.format(999999)).status_code, 404)
+        self.assertEqual(client.get('/api/orders/dashboard/').status_code, 403)
+
+
+class ArchiveSnapshotTests(TestCase):
+    """Archived items keep the menu item's name and category"""
+
+    def test_blank_snapshots_fall_back_to_the_menu_item(self):
+        owner = User.objects.create_user(email='owner@snapshot.test', role='RESTAURANT_OWNER')
+        restaurant = Restaurant.objects.create(
+            owner=owner, name='Noodle Bar', address='1 Main St', phone_number='0'
+        )
+        ramen = MenuItem.objects.create(
+            restaurant=restaurant, name='Ramen', price=Decimal('9.50'), category='MAIN_COURSE'
+        )
+        order = Order.objects.create(
+            customer=User.objects.create_user(email='customer@snapshot.test', role='CUSTOMER'),
+            restaurant=restaurant, status='DELIVERED', total_amount=Decimal('28.50'),
+            delivery_address='2 High St'
+        )
+        # Rows from before menu items were snapshotted, as bulk_create skips save()
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, menu_item=ramen, quantity=1, price_at_order=Decimal('9.50')),
+            OrderItem(
+                order=order, menu_item=ramen, menu_item_name='Shoyu Ramen',
+                menu_item_category='SIDES', quantity=1, price_at_order=Decimal('9.50')
+            ),
+            OrderItem(order=order, menu_item=None, quantity=1, price_at_order=Decimal('9.50')),
+        ])
+
+        archive_batch(timezone.now() + timedelta(days=1), batch_size=10)
+
+        self.assertEqual(
+            list(ArchivedOrderItem.objects.filter(id__in=[item.id for item in items]).values_list(
+                'menu_item_name', 'menu_item_category'
+            )),
+            [('Ramen', 'MAIN_COURSE'), ('Shoyu Ramen', 'SIDES'), ('', '')]
+        )
+
+
+class FailingSink(BaseSink):
+
+    def send(self, messages):
+        raise ConnectionError('broker down')
+
+
+def drain_event_queue():
+    messages = []
+    while not event_queue.empty():
+        messages.append(event_queue.get_nowait())
+    return messages
+
+
+class OrderOutboxTests(TestCase):
+    """drain_batch delivers due events at least once and backs off on failure"""
+
+    def setUp(self):
+        drain_event_queue()
+
+    def make_events(self, count, **fields):
+        return OrderEvent.objects.bulk_create([
+            OrderEvent(
+                event_type='order.created', order_id=order_id, payload={'order_id': order_id}, **fields
+            )
+            for order_id in range(1, count + 1)
+        ])
+
+    def test_due_events_are_delivered_in_order_and_marked(self):
+        events = self.make_events(3)
+        OrderEvent.objects.create(
+            event_type='order.created', order_id=9, available_at=timezone.now() + timedelta(minutes=1)
+        )
+
+        self.assertEqual(drain_batch([QueueSink()], batch_size=2), 2)
+        self.assertEqual(drain_batch([QueueSink()], batch_size=2), 1)
+        self.assertEqual(drain_batch([QueueSink()], batch_size=2), 0)
+
+        self.assertEqual(
+            [message['id'] for message in drain_event_queue()], [event.id for event in events]
+        )
+        self.assertEqual(OrderEvent.objects.filter(dispatched_at__isnull=True).count(), 1)
+
+    def test_failed_deliveries_back_off_until_max_attempts(self):
+        [event] = self.make_events(1)
+        before = timezone.now()
+        with self.assertLogs('orders.outbox', 'ERROR'):
+            self.assertEqual(drain_batch([FailingSink()], max_attempts=2), 1)
+
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.last_error, 'ConnectionError: broker down')
+        self.assertGreaterEqual(event.available_at, before + timedelta(seconds=2))
+        self.assertIsNone(event.dispatched_at)
+        # Not due again until the backoff has passed
+        self.assertEqual(drain_batch([QueueSink()], max_attempts=2), 0)
+
+        OrderEvent.objects.filter(id=event.id).update(available_at=timezone.now())
+        with self.assertLogs('orders.outbox', 'ERROR'):
+            drain_batch([FailingSink()], max_attempts=2)
+        OrderEvent.objects.filter(id=event.id).update(available_at=timezone.now())
+        # Out of attempts: left for an operator
+        self.assertEqual(drain_batch([QueueSink()], max_attempts=2), 0)
+
+    def test_a_failing_sink_leaves_events_to_be_redelivered_to_every_sink(self):
+        [event] = self.make_events(1)
+        with self.assertLogs('orders.outbox', 'ERROR'):
+            drain_batch([QueueSink(), FailingSink()])
+        self.assertEqual(len(drain_event_queue()), 1)
+
+        OrderEvent.objects.filter(id=event.id).update(available_at=timezone.now())
+        drain_batch([QueueSink()])
+        [message] = drain_event_queue()
+        self.assertEqual(message['id'], event.id)
+        event.refresh_from_db()
+        self.assertIsNotNone(event.dispatched_at)
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, 'needs SELECT ... SKIP LOCKED')
+class OrderOutboxLockingTests(TransactionTestCase):
+    """Concurrent drainers skip events another one has claimed"""
+
+    def test_locked_events_are_skipped(self):
+        events = OrderEvent.objects.bulk_create([
+            OrderEvent(event_type='order.created', order_id=order_id, payload={}) for order_id in range(4)
+        ])
+        drain_event_queue()
+        claimed = []
+
+        def drain_elsewhere():
+            try:
+                claimed.append(drain_batch([QueueSink()], batch_size=10))
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            list(OrderEvent.objects.filter(id__in=[events[0].id, events[1].id]).select_for_update())
+            worker = threading.Thread(target=drain_elsewhere)
+            worker.start()
+            worker.join()
+
+        self.assertEqual(claimed, [2])
+        self.assertEqual(
+            [message['id'] for message in drain_event_queue()], [events[2].id, events[3].id]
+        )
@@ -1,3 +1,6 @@
+import heapq
+from operator import attrgetter
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -5,24 +8,51 @@ from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse, Http404
 
-from .models import Order, OrderItem
+from restaurants.models import Restaurant
+from .models import ArchivedOrder, Order, OrderItem, DeliveryEstimate
+from .eta import estimate_for_order
+from .idempotency import idempotent
+from .exports import (
+    filter_orders, iter_export, ExportFilterError, EXPORT_FORMATS, CONTENT_TYPES
+)
 # Force reload
 from .serializers import (
-    OrderSerializer, OrderCreateSerializer,
-    OrderStatusUpdateSerializer, RiderAssignmentSerializer
+    OrderSerializer, OrderCreateSerializer, ArchivedOrderSerializer,
+    OrderStatusUpdateSerializer, BulkStatusUpdateSerializer, ReorderSerializer,
+    RiderAssignmentSerializer
+)
+from .archive import archived_orders_for
+from .outbox import record_rider_assigned
+from .state_machine import (
+    transition, bulk_transition, actor_for, ConcurrentTransitionError,
+    ROLE_TARGETS, TERMINAL_STATUSES, ADMIN, RESTAURANT
 )
+from .rider_stats import get_rider_summary, invalidate_rider_summary, MAX_SUMMARY_DAYS
+from .dashboard import get_dashboard
+from .history import get_history
+from .reorder import ReorderError, reorder
 from .permissions import (
     IsOrderCustomer, IsOrderRestaurant, IsOrderRider, CanUpdateOrderStatus
 )
+from foodieasy_backend.conditional import ConditionalResponseMixin, make_etag
+from foodieasy_backend.sharding import (
+    ShardRoutingMixin, current_shard, fan_out, is_sharded, locate, shard_aliases,
+    shard_for_restaurant,
+)
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ConditionalResponseMixin, ShardRoutingMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing orders.
     """
     queryset = Order.objects.all()
+    # Only `track` is conditional; it checks validators after its own permission check
+    conditional_actions = ()
+    cache_control = {'private': True, 'no_cache': True}
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['status', 'restaurant']
@@ -48,12 +78,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         if user.role == 'ADMIN':
             return Order.objects.all().select_related(
                 'customer', 'restaurant', 'rider'
-            ).prefetch_related('items__menu_item')
+            ).prefetch_related('items')
         
         elif user.role == 'CUSTOMER':
             return Order.objects.filter(customer=user).select_related(
                 'customer', 'restaurant', 'rider'
-            ).prefetch_related('items__menu_item')
+            ).prefetch_related('items')
         
         elif user.role == 'RESTAURANT_OWNER':
             if hasattr(user, 'restaurant'):
@@ -61,28 +91,101 @@ class OrderViewSet(viewsets.ModelViewSet):
                     restaurant=user.restaurant
                 ).select_related(
                     'customer', 'restaurant', 'rider'
-                ).prefetch_related('items__menu_item')
+                ).prefetch_related('items')
             return Order.objects.none()
         
         elif user.role == 'RIDER':
             return Order.objects.filter(rider=user).select_related(
                 'customer', 'restaurant', 'rider'
-            ).prefetch_related('items__menu_item')
+            ).prefetch_related('items')
         
         return Order.objects.none()
     
+    def get_shard(self, request):
+        """Shard of the order, the owner's restaurant or the restaurant ordered from"""
+        if self.kwargs.get('pk'):
+            return locate(Order, self.kwargs['pk'])
+        user = request.user
+        if user.role == 'RESTAURANT_OWNER' and hasattr(user, 'restaurant'):
+            return shard_for_restaurant(user.restaurant.id)
+        restaurant = request.data.get('restaurant') if self.action == 'create' else (
+            request.query_params.get('restaurant')
+        )
+        if str(restaurant).isdigit():
+            return shard_for_restaurant(restaurant)
+        return None
+    
+    def from_shards(self, orders):
+        """Evaluate ``orders`` on every shard when the request has no shard of its own"""
+        if is_sharded() and current_shard() is None:
+            return fan_out(orders)
+        return orders
+    
+    def list(self, request, *args, **kwargs):
+        orders = self.from_shards(self.filter_queryset(self.get_queryset()))
+        return Response(self.get_serializer(orders, many=True).data)
+    
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Create order; retries carrying the same Idempotency-Key are replayed"""
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         """Create order (customers only)"""
         if self.request.user.role != 'CUSTOMER':
             raise PermissionError('Only customers can create orders.')
         serializer.save()
     
+    def get_archived_object(self):
+        """The archived order of a detail route, for orders no longer live"""
+        pk = str(self.kwargs.get('pk'))
+        archived = None
+        if pk.isdigit():
+            archived = archived_orders_for(self.request.user).filter(pk=pk).first()
+        if archived is None:
+            raise Http404('No order matches the given query.')
+        return archived
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Get an order, falling back to the archive for old completed orders"""
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            return Response(ArchivedOrderSerializer(self.get_archived_object()).data)
+    
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
         """Get current user's orders (customers get their orders, riders get their deliveries)"""
-        orders = self.get_queryset()
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        orders = self.from_shards(self.get_queryset())
+        archived = archived_orders_for(request.user)
+        
+        # Old orders that never finished stay live, so the two interleave
+        merged = heapq.merge(orders, archived, key=attrgetter('created_at'), reverse=True)
+        return Response([
+            ArchivedOrderSerializer(order).data if isinstance(order, ArchivedOrder)
+            else self.get_serializer(order).data
+            for order in merged
+        ])
+    
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        Customer order history: active orders live, delivered and cancelled
+        ones from the customer's precomputed history (one read however many).
+        
+        GET /api/orders/history/
+        """
+        if request.user.role != 'CUSTOMER':
+            return Response(
+                {'error': 'Only customers have an order history.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        active = self.from_shards(self.get_queryset().exclude(status__in=TERMINAL_STATUSES))
+        return Response({
+            'active': self.get_serializer(active, many=True).data,
+            'history': get_history(request.user),
+        })
     
     @action(detail=False, methods=['get'])
     def pending_orders(self, request):
@@ -93,20 +196,144 @@ class OrderViewSet(viewsets.ModelViewSet):
             orders = Order.objects.filter(
                 restaurant=user.restaurant,
                 status='PENDING'
-            ).select_related('customer', 'restaurant').prefetch_related('items__menu_item')
+            ).select_related('customer', 'restaurant', 'rider').prefetch_related('items')
         elif user.role == 'RIDER':
             # Show orders that are ready for pickup and not yet assigned
             orders = Order.objects.filter(
                 status='READY_FOR_PICKUP',
                 rider__isnull=True
-            ).select_related('customer', 'restaurant').prefetch_related('items__menu_item')
+            ).select_related('customer', 'restaurant').prefetch_related('items')
         else:
             orders = Order.objects.none()
         
-        serializer = self.get_serializer(orders, many=True)
+        serializer = self.get_serializer(self.from_shards(orders), many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream orders and their items as CSV or NDJSON (admins and restaurant owners).
+        
+        GET /api/orders/export/?file_format=csv&since=2025-01-01&until=2025-01-31
+            &status=DELIVERED,CANCELLED&restaurant=3
+        """
+        user = request.user
+        
+        if user.role == 'ADMIN':
+            # Unbound, so the export reads every shard (see orders.exports)
+            orders = Order.objects.all()
+        elif user.role == 'RESTAURANT_OWNER' and hasattr(user, 'restaurant'):
+            # Bound now: the export streams after the request's shard is reset
+            orders = Order.objects.using(shard_for_restaurant(user.restaurant.id)).filter(
+                restaurant=user.restaurant
+            )
+        else:
+            return Response(
+                {'error': 'Only admins and restaurant owners can export orders.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"file_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        statuses = request.query_params.get('status')
+        filters = {
+            'since': request.query_params.get('since'),
+            'until': request.query_params.get('until'),
+            'statuses': statuses.split(',') if statuses else None,
+            'restaurant': request.query_params.get('restaurant'),
+        }
+        try:
+            orders = filter_orders(orders, **filters)
+            archived = filter_orders(archived_orders_for(user), **filters)
+        except ExportFilterError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = StreamingHttpResponse(
+            iter_export(orders, export_format, archived=archived),
+            content_type=CONTENT_TYPES[export_format]
+        )
+        filename = f"orders-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def rider_summary(self, request):
+        """
+        Delivery summary for the current rider (admins may pass ?rider=<id>).
+        
+        GET /api/orders/rider_summary/?days=7
+        """
+        user = request.user
+        
+        if user.role == 'RIDER':
+            rider_id = user.id
+        elif user.role == 'ADMIN' and request.query_params.get('rider'):
+            try:
+                rider_id = int(request.query_params['rider'])
+            except ValueError:
+                return Response(
+                    {'error': 'rider must be a user id.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            return Response(
+                {'error': 'Only riders can view delivery summaries.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            days = int(request.query_params.get('days', 7))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= MAX_SUMMARY_DAYS:
+            return Response(
+                {'error': f'days must be between 1 and {MAX_SUMMARY_DAYS}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(get_rider_summary(rider_id, days))
+    
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """
+        Kitchen dashboard for the current owner's restaurant (admins may pass
+        ?restaurant=<id>): counts by status, oldest pending order, average
+        prep time over the last hour and today's revenue.
+        
+        GET /api/orders/dashboard/
+        """
+        user = request.user
+        
+        if user.role == 'RESTAURANT_OWNER' and hasattr(user, 'restaurant'):
+            restaurant_id = user.restaurant.id
+        elif user.role == 'ADMIN' and request.query_params.get('restaurant'):
+            try:
+                restaurant_id = int(request.query_params['restaurant'])
+            except ValueError:
+                return Response(
+                    {'error': 'restaurant must be a restaurant id.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not Restaurant.objects.filter(pk=restaurant_id).exists():
+                return Response(
+                    {'error': 'Restaurant not found.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        else:
+            return Response(
+                {'error': 'Only restaurant owners can view the kitchen dashboard.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        return Response(get_dashboard(restaurant_id))
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, CanUpdateOrderStatus])
+    @idempotent
     def update_status(self, request, pk=None):
         """Update order status"""
         order = self.get_object()
@@ -116,25 +343,15 @@ class OrderViewSet(viewsets.ModelViewSet):
         )
         
         if serializer.is_valid():
-            new_status = serializer.validated_data['status']
-            cancellation_reason = serializer.validated_data.get('cancellation_reason', '')
-            
-            # Update status
-            order.status = new_status
-            
-            # Update timestamps based on status
-            if new_status == 'PREPARING':
-                order.prepared_at = timezone.now()
-            elif new_status == 'PICKED_UP' or new_status == 'OUT_FOR_DELIVERY':
-                order.picked_up_at = timezone.now()
-            elif new_status == 'DELIVERED':
-                order.delivered_at = timezone.now()
-            elif new_status == 'CANCELLED':
-                order.cancelled_at = timezone.now()
-                order.cancellation_reason = cancellation_reason
-            
-            # Save without specifying update_fields to ensure timestamps are saved
-            order.save()
+            try:
+                transition(
+                    order,
+                    serializer.validated_data['status'],
+                    cancellation_reason=serializer.validated_data.get('cancellation_reason', ''),
+                    actor=actor_for(request.user, order)
+                )
+            except ConcurrentTransitionError as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
             
             return Response(
                 OrderSerializer(order).data,
@@ -143,12 +360,79 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk_update_status(self, request):
+        """
+        Move many orders to one status (restaurant owners and admins).
+        
+        POST /api/orders/bulk_update_status/
+        Body: {"order_ids": [1, 2, 3], "status": "READY_FOR_PICKUP"}
+        """
+        user = request.user
+        
+        if user.role == 'ADMIN':
+            actor, orders = ADMIN, Order.objects.all()
+        elif user.role == 'RESTAURANT_OWNER' and hasattr(user, 'restaurant'):
+            actor, orders = RESTAURANT, Order.objects.filter(restaurant_id=user.restaurant.id)
+        else:
+            return Response(
+                {'error': 'Only restaurant owners and admins can update orders in bulk.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = BulkStatusUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_ids = serializer.validated_data['order_ids']
+        new_status = serializer.validated_data['status']
+        
+        if new_status not in ROLE_TARGETS[actor]:
+            return Response(
+                {'error': f'You cannot move orders to {new_status}.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        # Admins without ?restaurant= may move orders on any shard
+        aliases = shard_aliases() if current_shard() is None else [current_shard()]
+        moved, rejected = {}, {}
+        for alias in aliases:
+            shard_moved, shard_rejected = bulk_transition(
+                orders.using(alias).filter(id__in=order_ids),
+                new_status,
+                cancellation_reason=serializer.validated_data.get('cancellation_reason', ''),
+                actor=actor
+            )
+            moved.update(shard_moved)
+            rejected.update(shard_rejected)
+        
+        results = []
+        for order_id in dict.fromkeys(order_ids):
+            if order_id in moved:
+                results.append({'id': order_id, 'result': 'updated', 'from_status': moved[order_id]})
+            elif order_id in rejected:
+                results.append({
+                    'id': order_id,
+                    'result': 'invalid_transition',
+                    'from_status': rejected[order_id]
+                })
+            else:
+                results.append({'id': order_id, 'result': 'not_found'})
+        
+        return Response({
+            'status': new_status,
+            'updated': len(moved),
+            'results': results
+        })
+    
     @action(detail=True, methods=['post'])
+    @idempotent
     def assign_rider(self, request, pk=None):
         """Assign a rider to an order (riders can self-assign, or restaurant owner/admin can assign)"""
         # Get order without queryset filtering (riders need to access unassigned orders)
         try:
-            order = Order.objects.select_related('customer', 'restaurant', 'rider').get(pk=pk)
+            order = Order.objects.select_related(
+                'customer', 'restaurant', 'rider'
+            ).prefetch_related('items').get(pk=pk)
         except Order.DoesNotExist:
             return Response(
                 {'error': 'Order not found.'},
@@ -171,10 +455,15 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        using = order._state.db
+        
         # Riders can self-assign
         if user.role == 'RIDER':
-            order.rider = user
-            order.save(update_fields=['rider'])
+            with transaction.atomic(using=using):
+                order.rider = user
+                order.save(update_fields=['rider'])
+                record_rider_assigned(order, assigned_by=user)
+            invalidate_rider_summary(user.id)
             
             return Response(
                 OrderSerializer(order).data,
@@ -182,7 +471,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             )
         
         # Restaurant owners and admins can assign any rider
-        if user.role == 'ADMIN' or (hasattr(user, 'restaurant') and order.restaurant.owner == user):
+        if user.role == 'ADMIN' or (hasattr(user, 'restaurant') and order.restaurant.owner_id == user.id):
             serializer = RiderAssignmentSerializer(data=request.data)
             
             if serializer.is_valid():
@@ -196,8 +485,11 @@ class OrderViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                order.rider = rider
-                order.save(update_fields=['rider'])
+                with transaction.atomic(using=using):
+                    order.rider = rider
+                    order.save(update_fields=['rider'])
+                    record_rider_assigned(order, assigned_by=user)
+                invalidate_rider_summary(rider.id)
                 
                 return Response(
                     OrderSerializer(order).data,
@@ -211,21 +503,82 @@ class OrderViewSet(viewsets.ModelViewSet):
             status=status.HTTP_403_FORBIDDEN
         )
     
+    @action(detail=True, methods=['post'])
+    @idempotent
+    def reorder(self, request, pk=None):
+        """
+        Place one of the customer's past orders again at current prices.
+        
+        POST /api/orders/{id}/reorder/
+        Body (optional): {"delivery_address": "...", "partial": true}
+        
+        Returns 201 with the new order and a per-item diff against the
+        current menu. If any item is no longer available (or none is, with
+        "partial") nothing is ordered and 409 returns the diff.
+        """
+        if request.user.role != 'CUSTOMER':
+            return Response(
+                {'error': 'Only customers can reorder.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = ReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            order = self.get_object()
+        except Http404:
+            order = self.get_archived_object()
+        
+        try:
+            new_order, items = reorder(order, request.user, **serializer.validated_data)
+        except ReorderError as exc:
+            return Response(
+                {'error': str(exc), 'items': exc.items},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response(
+            {'order': OrderSerializer(new_order).data, 'items': items},
+            status=status.HTTP_201_CREATED
+        )
+    
     @action(detail=True, methods=['get'])
     def track(self, request, pk=None):
         """Get order tracking information"""
         order = self.get_object()
         
         # Check if user has permission to track this order
-        if not (order.customer == request.user or 
-                (hasattr(request.user, 'restaurant') and order.restaurant.owner == request.user) or
-                order.rider == request.user or
+        if not (order.customer_id == request.user.id or
+                order.restaurant.owner_id == request.user.id or
+                order.rider_id == request.user.id or
                 request.user.role == 'ADMIN'):
             return Response(
                 {'error': 'You do not have permission to track this order.'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        estimate = DeliveryEstimate.objects.filter(restaurant_id=order.restaurant_id).first()
+        eta = estimate_for_order(order, estimate)
+        rider_located_at = order.rider.location_updated_at if order.rider else None
+        stamps = [
+            order.created_at, order.prepared_at, order.picked_up_at, order.delivered_at,
+            order.cancelled_at, order.restaurant.updated_at, rider_located_at
+        ]
+        rider = order.rider
+        etag = make_etag(
+            order.id, order.status, order.delivery_address,
+            [stamp.isoformat() if stamp else None for stamp in stamps],
+            rider and (
+                rider.id, rider.full_name, rider.phone_number,
+                str(rider.current_latitude), str(rider.current_longitude)
+            ),
+            eta and (eta['estimated_delivery_at'].isoformat(), eta['minutes_remaining'])
+        )
+        # minutes_remaining changes with the clock, so only ETags apply while an ETA is live
+        last_modified = None if eta else max(stamp for stamp in stamps if stamp)
+        self.check_not_modified(request, etag, last_modified)
+        
         tracking_info = {
             'order_id': order.id,
             'status': order.status,
@@ -239,7 +592,8 @@ class OrderViewSet(viewsets.ModelViewSet):
                 'name': order.restaurant.name,
                 'address': order.restaurant.address
             },
-            'delivery_address': order.delivery_address
+            'delivery_address': order.delivery_address,
+            'eta': eta
         }
         
         # Add rider info if assigned
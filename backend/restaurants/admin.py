@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Restaurant, MenuItem
+from .models import Restaurant, MenuItem, OpeningHours, ScheduleException
 
 
 class MenuItemInline(admin.TabularInline):
@@ -9,6 +9,20 @@ class MenuItemInline(admin.TabularInline):
     fields = ['name', 'description', 'price', 'category', 'is_available']
 
 
+class OpeningHoursInline(admin.TabularInline):
+    """Inline admin for weekly opening hours"""
+    model = OpeningHours
+    extra = 0
+    fields = ['weekday', 'opens_at', 'closes_at']
+
+
+class ScheduleExceptionInline(admin.TabularInline):
+    """Inline admin for holidays and other one-off changes to the hours"""
+    model = ScheduleException
+    extra = 0
+    fields = ['date', 'opens_at', 'closes_at', 'reason']
+
+
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
     """Admin configuration for Restaurant"""
@@ -16,7 +30,8 @@ class RestaurantAdmin(admin.ModelAdmin):
     list_filter = ['cuisine_type', 'is_active', 'created_at']
     search_fields = ['name', 'description', 'owner__email']
     ordering = ['-created_at']
-    inlines = [MenuItemInline]
+    inlines = [OpeningHoursInline, ScheduleExceptionInline, MenuItemInline]
+    autocomplete_fields = ['owner']
     
     fieldsets = (
         ('Basic Information', {
@@ -26,7 +41,7 @@ class RestaurantAdmin(admin.ModelAdmin):
             'fields': ('address', 'phone_number')
         }),
         ('Restaurant Details', {
-            'fields': ('cuisine_type', 'is_active')
+            'fields': ('cuisine_type', 'is_open', 'is_active')
         }),
     )
 
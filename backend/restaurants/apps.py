@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class RestaurantsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'restaurants'
+
+    def ready(self):
+        # Opening hours changes rebuild the schedule index
+        from .schedule import connect_signals
+        connect_signals()
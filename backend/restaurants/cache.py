@@ -0,0 +1,267 @@
+"""
+Cached catalogue payloads, their HTTP validators and the cache warmer.
+
+``RestaurantViewSet.list`` and ``retrieve`` are public and identical for
+every user, so their serialized payloads are cached. Keys include a
+catalogue version number that is bumped whenever a restaurant or menu item
+changes through the API (the same scheme as orders.rider_stats), plus the
+view's ETag, which is derived from ``MAX(updated_at)`` and ``COUNT(*)`` of
+restaurants, menu items and delivery estimates and from the schedule
+index's state (which changes whenever a restaurant opens or closes, see
+restaurants.schedule). Stale payloads are never read again and expire on
+their own.
+
+Payloads are only cached when ``SHARED_CACHE`` is set, i.e. when CACHES
+points at a cache every server process shares (see settings). With a
+per-process cache a version bump would only reach the process that handled
+the write, and the others would keep serving old menus and prices.
+
+``warm_catalogue`` renders the busiest pages through the real views on a
+thread pool so the first customers after a deploy hit a warm cache.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Max
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from foodieasy_backend.conditional import make_etag
+from foodieasy_backend.sharding import shard_aliases, shard_for_restaurant
+
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_CACHE_TIMEOUT = 60 * 5
+CATALOGUE_VERSION_KEY = 'catalogue-version'
+
+# Query parameters that change the list payload; anything else is ignored
+# by the view, so it must not fragment the cache either
+CATALOGUE_PARAMS = ('cuisine_type', 'is_active', 'open_now', 'search', 'ordering')
+# Views taking other parameters than the list
+VIEW_PARAMS = {
+    'browse': (
+        'search', 'ordering', 'cuisine_type', 'category', 'open_now', 'price_band',
+        'page', 'page_size'
+    ),
+}
+
+
+def catalogue_version():
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, 1, None)
+        version = cache.get(CATALOGUE_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_catalogue():
+    """Make every cached catalogue payload stale"""
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_VERSION_KEY, 1, None)
+
+
+def _catalogue_query(params, names=CATALOGUE_PARAMS):
+    params = params or {}
+    return urlencode(sorted(
+        (name, params[name]) for name in names if params.get(name)
+    ))
+
+
+def catalogue_key(view_name, params=None, pk=None, etag=''):
+    query = _catalogue_query(params, VIEW_PARAMS.get(view_name, CATALOGUE_PARAMS))
+    return f'catalogue:{catalogue_version()}:{view_name}:{pk or ""}:{query}:{etag}'
+
+
+def catalogue_validators(view_name, params=None, pk=None):
+    """
+    Return ``(etag, last_modified)`` for a catalogue payload, or None when
+    the restaurant does not exist. Indexed MAX() and COUNT() lookups; the
+    payload itself is never built. The row counts catch deletes, which
+    leave MAX(updated_at) unchanged unless the newest row goes.
+    """
+    from orders.models import DeliveryEstimate
+    from .models import Restaurant, MenuItem
+    from .schedule import get_index
+
+    restaurants = Restaurant.objects.all()
+    menu_items = MenuItem.objects.all()
+    estimates = DeliveryEstimate.objects.all()
+    if pk is not None:
+        if not str(pk).isdigit():
+            return None
+        restaurants = restaurants.filter(id=pk, is_active=True)
+        menu_items = menu_items.filter(restaurant_id=pk)
+        estimates = estimates.filter(restaurant_id=pk)
+
+    # Menu items live on restaurant shards (foodieasy_backend.sharding)
+    menu_aliases = [shard_for_restaurant(pk)] if pk is not None else shard_aliases()
+    menu_stats = [
+        menu_items.using(alias).aggregate(latest=Max('updated_at'), count=Count('id'))
+        for alias in menu_aliases
+    ]
+    restaurant_stats = restaurants.aggregate(latest=Max('updated_at'), count=Count('id'))
+    estimate_stats = estimates.aggregate(latest=Max('updated_at'), count=Count('id'))
+    stamps = [
+        restaurant_stats['latest'],
+        max((stats['latest'] for stats in menu_stats if stats['latest']), default=None),
+        estimate_stats['latest'],
+    ]
+    if stamps[0] is None:
+        return None
+    counts = [
+        restaurant_stats['count'],
+        sum(stats['count'] for stats in menu_stats),
+        estimate_stats['count'],
+    ]
+    # Who is open changes without any row changing
+    now = timezone.now()
+    schedule = get_index(now)
+    etag = make_etag(
+        view_name, pk, _catalogue_query(params, VIEW_PARAMS.get(view_name, CATALOGUE_PARAMS)),
+        catalogue_version(), schedule.state_key(now), counts,
+        *[stamp.isoformat() if stamp else None for stamp in stamps]
+    )
+    stamps.append(schedule.last_change(now))
+    return etag, max(stamp for stamp in stamps if stamp)
+
+
+def cached_payload(key, build):
+    """
+    Return the cached payload for ``key``, building and storing it on a
+    miss. Always builds when the cache is not shared between processes.
+    """
+    if not getattr(settings, 'SHARED_CACHE', False):
+        return build()
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, CATALOGUE_CACHE_TIMEOUT)
+    return data
+
+
+def warm_targets(days=7, top=20):
+    """
+    Pages worth warming, busiest first: the unfiltered catalogue and
+    browse page, each cuisine filter and the ``top`` restaurant detail pages, ranked by orders
+    placed in the last ``days`` days.
+    """
+    from orders.models import Order
+    from .models import Restaurant
+
+    since = timezone.now() - timedelta(days=days)
+    volume = dict(
+        Order.objects.filter(created_at__gte=since)
+        .values_list('restaurant_id')
+        .annotate(orders=Count('id'))
+    )
+
+    restaurants = list(
+        Restaurant.objects.filter(is_active=True).values_list('id', 'cuisine_type')
+    )
+    cuisine_volume = {}
+    for restaurant_id, cuisine_type in restaurants:
+        cuisine_volume[cuisine_type] = (
+            cuisine_volume.get(cuisine_type, 0) + volume.get(restaurant_id, 0)
+        )
+
+    targets = [('list', {}, None), ('browse', {}, None)]
+    targets += [
+        ('list', {'cuisine_type': cuisine_type}, None)
+        for cuisine_type in sorted(cuisine_volume, key=cuisine_volume.get, reverse=True)
+    ]
+    busiest = sorted(
+        (restaurant_id for restaurant_id, _ in restaurants),
+        key=lambda restaurant_id: volume.get(restaurant_id, 0),
+        reverse=True
+    )[:top]
+    targets += [('retrieve', {}, restaurant_id) for restaurant_id in busiest]
+    return targets
+
+
+def catalogue_request(params):
+    """An anonymous GET for the catalogue API, as the server would build it"""
+    query = urlencode(params)
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = '/api/restaurants/'
+    request.GET = QueryDict(query)
+    request.META = {
+        'REQUEST_METHOD': 'GET',
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'REMOTE_ADDR': '127.0.0.1',
+    }
+    return request
+
+
+def _render(target):
+    from .views import RestaurantViewSet
+
+    view_name, params, pk = target
+    view = RestaurantViewSet.as_view({'get': view_name})
+    request = catalogue_request(params)
+    try:
+        response = view(request, pk=pk) if pk else view(request)
+        return response.status_code
+    finally:
+        # Pool threads each open their own connection
+        connection.close()
+
+
+def warm_catalogue(workers=4, days=7, top=20):
+    """
+    Render and cache the busiest catalogue payloads. Targets are submitted
+    in priority order, so the pool works through the busiest pages first.
+    Returns ``(warmed, failed)``; nothing is rendered without a shared cache.
+    """
+    if not getattr(settings, 'SHARED_CACHE', False):
+        return 0, 0
+    targets = warm_targets(days, top)
+    warmed = failed = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warm') as pool:
+        futures = [(target, pool.submit(_render, target)) for target in targets]
+        for target, future in futures:
+            try:
+                status_code = future.result()
+            except Exception:
+                logger.exception('Warming %s failed', target)
+                status_code = None
+            if status_code == 200:
+                warmed += 1
+            else:
+                failed += 1
+    return warmed, failed
+
+
+def _warm_quietly():
+    try:
+        warmed, failed = warm_catalogue()
+        logger.info('Startup cache warm-up: %d payloads warmed, %d failed', warmed, failed)
+    except Exception:
+        logger.exception('Startup cache warm-up failed')
+    finally:
+        connection.close()
+
+
+def start_background_warmup():
+    """
+    Warm the shared catalogue cache on a daemon thread when
+    ``WARM_CACHES_ON_STARTUP`` and ``SHARED_CACHE`` are set. Called from the
+    WSGI/ASGI entry points so server processes warm without delaying boot.
+    """
+    warm = getattr(settings, 'WARM_CACHES_ON_STARTUP', False)
+    if not (warm and getattr(settings, 'SHARED_CACHE', False)):
+        return None
+    thread = threading.Thread(target=_warm_quietly, name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
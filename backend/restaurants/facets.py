@@ -0,0 +1,141 @@
+"""
+Faceted restaurant browsing.
+
+``/api/restaurants/browse/`` returns a page of restaurants together with how
+many restaurants match each cuisine, menu category, open status and price
+band, so browse screens render from one request. Counts are of restaurants
+and disjunctive: each facet is counted with every other selected filter
+applied but not its own, so picking "Thai" still shows how many Italian
+restaurants there are.
+
+The per-restaurant menu profile (categories served, price band of the
+average available item) comes from one grouped query per shard and is
+cached per catalogue version; restaurants come from one query and open
+status from the schedule index. Counting is a single pass in Python, and
+its result is cached per filter combination and schedule state.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from foodieasy_backend.sharding import shard_aliases
+
+from .cache import _catalogue_query, cached_payload, catalogue_version
+from .models import MenuItem, Restaurant
+from .schedule import get_index
+
+
+# (band, exclusive upper bound of the average item price)
+PRICE_BANDS = (
+    ('budget', Decimal('10')),
+    ('moderate', Decimal('25')),
+    ('premium', None),
+)
+FACETS = ('cuisine_type', 'category', 'open_now', 'price_band')
+# Parameters that change which restaurants match
+FILTER_PARAMS = ('search',) + FACETS
+
+FACET_CHOICES = {
+    'cuisine_type': [value for value, _ in Restaurant.CUISINE_CHOICES],
+    'category': [value for value, _ in MenuItem.CATEGORY_CHOICES],
+    'open_now': ['true', 'false'],
+    'price_band': [band for band, _ in PRICE_BANDS],
+}
+
+
+def price_band(average):
+    for band, upper in PRICE_BANDS:
+        if upper is None or average < upper:
+            return band
+
+
+def restaurant_profiles():
+    """
+    ``{restaurant_id: (categories, price band)}`` from available menu items.
+    Restaurants without available items have no categories and no band.
+    """
+    return cached_payload(f'catalogue:{catalogue_version()}:facet-profiles', _build_profiles)
+
+
+def _build_profiles():
+    totals = {}
+    for alias in shard_aliases():
+        rows = (
+            MenuItem.objects.using(alias).filter(is_available=True)
+            .values('restaurant_id', 'category')
+            .annotate(items=Count('id'), total=Sum('price'))
+            .order_by()
+        )
+        for row in rows:
+            categories, items, total = totals.get(row['restaurant_id'], (frozenset(), 0, 0))
+            totals[row['restaurant_id']] = (
+                categories | {row['category']}, items + row['items'], total + row['total']
+            )
+
+    return {
+        restaurant_id: (categories, price_band(total / items))
+        for restaurant_id, (categories, items, total) in totals.items()
+    }
+
+
+def selected_values(params):
+    """``{facet: {values}}`` for the facets filtered on; values are comma-separated"""
+    selection = {}
+    for facet in FACETS:
+        values = {value.strip() for value in params.get(facet, '').split(',') if value.strip()}
+        if values:
+            selection[facet] = values
+    return selection
+
+
+def facet_search(rows, params, profiles, closed_ids):
+    """
+    Filter ``rows`` of ``(id, cuisine_type, is_open)`` by the facets in
+    ``params`` and count every facet. Returns ``(matching ids, counts)``.
+    """
+    selection = selected_values(params)
+    counts = {facet: Counter() for facet in FACETS}
+    matching = []
+    for restaurant_id, cuisine_type, is_open in rows:
+        categories, band = profiles.get(restaurant_id, (frozenset(), None))
+        values = {
+            'cuisine_type': {cuisine_type},
+            'category': categories,
+            'open_now': {'true' if is_open and restaurant_id not in closed_ids else 'false'},
+            'price_band': {band} if band else set(),
+        }
+        failed = [facet for facet, selected in selection.items() if not values[facet] & selected]
+        if not failed:
+            matching.append(restaurant_id)
+        # A facet's own selection does not narrow its counts
+        if len(failed) > 1:
+            continue
+        for facet in FACETS:
+            if not failed or failed == [facet]:
+                counts[facet].update(values[facet])
+
+    facets = {
+        facet: {value: counts[facet][value] for value in FACET_CHOICES[facet]}
+        for facet in FACETS
+    }
+    return matching, facets
+
+
+def search_facets(queryset, params):
+    """
+    ``(matching ids, facet counts)`` for the restaurants of ``queryset``
+    (already narrowed by ``search``), cached per filter combination until
+    the catalogue changes or a restaurant opens or closes.
+    """
+    now = timezone.now()
+    schedule = get_index(now)
+    key = (
+        f'catalogue:{catalogue_version()}:facets:'
+        f'{_catalogue_query(params, FILTER_PARAMS)}:{schedule.state_key(now)}'
+    )
+    return cached_payload(key, lambda: facet_search(
+        queryset.values_list('id', 'cuisine_type', 'is_open'),
+        params, restaurant_profiles(), schedule.closed_ids(now)
+    ))
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from restaurants.cache import warm_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Precompute catalogue, cuisine and popular restaurant payloads into the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Pages rendered in parallel (default: 4)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Rank restaurants by orders placed in this many days (default: 7)',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=20,
+            help='Number of restaurant detail pages to warm (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'SHARED_CACHE', False):
+            self.stdout.write(self.style.WARNING(
+                'No shared cache is configured (set REDIS_URL); catalogue payloads are not cached.'
+            ))
+            return
+
+        started = time.monotonic()
+        warmed, failed = warm_catalogue(
+            workers=max(1, options['workers']),
+            days=options['days'],
+            top=options['top'],
+        )
+        elapsed = time.monotonic() - started
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} payloads could not be warmed.'))
+        self.stdout.write(self.style.SUCCESS(f'✓ Warmed {warmed} catalogue payloads in {elapsed:.1f}s.'))
@@ -0,0 +1,92 @@
+"""
+Row readers for bulk menu uploads.
+
+Uploaded files are read incrementally: CSV and NDJSON files are decoded
+line by line straight from the upload's chunks, so large menus are never
+held in memory as one string. Plain JSON arrays are also accepted for
+convenience.
+"""
+import codecs
+import csv
+import json
+
+
+MENU_IMPORT_FIELDS = ['name', 'description', 'price', 'category', 'is_available']
+
+
+class MenuImportError(Exception):
+    """Raised when an uploaded file cannot be parsed at all"""
+
+
+def _clean_row(row):
+    """Keep known columns and drop blanks so serializer defaults apply"""
+    cleaned = {}
+    for field in MENU_IMPORT_FIELDS:
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            cleaned[field] = value
+    return cleaned
+
+
+def _iter_lines(upload):
+    """Yield decoded text lines from an uploaded file without reading it whole"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    for chunk in upload.chunks():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            yield line + '\n'
+    buffer += decoder.decode(b'', final=True)
+    if buffer:
+        yield buffer
+
+
+def iter_csv_rows(upload):
+    reader = csv.DictReader(_iter_lines(upload))
+    if not reader.fieldnames or 'name' not in reader.fieldnames:
+        raise MenuImportError('CSV header must include at least a "name" column.')
+    for row in reader:
+        yield _clean_row(row)
+
+
+def iter_ndjson_rows(upload):
+    for line_number, line in enumerate(_iter_lines(upload), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise MenuImportError(f'Line {line_number} is not valid JSON.')
+        if not isinstance(row, dict):
+            raise MenuImportError(f'Line {line_number} must be a JSON object.')
+        yield _clean_row(row)
+
+
+def iter_json_rows(upload):
+    try:
+        rows = json.load(codecs.getreader('utf-8-sig')(upload))
+    except ValueError:
+        raise MenuImportError('File is not valid JSON.')
+    if not isinstance(rows, list):
+        raise MenuImportError('JSON upload must be an array of menu items.')
+    for row in rows:
+        if not isinstance(row, dict):
+            raise MenuImportError('Each menu item must be a JSON object.')
+        yield _clean_row(row)
+
+
+def iter_menu_rows(upload):
+    """Pick a reader based on the uploaded file's extension or content type"""
+    name = (upload.name or '').lower()
+    content_type = (getattr(upload, 'content_type', '') or '').lower()
+
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type:
+        return iter_ndjson_rows(upload)
+    if name.endswith('.json') or content_type == 'application/json':
+        return iter_json_rows(upload)
+    if name.endswith('.csv') or 'csv' in content_type:
+        return iter_csv_rows(upload)
+    raise MenuImportError('Unsupported file type. Upload a .csv, .json or .ndjson file.')
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 19:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0003_restaurant_delivery_time_restaurant_is_open'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['updated_at'], name='menu_item_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['updated_at'], name='restaurant_updated_idx'),
+        ),
+    ]
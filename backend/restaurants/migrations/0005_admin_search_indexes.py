@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0004_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='menuitem',
+            name='name',
+            field=models.CharField(db_index=True, max_length=200, verbose_name='Item Name'),
+        ),
+        migrations.AlterField(
+            model_name='restaurant',
+            name='name',
+            field=models.CharField(db_index=True, max_length=200, verbose_name='Restaurant Name'),
+        ),
+    ]
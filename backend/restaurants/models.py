@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 
+from foodieasy_backend.sharding import ShardedQuerySet
+
 
 class Restaurant(models.Model):
     """
@@ -29,7 +31,8 @@ class Restaurant(models.Model):
         related_name='restaurant',
         limit_choices_to={'role': 'RESTAURANT_OWNER'}
     )
-    name = models.CharField(max_length=200, verbose_name='Restaurant Name')
+    # Indexed for the admin's prefix search (order search by restaurant name)
+    name = models.CharField(max_length=200, db_index=True, verbose_name='Restaurant Name')
     description = models.TextField(blank=True, verbose_name='Description')
     address = models.TextField(verbose_name='Address')
     phone_number = models.CharField(max_length=15, verbose_name='Phone Number')
@@ -57,6 +60,10 @@ class Restaurant(models.Model):
         verbose_name = 'Restaurant'
         verbose_name_plural = 'Restaurants'
         ordering = ['-created_at']
+        indexes = [
+            # MAX(updated_at) for catalogue ETags
+            models.Index(fields=['updated_at'], name='restaurant_updated_idx'),
+        ]
 
 
 class MenuItem(models.Model):
@@ -77,7 +84,8 @@ class MenuItem(models.Model):
         on_delete=models.CASCADE,
         related_name='menu_items'
     )
-    name = models.CharField(max_length=200, verbose_name='Item Name')
+    # Indexed for the admin's prefix search (order item search by name)
+    name = models.CharField(max_length=200, db_index=True, verbose_name='Item Name')
     description = models.TextField(blank=True, verbose_name='Description')
     price = models.DecimalField(
         max_digits=10,
@@ -94,6 +102,9 @@ class MenuItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Rows live on their restaurant's shard (foodieasy_backend.sharding)
+    objects = ShardedQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.name} - {self.restaurant.name}"
     
@@ -101,3 +112,71 @@ class MenuItem(models.Model):
         verbose_name = 'Menu Item'
         verbose_name_plural = 'Menu Items'
         ordering = ['category', 'name']
+        indexes = [
+            # MAX(updated_at) for catalogue and menu ETags
+            models.Index(fields=['updated_at'], name='menu_item_updated_idx'),
+        ]
+
+
+class OpeningHours(models.Model):
+    """
+    OpeningHours model - one weekly opening period of a restaurant, in
+    RESTAURANT_TIME_ZONE. A period that closes at or before its opening
+    time runs past midnight (00:00-00:00 is the whole day). Restaurants
+    without any periods are always open (see restaurants.schedule).
+    """
+    
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='opening_hours'
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    opens_at = models.TimeField()
+    closes_at = models.TimeField()
+    
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.opens_at:%H:%M}-{self.closes_at:%H:%M}"
+    
+    class Meta:
+        verbose_name_plural = 'Opening hours'
+        ordering = ['restaurant', 'weekday', 'opens_at']
+
+
+class ScheduleException(models.Model):
+    """
+    ScheduleException model - replaces a restaurant's weekly hours on one
+    date: closed all day when ``opens_at``/``closes_at`` are empty,
+    otherwise open for that period only (e.g. holidays, private events).
+    """
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='schedule_exceptions'
+    )
+    date = models.DateField()
+    opens_at = models.TimeField(null=True, blank=True)
+    closes_at = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=200, blank=True, default='')
+    
+    def __str__(self):
+        if self.opens_at is None:
+            return f"{self.date}: closed"
+        return f"{self.date}: {self.opens_at:%H:%M}-{self.closes_at:%H:%M}"
+    
+    class Meta:
+        ordering = ['restaurant', 'date', 'opens_at']
+        indexes = [
+            # The schedule index loads the exceptions of the coming days
+            models.Index(fields=['date'], name='schedule_exception_date_idx'),
+        ]
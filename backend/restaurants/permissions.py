@@ -27,7 +27,7 @@ class IsRestaurantOwner(permissions.BasePermission):
             restaurant = obj
         
         # Write permissions only for the owner
-        return restaurant.owner == request.user
+        return restaurant.owner_id == request.user.id
 
 
 class IsRestaurantOwnerOrReadOnly(permissions.BasePermission):
@@ -43,5 +43,5 @@ class IsRestaurantOwnerOrReadOnly(permissions.BasePermission):
         
         # Write permissions only for owner
         if hasattr(obj, 'restaurant'):
-            return obj.restaurant.owner == request.user
-        return obj.owner == request.user
+            return obj.restaurant.owner_id == request.user.id
+        return obj.owner_id == request.user.id
@@ -0,0 +1,223 @@
+"""
+Opening hours compiled into an in-memory interval index.
+
+Weekly ``OpeningHours`` and dated ``ScheduleException`` rows are expanded
+into absolute open intervals (epoch seconds) for every restaurant over a
+window of ``INDEX_DAYS`` days, merged and kept as two sorted lists per
+restaurant. "Is it open at t?" is then one ``bisect`` per restaurant and
+needs no query. The index is built with two queries, kept per process and
+rebuilt when the window runs out, after ``SCHEDULE_INDEX_TTL`` seconds, or
+when a schedule changes. Changes are announced by a version number in the
+cache, as in restaurants.cache; only with ``SHARED_CACHE`` does that reach
+other processes, so without it they pick up edits when their index
+expires, and settings keep the TTL short.
+
+Restaurants without opening hours are always open, so schedules can be
+introduced one restaurant at a time; if they have exceptions, they are
+open all day on every other date. The manual ``Restaurant.is_open``
+switch and ``is_active`` still close a restaurant whatever its hours.
+"""
+import bisect
+import threading
+import time as monotonic_time
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+
+DEFAULT_TTL = 60 * 15
+INDEX_DAYS = 8
+# Hours of a day without weekly hours or an exception (00:00-00:00 is the whole day)
+ALL_DAY = [(time(), time())]
+SCHEDULE_VERSION_KEY = 'schedule-version'
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def schedule_time_zone():
+    return ZoneInfo(getattr(settings, 'RESTAURANT_TIME_ZONE', None) or settings.TIME_ZONE)
+
+
+def _timestamp(day, at, tz):
+    return datetime.combine(day, at, tzinfo=tz).timestamp()
+
+
+def _period(day, opens_at, closes_at, tz):
+    """``(start, end)`` of a period opening on ``day``; ends after midnight when it closes earlier"""
+    end_day = day if closes_at > opens_at else day + timedelta(days=1)
+    return _timestamp(day, opens_at, tz), _timestamp(end_day, closes_at, tz)
+
+
+def _merge(periods):
+    starts, ends = [], []
+    for start, end in sorted(periods):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+class ScheduleIndex:
+    """Open intervals per restaurant between ``valid_from`` and ``valid_until``"""
+
+    def __init__(self, intervals, valid_from, valid_until, version=None):
+        self.intervals = intervals
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+        self.version = version
+        self.built_at = monotonic_time.monotonic()
+        # Every instant at which some restaurant opens or closes
+        self.boundaries = sorted({
+            point for starts, ends in intervals.values() for point in starts + ends
+        })
+
+    @classmethod
+    def build(cls, at=None, days=INDEX_DAYS, version=None):
+        """Compile the schedules of every restaurant for ``days`` days from ``at``"""
+        from .models import OpeningHours, ScheduleException
+
+        tz = schedule_time_zone()
+        at = at or timezone.now()
+        # Start a day early so periods running past midnight are covered
+        first_day = timezone.localtime(at, tz).date() - timedelta(days=1)
+        days_covered = [first_day + timedelta(days=offset) for offset in range(days + 1)]
+
+        weekly = {}
+        for restaurant_id, weekday, opens_at, closes_at in OpeningHours.objects.values_list(
+            'restaurant_id', 'weekday', 'opens_at', 'closes_at'
+        ):
+            weekly.setdefault(restaurant_id, {}).setdefault(weekday, []).append((opens_at, closes_at))
+
+        exceptions = {}
+        for restaurant_id, day, opens_at, closes_at in ScheduleException.objects.filter(
+            date__gte=days_covered[0], date__lte=days_covered[-1]
+        ).values_list('restaurant_id', 'date', 'opens_at', 'closes_at'):
+            periods = exceptions.setdefault((restaurant_id, day), [])
+            if opens_at is not None and closes_at is not None:
+                periods.append((opens_at, closes_at))
+
+        intervals = {}
+        for restaurant_id in set(weekly) | {restaurant_id for restaurant_id, _ in exceptions}:
+            periods = []
+            for day in days_covered:
+                regular = weekly[restaurant_id].get(day.weekday(), []) if restaurant_id in weekly else ALL_DAY
+                day_periods = exceptions.get((restaurant_id, day), regular)
+                periods.extend(_period(day, opens_at, closes_at, tz) for opens_at, closes_at in day_periods)
+            intervals[restaurant_id] = _merge(periods)
+
+        valid_from = at.timestamp()
+        # The last day's periods may be cut short by the end of the window
+        valid_until = _timestamp(days_covered[-1], time(), tz)
+        return cls(intervals, valid_from, valid_until, version)
+
+    def covers(self, at):
+        return self.valid_from <= at.timestamp() < self.valid_until
+
+    def is_fresh(self, at, version, ttl):
+        return (
+            self.version == version and self.covers(at)
+            and monotonic_time.monotonic() - self.built_at < ttl
+        )
+
+    def has_schedule(self, restaurant_id):
+        return restaurant_id in self.intervals
+
+    def is_open(self, restaurant_id, at):
+        """Whether the restaurant's hours include ``at``; O(log n) in its periods"""
+        if restaurant_id not in self.intervals:
+            return True
+        starts, ends = self.intervals[restaurant_id]
+        moment = at.timestamp()
+        position = bisect.bisect_right(starts, moment) - 1
+        return position >= 0 and moment < ends[position]
+
+    def closed_ids(self, at):
+        """Restaurants with hours that are closed at ``at``"""
+        return {
+            restaurant_id for restaurant_id in self.intervals
+            if not self.is_open(restaurant_id, at)
+        }
+
+    def last_change(self, at):
+        """The latest instant up to ``at`` at which some restaurant opened or closed"""
+        position = bisect.bisect_right(self.boundaries, at.timestamp())
+        if not position:
+            return None
+        return datetime.fromtimestamp(self.boundaries[position - 1], tz=dt_timezone.utc)
+
+    def state_key(self, at):
+        """
+        Changes exactly when some restaurant opens or closes (or a schedule
+        is edited), for cache keys of payloads that depend on who is open.
+        """
+        changed = self.last_change(at)
+        return f'{self.version}:{changed.isoformat() if changed else ""}'
+
+
+def schedule_version():
+    version = cache.get(SCHEDULE_VERSION_KEY)
+    if version is None:
+        cache.add(SCHEDULE_VERSION_KEY, 1, None)
+        version = cache.get(SCHEDULE_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_schedules():
+    """
+    Rebuild this process's index on its next use, and every other
+    process's when the cache is shared
+    """
+    global _index
+    try:
+        cache.incr(SCHEDULE_VERSION_KEY)
+    except ValueError:
+        cache.set(SCHEDULE_VERSION_KEY, 1, None)
+    with _index_lock:
+        _index = None
+
+
+def _schedule_changed(sender, **kwargs):
+    from .cache import invalidate_catalogue
+
+    invalidate_schedules()
+    # Cached catalogue payloads carry each restaurant's open_now
+    invalidate_catalogue()
+
+
+def connect_signals():
+    """Rebuild the index whenever opening hours or exceptions are saved or deleted"""
+    from .models import OpeningHours, ScheduleException
+
+    for model in (OpeningHours, ScheduleException):
+        label = model._meta.label_lower
+        post_save.connect(_schedule_changed, sender=model, dispatch_uid=f'schedule-save:{label}')
+        post_delete.connect(_schedule_changed, sender=model, dispatch_uid=f'schedule-delete:{label}')
+
+
+def get_index(at=None):
+    """This process's index, rebuilt when it no longer covers ``at`` or a schedule changed"""
+    global _index
+    at = at or timezone.now()
+    version = schedule_version()
+    ttl = getattr(settings, 'SCHEDULE_INDEX_TTL', DEFAULT_TTL)
+    index = _index
+    if index is not None and index.is_fresh(at, version, ttl):
+        return index
+    with _index_lock:
+        if _index is None or not _index.is_fresh(at, version, ttl):
+            _index = ScheduleIndex.build(at, version=version)
+        return _index
+
+
+def is_open_now(restaurant, at=None, index=None):
+    """Whether ``restaurant`` takes orders at ``at`` (now): its switches and its hours"""
+    at = at or timezone.now()
+    index = index or get_index(at)
+    return restaurant.is_active and restaurant.is_open and index.is_open(restaurant.id, at)
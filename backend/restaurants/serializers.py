@@ -1,10 +1,26 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Restaurant, MenuItem
+from .models import Restaurant, MenuItem, OpeningHours, ScheduleException
+from .schedule import get_index, is_open_now
+from orders.eta import format_estimate
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 
+class OpenNowMixin:
+    """``open_now`` from the schedule index, looked up once per serialization"""
+    
+    def get_open_now(self, obj):
+        """Return whether the restaurant takes orders right now"""
+        root = self.root
+        if not hasattr(root, '_schedule'):
+            now = timezone.now()
+            root._schedule = (now, get_index(now))
+        now, index = root._schedule
+        return is_open_now(obj, now, index)
+
+
 class MenuItemSerializer(serializers.ModelSerializer):
     """
     Serializer for menu items.
@@ -20,7 +36,7 @@ class MenuItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class RestaurantSerializer(serializers.ModelSerializer):
+class RestaurantSerializer(OpenNowMixin, serializers.ModelSerializer):
     """
     Serializer for restaurants with nested menu items.
     """
@@ -28,13 +44,16 @@ class RestaurantSerializer(serializers.ModelSerializer):
     owner_email = serializers.SerializerMethodField()
     menu_items = MenuItemSerializer(many=True, read_only=True)
     menu_items_count = serializers.SerializerMethodField()
+    estimated_delivery_time = serializers.SerializerMethodField()
+    open_now = serializers.SerializerMethodField()
     
     class Meta:
         model = Restaurant
         fields = [
             'id', 'owner', 'owner_name', 'owner_email',
             'name', 'description', 'address', 'phone_number',
-            'cuisine_type', 'delivery_time', 'is_open', 'is_active', 'menu_items',
+            'cuisine_type', 'delivery_time', 'estimated_delivery_time',
+            'is_open', 'open_now', 'is_active', 'menu_items',
             'menu_items_count', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'owner', 'created_at', 'updated_at']
@@ -48,23 +67,34 @@ class RestaurantSerializer(serializers.ModelSerializer):
         return obj.owner.email
     
     def get_menu_items_count(self, obj):
-        """Return count of menu items"""
-        return obj.menu_items.count()
+        """Return count of menu items (annotated or prefetched by the view)"""
+        count = getattr(obj, 'menu_items_total', None)
+        return obj.menu_items.count() if count is None else count
+    
+    def get_estimated_delivery_time(self, obj):
+        """Return learned delivery time, falling back to the owner's estimate"""
+        return format_estimate(
+            getattr(obj, 'delivery_estimate', None),
+            fallback=obj.delivery_time
+        )
 
 
-class RestaurantListSerializer(serializers.ModelSerializer):
+class RestaurantListSerializer(OpenNowMixin, serializers.ModelSerializer):
     """
     Serializer for restaurant list (without nested menu items for performance).
     """
     owner_name = serializers.SerializerMethodField()
     menu_items_count = serializers.SerializerMethodField()
+    estimated_delivery_time = serializers.SerializerMethodField()
+    open_now = serializers.SerializerMethodField()
     
     class Meta:
         model = Restaurant
         fields = [
             'id', 'owner_name', 'name', 'description',
             'address', 'phone_number', 'cuisine_type',
-            'delivery_time', 'is_open', 'is_active', 'menu_items_count', 'created_at'
+            'delivery_time', 'estimated_delivery_time', 'is_open', 'open_now', 'is_active',
+            'menu_items_count', 'created_at'
         ]
     
     def get_owner_name(self, obj):
@@ -72,8 +102,18 @@ class RestaurantListSerializer(serializers.ModelSerializer):
         return obj.owner.full_name
     
     def get_menu_items_count(self, obj):
-        """Return count of menu items"""
-        return obj.menu_items.count()
+        """Return count of menu items (annotated, or counted per shard by the view)"""
+        count = getattr(obj, 'menu_items_total', None)
+        if count is None and 'menu_items_counts' in self.context:
+            count = self.context['menu_items_counts'].get(obj.id, 0)
+        return obj.menu_items.count() if count is None else count
+    
+    def get_estimated_delivery_time(self, obj):
+        """Return learned delivery time, falling back to the owner's estimate"""
+        return format_estimate(
+            getattr(obj, 'delivery_estimate', None),
+            fallback=obj.delivery_time
+        )
 
 
 class RestaurantCreateSerializer(serializers.ModelSerializer):
@@ -131,3 +171,52 @@ class MenuItemCreateSerializer(serializers.ModelSerializer):
         if value <= 0:
             raise serializers.ValidationError('Price must be greater than 0.')
         return value
+
+
+class MenuItemAvailabilitySerializer(serializers.Serializer):
+    """
+    Serializer for toggling availability on many menu items at once.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=1000
+    )
+    is_available = serializers.BooleanField()
+
+
+class OpeningHoursSerializer(serializers.ModelSerializer):
+    """
+    Serializer for one weekly opening period.
+    """
+    
+    class Meta:
+        model = OpeningHours
+        fields = ['weekday', 'opens_at', 'closes_at']
+
+
+class ScheduleExceptionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a date whose hours differ from the weekly ones.
+    """
+    
+    class Meta:
+        model = ScheduleException
+        fields = ['date', 'opens_at', 'closes_at', 'reason']
+    
+    def validate(self, attrs):
+        """Both times or neither (closed all day)"""
+        opens_at, closes_at = attrs.get('opens_at'), attrs.get('closes_at')
+        if (opens_at is None) != (closes_at is None):
+            raise serializers.ValidationError(
+                'Give both opening and closing times, or neither to close for the day.'
+            )
+        return attrs
+
+
+class RestaurantScheduleSerializer(serializers.Serializer):
+    """
+    Serializer for replacing a restaurant's whole schedule.
+    """
+    opening_hours = OpeningHoursSerializer(many=True, max_length=7 * 24)
+    exceptions = ScheduleExceptionSerializer(many=True, required=False, max_length=1000)
@@ -0,0 +1,12 @@
+"""
+Background tasks for the restaurants app (run by ``manage.py run_worker``).
+"""
+from jobs.queue import task
+
+from .cache import warm_catalogue
+
+
+@task('restaurants.warm_caches')
+def warm_caches(days=7, top=20):
+    """Warm the catalogue cache; useful after a deploy when CACHES is shared"""
+    warm_catalogue(days=days, top=top)
@@ -1,3 +1,490 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import MenuItem, OpeningHours, Restaurant, ScheduleException
+from .menu_import import MenuImportError, iter_csv_rows
+from .cache import cached_payload, catalogue_request, warm_catalogue
+from .schedule import ScheduleIndex, get_index, invalidate_schedules
+from .views import RestaurantViewSet
+
+User = get_user_model()
+
+BERLIN = ZoneInfo('Europe/Berlin')
+# A Monday
+MONDAY = date(2026, 10, 19)
+
+
+def at(day, hour, minute=0):
+    return datetime.combine(day, time(hour, minute), tzinfo=BERLIN)
+
+
+@override_settings(RESTAURANT_TIME_ZONE='Europe/Berlin')
+class ScheduleIndexTests(TestCase):
+    """Opening hours and exceptions compiled into the interval index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurants = [
+            Restaurant.objects.create(
+                owner=User.objects.create_user(email=f'owner{i}@schedule.test', role='RESTAURANT_OWNER'),
+                name=f'Restaurant {i}', address='1 Main St', phone_number='0'
+            )
+            for i in range(4)
+        ]
+        lunch, late, unscheduled, holiday = cls.restaurants
+        OpeningHours.objects.bulk_create(
+            [OpeningHours(restaurant=lunch, weekday=day, opens_at=time(11), closes_at=time(15)) for day in range(5)]
+            + [OpeningHours(restaurant=lunch, weekday=day, opens_at=time(18), closes_at=time(22)) for day in range(5)]
+            # Friday and Saturday nights until 2am
+            + [OpeningHours(restaurant=late, weekday=day, opens_at=time(20), closes_at=time(2)) for day in (4, 5)]
+        )
+        ScheduleException.objects.bulk_create([
+            ScheduleException(restaurant=lunch, date=MONDAY + timedelta(days=1), reason='Staff day'),
+            ScheduleException(
+                restaurant=lunch, date=MONDAY + timedelta(days=2), opens_at=time(9), closes_at=time(12)
+            ),
+            # No weekly hours, one closed day
+            ScheduleException(restaurant=holiday, date=MONDAY + timedelta(days=2), reason='Holiday'),
+        ])
+
+    def test_weekly_hours_exceptions_and_overnight_periods(self):
+        index = ScheduleIndex.build(at(MONDAY, 8))
+        lunch, late, unscheduled, holiday = (restaurant.id for restaurant in self.restaurants)
+
+        self.assertFalse(index.is_open(lunch, at(MONDAY, 10, 59)))
+        self.assertTrue(index.is_open(lunch, at(MONDAY, 11)))
+        self.assertFalse(index.is_open(lunch, at(MONDAY, 15)))
+        self.assertTrue(index.is_open(lunch, at(MONDAY, 21)))
+        # Closed all Tuesday, 9-12 only on Wednesday
+        self.assertFalse(index.is_open(lunch, at(MONDAY + timedelta(days=1), 12)))
+        self.assertTrue(index.is_open(lunch, at(MONDAY + timedelta(days=2), 9, 30)))
+        self.assertFalse(index.is_open(lunch, at(MONDAY + timedelta(days=2), 13)))
+        # Saturday 01:30 belongs to Friday night
+        self.assertTrue(index.is_open(late, at(MONDAY + timedelta(days=5), 1, 30)))
+        self.assertFalse(index.is_open(late, at(MONDAY + timedelta(days=5), 2)))
+        self.assertTrue(index.is_open(unscheduled, at(MONDAY + timedelta(days=1), 4)))
+        # An exception closes only its own date
+        self.assertTrue(index.is_open(holiday, at(MONDAY, 12)))
+        self.assertTrue(index.is_open(holiday, at(MONDAY + timedelta(days=1), 23, 59)))
+        self.assertFalse(index.is_open(holiday, at(MONDAY + timedelta(days=2), 0)))
+        self.assertFalse(index.is_open(holiday, at(MONDAY + timedelta(days=2), 12)))
+        self.assertTrue(index.is_open(holiday, at(MONDAY + timedelta(days=3), 0)))
+
+        self.assertEqual(index.closed_ids(at(MONDAY, 12)), {late})
+
+    def test_state_key_changes_only_when_someone_opens_or_closes(self):
+        index = ScheduleIndex.build(at(MONDAY, 8))
+        self.assertEqual(index.state_key(at(MONDAY, 11, 5)), index.state_key(at(MONDAY, 14, 55)))
+        self.assertNotEqual(index.state_key(at(MONDAY, 14, 55)), index.state_key(at(MONDAY, 15, 5)))
+
+    def test_index_is_built_with_two_queries(self):
+        with self.assertNumQueries(2):
+            index = ScheduleIndex.build(at(MONDAY, 8))
+        self.assertFalse(index.covers(at(MONDAY + timedelta(days=9), 12)))
+
+    def test_index_expires_for_edits_made_by_other_processes(self):
+        invalidate_schedules()
+        self.addCleanup(invalidate_schedules)
+        index = get_index(at(MONDAY, 8))
+        # A bulk update sends no signal, like an edit handled by another process
+        OpeningHours.objects.update(closes_at=time(23))
+        self.assertIs(get_index(at(MONDAY, 8)), index)
+
+        expired = index.built_at + settings.SCHEDULE_INDEX_TTL + 1
+        with mock.patch('restaurants.schedule.monotonic_time.monotonic', return_value=expired):
+            self.assertIsNot(get_index(at(MONDAY, 8)), index)
+
+
+class OpenNowTests(TestCase):
+    """open_now in the catalogue and the order-creation fast path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@open.test', role='RESTAURANT_OWNER')
+        cls.open = Restaurant.objects.create(
+            owner=cls.owner, name='Always Open', address='1 Main St', phone_number='0'
+        )
+        cls.closed = Restaurant.objects.create(
+            owner=User.objects.create_user(email='closed@open.test', role='RESTAURANT_OWNER'),
+            name='Closed Today', address='2 Main St', phone_number='0'
+        )
+        cls.menu_item = MenuItem.objects.create(restaurant=cls.closed, name='Soup', price=Decimal('4.00'))
+        cls.customer = User.objects.create_user(email='customer@open.test', role='CUSTOMER')
+
+    def setUp(self):
+        cache.clear()
+        invalidate_schedules()
+        today = timezone.localdate()
+        # Both days, so the test does not depend on the time of day
+        ScheduleException.objects.create(restaurant=self.closed, date=today)
+        ScheduleException.objects.create(restaurant=self.closed, date=today + timedelta(days=1))
+
+    def test_open_now_filter_and_field(self):
+        response = APIClient().get('/api/restaurants/?open_now=true')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([row['name'] for row in results], ['Always Open'])
+        self.assertTrue(results[0]['open_now'])
+
+        response = APIClient().get('/api/restaurants/?open_now=false')
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([row['open_now'] for row in results], [False])
+
+    def test_schedule_changes_reach_the_cached_catalogue(self):
+        client = APIClient()
+        self.assertEqual(len(self.names(client.get('/api/restaurants/?open_now=true'))), 1)
+        ScheduleException.objects.filter(restaurant=self.closed).delete()
+        self.assertEqual(len(self.names(client.get('/api/restaurants/?open_now=true'))), 2)
+
+    def names(self, response):
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        return [row['name'] for row in results]
+
+    def test_orders_to_closed_restaurants_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.post('/api/orders/', {
+            'restaurant': self.closed.id,
+            'delivery_address': '3 High St',
+            'items': [{'menu_item': self.menu_item.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('closed right now', str(response.data['restaurant']))
+
+    def test_owner_replaces_opening_hours(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.put(f'/api/restaurants/{self.open.id}/hours/', {
+            'opening_hours': [
+                {'weekday': weekday, 'opens_at': '00:00', 'closes_at': '00:00'} for weekday in range(7)
+            ],
+            'exceptions': [{'date': '2026-12-25', 'reason': 'Christmas'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['opening_hours']), 7)
+        self.assertTrue(APIClient().get(f'/api/restaurants/{self.open.id}/').data['open_now'])
+
+        other = APIClient()
+        other.force_authenticate(self.customer)
+        response = other.put(f'/api/restaurants/{self.open.id}/hours/', {'opening_hours': []}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class FacetBrowseTests(TestCase):
+    """/api/restaurants/browse/ pages with disjunctive facet counts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        menus = [
+            ('Thai Garden', 'THAI', [('MAIN_COURSE', '8.00'), ('DESSERTS', '4.00')]),
+            ('Bangkok Street', 'THAI', [('MAIN_COURSE', '30.00')]),
+            ('Trattoria', 'ITALIAN', [('MAIN_COURSE', '14.00'), ('DESSERTS', '7.00')]),
+            ('Empty Kitchen', 'KOREAN', []),
+        ]
+        for i, (name, cuisine_type, items) in enumerate(menus):
+            restaurant = Restaurant.objects.create(
+                owner=User.objects.create_user(email=f'owner{i}@facets.test', role='RESTAURANT_OWNER'),
+                name=name, cuisine_type=cuisine_type, address='1 Main St', phone_number='0'
+            )
+            MenuItem.objects.bulk_create([
+                MenuItem(restaurant=restaurant, name=f'Dish {j}', category=category, price=Decimal(price))
+                for j, (category, price) in enumerate(items)
+            ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_facets_ignore_their_own_filter(self):
+        response = APIClient().get('/api/restaurants/browse/?cuisine_type=THAI&category=DESSERTS')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.data['results']], ['Thai Garden'])
+        self.assertEqual(response.data['count'], 1)
+
+        facets = response.data['facets']
+        # Restaurants serving desserts, by cuisine
+        self.assertEqual(facets['cuisine_type']['THAI'], 1)
+        self.assertEqual(facets['cuisine_type']['ITALIAN'], 1)
+        # Thai restaurants, by category
+        self.assertEqual(facets['category']['MAIN_COURSE'], 2)
+        self.assertEqual(facets['category']['DESSERTS'], 1)
+        self.assertEqual(facets['price_band'], {'budget': 1, 'moderate': 0, 'premium': 0})
+        self.assertEqual(facets['open_now'], {'true': 1, 'false': 0})
+
+    def test_price_bands_and_multiple_values(self):
+        response = APIClient().get('/api/restaurants/browse/?price_band=moderate,premium&ordering=name')
+        self.assertEqual(
+            [row['name'] for row in response.data['results']], ['Bangkok Street', 'Trattoria']
+        )
+        self.assertEqual(
+            response.data['facets']['price_band'], {'budget': 1, 'moderate': 1, 'premium': 1}
+        )
+
+    @override_settings(SHARED_CACHE=True)
+    def test_pages_share_the_cached_facet_counts(self):
+        client = APIClient()
+        client.get('/api/restaurants/browse/?page_size=2')
+        with self.assertNumQueries(5):
+            # Validators, then the page count and rows; facets come from the cache
+            response = client.get('/api/restaurants/browse/?page_size=2&page=2')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(sum(response.data['facets']['cuisine_type'].values()), 4)
+
+    @override_settings(SHARED_CACHE=True, ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_cached_pages_link_without_a_host(self):
+        client = APIClient()
+        client.get('/api/restaurants/browse/?page_size=2')
+        response = client.get('/api/restaurants/browse/?page_size=2', HTTP_HOST='api.example.com')
+        self.assertEqual(response.data['next'], '/api/restaurants/browse/?page=2&page_size=2')
+        self.assertIsNone(response.data['previous'])
+
+
+class CatalogueCacheTests(TestCase):
+    """Catalogue payloads are cached only in a cache shared by every process"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@cache.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name='Cached Diner', address='1 Main St', phone_number='0'
+        )
+        MenuItem.objects.create(restaurant=cls.restaurant, name='Toast', price=Decimal('3.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_payloads_are_built_every_time_without_a_shared_cache(self):
+        builds = []
+        for _ in range(2):
+            cached_payload('catalogue:test', lambda: builds.append(1) or {'built': len(builds)})
+        self.assertEqual(len(builds), 2)
+        self.assertEqual(warm_catalogue(), (0, 0))
+
+    @override_settings(SHARED_CACHE=True)
+    def test_writes_invalidate_the_shared_cache(self):
+        client = APIClient()
+        client.get(f'/api/restaurants/{self.restaurant.id}/')
+        with self.assertNumQueries(3):
+            # Only the validators; the payload comes from the cache
+            response = client.get(f'/api/restaurants/{self.restaurant.id}/')
+        self.assertEqual(response.data['menu_items_count'], 1)
+
+        owner = APIClient()
+        owner.force_authenticate(self.owner)
+        owner.post('/api/menu-items/', {'name': 'Jam', 'price': '1.50'}, format='json')
+        response = client.get(f'/api/restaurants/{self.restaurant.id}/')
+        self.assertEqual(response.data['menu_items_count'], 2)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_warmed_pages_are_served_from_the_cache(self):
+        view = RestaurantViewSet.as_view({'get': 'list'})
+        response = view(catalogue_request({'cuisine_type': 'OTHER'}))
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(3):
+            response = APIClient().get('/api/restaurants/?cuisine_type=OTHER')
+        self.assertEqual([row['name'] for row in response.data], ['Cached Diner'])
+
+
+class CatalogueETagTests(TestCase):
+    """Catalogue ETags change on deletes as well as on updates"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurants = [
+            Restaurant.objects.create(
+                owner=User.objects.create_user(email=f'owner{i}@etag.test', role='RESTAURANT_OWNER'),
+                name=f'Restaurant {i}', address='1 Main St', phone_number='0'
+            )
+            for i in range(2)
+        ]
+        cls.menu_items = [
+            MenuItem.objects.create(restaurant=cls.restaurants[1], name=f'Dish {i}', price=Decimal('5.00'))
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def assertETagChanges(self, path, change):
+        client = APIClient()
+        etag = client.get(path)['ETag']
+        self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_deleting_an_older_restaurant_changes_the_list_etag(self):
+        response = self.assertETagChanges('/api/restaurants/', self.restaurants[0].delete)
+        self.assertEqual([row['name'] for row in response.data], ['Restaurant 1'])
+
+    def test_deleting_an_older_menu_item_changes_the_detail_etag(self):
+        response = self.assertETagChanges(
+            f'/api/restaurants/{self.restaurants[1].id}/', self.menu_items[0].delete
+        )
+        self.assertEqual(response.data['menu_items_count'], 1)
+
+
+class ChunkedUpload:
+    """Upload stand-in whose chunks split lines and characters"""
+    name = 'menu.csv'
+
+    def __init__(self, content, size):
+        self.content = content.encode('utf-8')
+        self.size = size
+
+    def chunks(self):
+        for start in range(0, len(self.content), self.size):
+            yield self.content[start:start + self.size]
+
+
+class MenuBulkEndpointTests(TestCase):
+    """Bulk menu item endpoints and file import"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='owner@bulk.test', role='RESTAURANT_OWNER')
+        cls.restaurant = Restaurant.objects.create(
+            owner=cls.owner, name='Bulk Bistro', address='1 Main St', phone_number='0'
+        )
+        other = Restaurant.objects.create(
+            owner=User.objects.create_user(email='other@bulk.test', role='RESTAURANT_OWNER'),
+            name='Other Bistro', address='2 Main St', phone_number='0'
+        )
+        cls.foreign_item = MenuItem.objects.create(restaurant=other, name='Theirs', price=Decimal('5.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def menu_inserts(self, queries):
+        return [query for query in queries if query['sql'].startswith('INSERT INTO "restaurants_menuitem"')]
+
+    def test_bulk_create_inserts_in_batches(self):
+        items = [{'name': f'Dish {i}', 'price': '4.50'} for i in range(5)]
+        with mock.patch('restaurants.views.BULK_BATCH_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/menu-items/bulk_create/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len(self.menu_inserts(queries)), 3)
+
+    def test_bulk_create_is_capped_and_all_or_nothing(self):
+        with mock.patch('restaurants.views.MAX_BULK_MENU_ITEMS', 2):
+            response = self.client.post('/api/menu-items/bulk_create/', [
+                {'name': f'Dish {i}', 'price': '4.50'} for i in range(3)
+            ], format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/menu-items/bulk_create/', [
+            {'name': 'Good', 'price': '4.50'}, {'name': 'Free', 'price': '0'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MenuItem.objects.filter(restaurant=self.restaurant).exists())
+
+    def test_bulk_update_validates_every_entry_before_writing(self):
+        mine = MenuItem.objects.create(restaurant=self.restaurant, name='Mine', price=Decimal('5.00'))
+        response = self.client.patch('/api/menu-items/bulk_update/', [
+            {'id': mine.id, 'price': '6.00'},
+            {'id': self.foreign_item.id, 'price': '1.00'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('id', response.data[1])
+        mine.refresh_from_db()
+        self.assertEqual(mine.price, Decimal('5.00'))
+
+        response = self.client.patch('/api/menu-items/bulk_update/', [
+            {'id': mine.id, 'price': '6.00', 'is_available': False},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        mine.refresh_from_db()
+        self.assertEqual((mine.price, mine.is_available), (Decimal('6.00'), False))
+
+    def test_bulk_update_rejects_malformed_ids(self):
+        mine = MenuItem.objects.create(restaurant=self.restaurant, name='Mine', price=Decimal('5.00'))
+        response = self.client.patch('/api/menu-items/bulk_update/', [
+            {'id': [mine.id], 'price': '1.00'},
+            {'id': {'pk': mine.id}, 'price': '1.00'},
+            {'id': True, 'price': '1.00'},
+            {'price': '1.00'},
+            'not an object',
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [response.data[index]['id'] for index in range(4)],
+            [['A valid menu item id is required.']] * 4
+        )
+        self.assertIn('non_field_errors', response.data[4])
+        mine.refresh_from_db()
+        self.assertEqual(mine.price, Decimal('5.00'))
+
+    def test_bulk_availability_only_touches_own_items(self):
+        mine = MenuItem.objects.create(restaurant=self.restaurant, name='Mine', price=Decimal('5.00'))
+        response = self.client.post('/api/menu-items/bulk_availability/', {
+            'ids': [mine.id, self.foreign_item.id], 'is_available': False,
+        }, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+        self.foreign_item.refresh_from_db()
+        self.assertTrue(self.foreign_item.is_available)
+
+    def import_file(self, name, content):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.client.post('/api/menu-items/import_menu/', {'file': upload}, format='multipart')
+
+    def test_import_creates_and_updates_by_name(self):
+        MenuItem.objects.create(restaurant=self.restaurant, name='Soup', price=Decimal('3.00'))
+        response = self.import_file(
+            'menu.csv',
+            'name,price,category\nsoup,3.50,APPETIZERS\nCake,4.00,DESSERTS\n'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'created': 1, 'updated': 1})
+        self.assertEqual(
+            MenuItem.objects.get(restaurant=self.restaurant, name__iexact='soup').price, Decimal('3.50')
+        )
+
+    def test_import_reports_bad_rows_and_writes_nothing(self):
+        response = self.import_file(
+            'menu.ndjson',
+            '{"name": "Cake", "price": "4.00"}\n{"name": "Pie", "price": "-1"}\n'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2])
+        self.assertFalse(MenuItem.objects.filter(restaurant=self.restaurant).exists())
+
+    def test_import_rejects_unreadable_files(self):
+        for name, content, message in [
+            ('menu.txt', 'name\nCake\n', 'Unsupported file type'),
+            ('menu.csv', 'title,price\nCake,4\n', '"name" column'),
+            ('menu.ndjson', '{"name": "Cake"}\nnot json\n', 'Line 2'),
+            ('menu.json', '{"name": "Cake"}', 'array'),
+        ]:
+            with self.subTest(name=name):
+                response = self.import_file(name, content)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.data['detail'])
+
+        with mock.patch('restaurants.views.MAX_BULK_MENU_ITEMS', 2):
+            response = self.import_file('menu.csv', 'name,price\nA,1\nB,1\nC,1\n')
+        self.assertEqual(response.status_code, 400)
+
+    def test_csv_rows_are_read_across_chunk_boundaries(self):
+        content = 'name,price\nCrème brûlée,6.50\nTarte,5.00\n'
+        rows = list(iter_csv_rows(ChunkedUpload(content, size=3)))
+        self.assertEqual(rows, [
+            {'name': 'Crème brûlée', 'price': '6.50'}, {'name': 'Tarte', 'price': '5.00'}
+        ])
+        with self.assertRaises(MenuImportError):
+            list(iter_csv_rows(ChunkedUpload('price\n1\n', size=4)))
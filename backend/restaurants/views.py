@@ -1,39 +1,109 @@
+from urllib.parse import urlsplit, urlunsplit
+
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Restaurant, MenuItem
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from .models import Restaurant, MenuItem, OpeningHours, ScheduleException
 from .serializers import (
     RestaurantSerializer,
     RestaurantListSerializer,
     RestaurantCreateSerializer,
     MenuItemSerializer,
-    MenuItemCreateSerializer
+    MenuItemCreateSerializer,
+    MenuItemAvailabilitySerializer,
+    OpeningHoursSerializer,
+    ScheduleExceptionSerializer,
+    RestaurantScheduleSerializer
 )
 from .permissions import IsRestaurantOwner, IsRestaurantOwnerOrReadOnly
+from .menu_import import iter_menu_rows, MenuImportError
+from .schedule import get_index, invalidate_schedules
+from .facets import search_facets
+from .cache import (
+    cached_payload, catalogue_key, catalogue_validators, invalidate_catalogue
+)
+from foodieasy_backend.conditional import ConditionalResponseMixin, make_etag
+from foodieasy_backend.sharding import (
+    ShardRoutingMixin, current_shard, fan_out, is_sharded, locate, shard_for_restaurant,
+    write_alias,
+)
+
+# Upper bound on menu items written by one bulk request
+MAX_BULK_MENU_ITEMS = 1000
+BULK_BATCH_SIZE = 500
+
+
+class BrowsePagination(PageNumberPagination):
+    """Page links without scheme and host, as browse pages are cached for every host"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    
+    def get_next_link(self):
+        return self._relative(super().get_next_link())
+    
+    def get_previous_link(self):
+        return self._relative(super().get_previous_link())
+    
+    def _relative(self, url):
+        if url is None:
+            return None
+        parts = urlsplit(url)
+        return urlunsplit(('', '', parts.path, parts.query, parts.fragment))
+
+
+def menu_item_counts(restaurant_ids):
+    """``{restaurant_id: menu items}``, grouped on each restaurant's shard"""
+    by_shard = {}
+    for restaurant_id in restaurant_ids:
+        by_shard.setdefault(shard_for_restaurant(restaurant_id), []).append(restaurant_id)
+    counts = {}
+    for alias, ids in by_shard.items():
+        counts.update(
+            MenuItem.objects.using(alias).filter(restaurant_id__in=ids)
+            .values('restaurant_id')
+            .annotate(total=Count('id'))
+            .order_by()
+            .values_list('restaurant_id', 'total')
+        )
+    return counts
+
 
+def is_menu_item_id(value):
+    """Integer ids only; JSON lists and objects are unhashable, and true would mean 1"""
+    return isinstance(value, int) and not isinstance(value, bool)
 
-class RestaurantViewSet(viewsets.ModelViewSet):
+
+class RestaurantViewSet(ConditionalResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Restaurant operations.
     
-    list: Get all restaurants (public)
+    list: Get all restaurants (public); ?open_now=true for those taking orders
     retrieve: Get single restaurant with menu (public)
     create: Create restaurant (restaurant owner only)
     update: Update restaurant (owner only)
     destroy: Delete restaurant (owner only)
     """
-    queryset = Restaurant.objects.filter(is_active=True).select_related('owner')
+    queryset = Restaurant.objects.filter(is_active=True).select_related(
+        'owner', 'delivery_estimate'
+    )
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['cuisine_type', 'is_active']
     search_fields = ['name', 'description', 'cuisine_type']
     ordering_fields = ['created_at', 'name']
     ordering = ['-created_at']
+    conditional_actions = ('list', 'retrieve', 'browse')
     
     def get_serializer_class(self):
         """Return appropriate serializer class"""
-        if self.action == 'list':
+        if self.action in ['list', 'browse']:
             return RestaurantListSerializer
         elif self.action == 'create':
             return RestaurantCreateSerializer
@@ -41,7 +111,9 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Set permissions based on action"""
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'browse'] or (
+            self.action == 'hours' and self.request.method == 'GET'
+        ):
             permission_classes = [AllowAny]
         elif self.action == 'create':
             permission_classes = [IsAuthenticated]
@@ -49,9 +121,128 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated, IsRestaurantOwner]
         return [permission() for permission in permission_classes]
     
+    def get_queryset(self):
+        """Count menu items in SQL for lists; prefetch them for detail pages"""
+        queryset = super().get_queryset()
+        open_now = self.request.query_params.get('open_now')
+        if self.action == 'list' and open_now in ('true', 'false'):
+            # Opening hours come from the in-memory schedule index, not SQL
+            now = timezone.now()
+            closed = Q(is_open=False) | Q(id__in=get_index(now).closed_ids(now))
+            queryset = queryset.exclude(closed) if open_now == 'true' else queryset.filter(closed)
+        # Menu items live on restaurant shards, so the join only works unsharded;
+        # sharded lists count them in get_serializer instead
+        if self.action in ['list', 'browse'] and not is_sharded():
+            queryset = queryset.annotate(menu_items_total=Count('menu_items'))
+        elif self.action == 'retrieve':
+            queryset = queryset.prefetch_related('menu_items')
+        return queryset
+    
+    def get_serializer(self, *args, **kwargs):
+        """Sharded lists get the page's menu item counts with one query per shard"""
+        if self.action in ['list', 'browse'] and is_sharded() and args:
+            restaurants = list(args[0])
+            context = self.get_serializer_context()
+            context['menu_items_counts'] = menu_item_counts(restaurant.id for restaurant in restaurants)
+            return super().get_serializer(restaurants, *args[1:], context=context, **kwargs)
+        return super().get_serializer(*args, **kwargs)
+    
+    def get_validators(self, request, *args, **kwargs):
+        """ETag/Last-Modified from updated_at columns, without building the payload"""
+        if self.action in ['list', 'browse']:
+            return catalogue_validators(self.action, request.query_params)
+        return catalogue_validators('retrieve', pk=kwargs.get('pk'))
+    
+    def list(self, request, *args, **kwargs):
+        """Public catalogue, served from the catalogue cache"""
+        key = catalogue_key('list', request.query_params, etag=self.etag)
+        return Response(cached_payload(
+            key, lambda: super(RestaurantViewSet, self).list(request, *args, **kwargs).data
+        ))
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Public restaurant detail with menu, served from the catalogue cache"""
+        key = catalogue_key('retrieve', pk=kwargs.get('pk'), etag=self.etag)
+        return Response(cached_payload(
+            key, lambda: super(RestaurantViewSet, self).retrieve(request, *args, **kwargs).data
+        ))
+    
+    @action(detail=False, methods=['get'])
+    def browse(self, request):
+        """
+        A page of restaurants with facet counts for cuisine, menu category,
+        open status and price band (see restaurants.facets). Facets take
+        comma-separated values; each facet's counts ignore its own filter.
+        
+        GET /api/restaurants/browse/?cuisine_type=THAI,KOREAN&category=DESSERTS&open_now=true&price_band=budget
+        """
+        key = catalogue_key('browse', request.query_params, etag=self.etag)
+        return Response(cached_payload(key, lambda: self.build_browse(request)))
+    
+    def build_browse(self, request):
+        searched = filters.SearchFilter().filter_queryset(
+            request, Restaurant.objects.filter(is_active=True), self
+        )
+        matching, facets = search_facets(searched, request.query_params)
+        
+        queryset = filters.OrderingFilter().filter_queryset(
+            request, self.get_queryset().filter(id__in=matching), self
+        )
+        # Only this action is paginated; the list stays a plain array
+        paginator = BrowsePagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        data = paginator.get_paginated_response(self.get_serializer(page, many=True).data).data
+        data['facets'] = facets
+        return data
+    
     def perform_create(self, serializer):
         """Create restaurant and assign to current user"""
         serializer.save(owner=self.request.user)
+        invalidate_catalogue()
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_catalogue()
+    
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_catalogue()
+    
+    @action(detail=True, methods=['get', 'put'])
+    def hours(self, request, pk=None):
+        """
+        Get or replace the restaurant's opening hours and exceptions.
+        Times are in RESTAURANT_TIME_ZONE; no opening hours means always open.
+        
+        GET /api/restaurants/{id}/hours/
+        PUT /api/restaurants/{id}/hours/
+        Body: {"opening_hours": [{"weekday": 0, "opens_at": "11:00", "closes_at": "22:00"}],
+               "exceptions": [{"date": "2026-12-25", "opens_at": null, "closes_at": null}]}
+        """
+        restaurant = self.get_object()
+        
+        if request.method == 'PUT':
+            serializer = RestaurantScheduleSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                restaurant.opening_hours.all().delete()
+                restaurant.schedule_exceptions.all().delete()
+                OpeningHours.objects.bulk_create([
+                    OpeningHours(restaurant=restaurant, **data)
+                    for data in serializer.validated_data['opening_hours']
+                ])
+                ScheduleException.objects.bulk_create([
+                    ScheduleException(restaurant=restaurant, **data)
+                    for data in serializer.validated_data.get('exceptions', [])
+                ])
+            # bulk_create sends no signals
+            invalidate_schedules()
+            invalidate_catalogue()
+        
+        return Response({
+            'opening_hours': OpeningHoursSerializer(restaurant.opening_hours.all(), many=True).data,
+            'exceptions': ScheduleExceptionSerializer(restaurant.schedule_exceptions.all(), many=True).data,
+        })
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_restaurant(self, request):
@@ -77,7 +268,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             )
 
 
-class MenuItemViewSet(viewsets.ModelViewSet):
+class MenuItemViewSet(ConditionalResponseMixin, ShardRoutingMixin, viewsets.ModelViewSet):
     """
     ViewSet for MenuItem operations.
     
@@ -119,13 +310,281 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def get_shard(self, request):
+        """Shard of the menu item, the owner's restaurant or ?restaurant_id=/?restaurant="""
+        if self.kwargs.get('pk'):
+            return locate(MenuItem, self.kwargs['pk'])
+        restaurant = self.get_owner_restaurant()
+        if restaurant is not None:
+            return shard_for_restaurant(restaurant.id)
+        restaurant_id = request.query_params.get('restaurant_id') or request.query_params.get('restaurant')
+        if str(restaurant_id).isdigit():
+            return shard_for_restaurant(restaurant_id)
+        return None
+    
+    def get_validators(self, request, *args, **kwargs):
+        """ETag/Last-Modified from MAX(updated_at) and the row count of the filtered items"""
+        if is_sharded() and current_shard() is None:
+            # Unscoped lists span every shard; serve them unconditionally
+            return None
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            if not str(kwargs.get('pk')).isdigit():
+                return None
+            queryset = queryset.filter(pk=kwargs['pk'])
+        
+        stats = queryset.aggregate(latest=Max('updated_at'), count=Count('id'))
+        if self.action == 'retrieve' and not stats['count']:
+            return None
+        etag = make_etag(
+            self.action, kwargs.get('pk'), sorted(request.query_params.items()),
+            stats['count'], stats['latest'].isoformat() if stats['latest'] else None
+        )
+        return etag, stats['latest']
+    
+    def list(self, request, *args, **kwargs):
+        """Menu items of one restaurant, or of every shard when unfiltered"""
+        if is_sharded() and current_shard() is None:
+            menu_items = fan_out(self.filter_queryset(self.get_queryset()))
+            return Response(self.get_serializer(menu_items, many=True).data)
+        return super().list(request, *args, **kwargs)
+    
+    def get_owner_restaurant(self):
+        """Return the current user's restaurant (cached on the user), or None"""
+        return getattr(self.request.user, 'restaurant', None)
+    
+    def no_restaurant_response(self):
+        return Response(
+            {'detail': 'You do not have a restaurant yet.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
     def perform_create(self, serializer):
         """Create menu item for the user's restaurant"""
-        try:
-            restaurant = Restaurant.objects.get(owner=self.request.user)
-            serializer.save(restaurant=restaurant)
-        except Restaurant.DoesNotExist:
+        restaurant = self.get_owner_restaurant()
+        if restaurant is None:
             raise ValueError('You must have a restaurant before creating menu items.')
+        serializer.save(restaurant=restaurant)
+        invalidate_catalogue()
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_catalogue()
+    
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_catalogue()
+    
+    @action(detail=False, methods=['post'])
+    def bulk_create(self, request):
+        """
+        Create many menu items in one transaction.
+        
+        POST /api/menu-items/bulk_create/
+        Body: [{"name": "...", "price": "12.50", "category": "MAIN_COURSE"}, ...]
+        """
+        restaurant = self.get_owner_restaurant()
+        if restaurant is None:
+            return self.no_restaurant_response()
+        
+        serializer = MenuItemCreateSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=MAX_BULK_MENU_ITEMS
+        )
+        serializer.is_valid(raise_exception=True)
+        
+        with transaction.atomic(using=write_alias(MenuItem)):
+            menu_items = MenuItem.objects.bulk_create(
+                [MenuItem(restaurant=restaurant, **data) for data in serializer.validated_data],
+                batch_size=BULK_BATCH_SIZE
+            )
+        invalidate_catalogue()
+        
+        return Response(
+            MenuItemSerializer(menu_items, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+    
+    @action(detail=False, methods=['post', 'patch'])
+    def bulk_update(self, request):
+        """
+        Partially update many of the owner's menu items in one transaction.
+        
+        PATCH /api/menu-items/bulk_update/
+        Body: [{"id": 1, "price": "13.00"}, {"id": 2, "is_available": false}, ...]
+        """
+        restaurant = self.get_owner_restaurant()
+        if restaurant is None:
+            return self.no_restaurant_response()
+        
+        entries = request.data
+        if not isinstance(entries, list) or not entries:
+            return Response(
+                {'detail': 'Expected a non-empty list of menu item updates.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(entries) > MAX_BULK_MENU_ITEMS:
+            return Response(
+                {'detail': f'At most {MAX_BULK_MENU_ITEMS} menu items can be updated at once.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ids = [entry.get('id') if isinstance(entry, dict) else None for entry in entries]
+        menu_items = MenuItem.objects.filter(restaurant=restaurant).in_bulk(
+            [item_id for item_id in ids if is_menu_item_id(item_id)]
+        )
+        
+        # Validate everything before writing anything
+        errors = [{} for _ in entries]
+        updates = []
+        for index, (entry, item_id) in enumerate(zip(entries, ids)):
+            if not isinstance(entry, dict):
+                errors[index] = {'non_field_errors': ['Expected an object with an id.']}
+                continue
+            if not is_menu_item_id(item_id):
+                errors[index] = {'id': ['A valid menu item id is required.']}
+                continue
+            if item_id not in menu_items:
+                errors[index] = {'id': ['Menu item not found in your restaurant.']}
+                continue
+            serializer = MenuItemCreateSerializer(
+                menu_items[entry['id']], data=entry, partial=True
+            )
+            if serializer.is_valid():
+                updates.append((menu_items[entry['id']], serializer.validated_data))
+            else:
+                errors[index] = serializer.errors
+        
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        now = timezone.now()
+        fields = {'updated_at'}
+        for menu_item, data in updates:
+            for field, value in data.items():
+                setattr(menu_item, field, value)
+            menu_item.updated_at = now
+            fields.update(data)
+        
+        with transaction.atomic(using=write_alias(MenuItem)):
+            MenuItem.objects.bulk_update(
+                [menu_item for menu_item, _ in updates],
+                sorted(fields),
+                batch_size=BULK_BATCH_SIZE
+            )
+        invalidate_catalogue()
+        
+        return Response(
+            MenuItemSerializer([menu_item for menu_item, _ in updates], many=True).data
+        )
+    
+    @action(detail=False, methods=['post'])
+    def bulk_availability(self, request):
+        """
+        Mark many of the owner's menu items available or unavailable.
+        
+        POST /api/menu-items/bulk_availability/
+        Body: {"ids": [1, 2, 3], "is_available": false}
+        """
+        restaurant = self.get_owner_restaurant()
+        if restaurant is None:
+            return self.no_restaurant_response()
+        
+        serializer = MenuItemAvailabilitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        updated = MenuItem.objects.filter(
+            restaurant=restaurant,
+            id__in=serializer.validated_data['ids']
+        ).update(
+            is_available=serializer.validated_data['is_available'],
+            updated_at=timezone.now()
+        )
+        if updated:
+            invalidate_catalogue()
+        
+        return Response({'updated': updated})
+    
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def import_menu(self, request):
+        """
+        Import menu items from an uploaded CSV, JSON or NDJSON file.
+        Rows whose name matches an existing item update it; others are created.
+        
+        POST /api/menu-items/import_menu/  (multipart, field "file")
+        CSV columns: name, description, price, category, is_available
+        """
+        restaurant = self.get_owner_restaurant()
+        if restaurant is None:
+            return self.no_restaurant_response()
+        
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'detail': 'Upload a file in the "file" field.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        existing = {
+            menu_item.name.lower(): menu_item
+            for menu_item in MenuItem.objects.filter(restaurant=restaurant)
+        }
+        
+        to_create, to_update, errors = [], {}, []
+        update_fields = {'updated_at'}
+        now = timezone.now()
+        try:
+            for row_number, row in enumerate(iter_menu_rows(upload), start=1):
+                if row_number > MAX_BULK_MENU_ITEMS:
+                    return Response(
+                        {'detail': f'At most {MAX_BULK_MENU_ITEMS} rows can be imported at once.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                instance = existing.get(str(row.get('name', '')).lower())
+                serializer = MenuItemCreateSerializer(
+                    instance, data=row, partial=instance is not None
+                )
+                if not serializer.is_valid():
+                    errors.append({'row': row_number, 'errors': serializer.errors})
+                    continue
+                
+                if instance is None:
+                    menu_item = MenuItem(restaurant=restaurant, **serializer.validated_data)
+                    to_create.append(menu_item)
+                    existing[menu_item.name.lower()] = menu_item
+                elif instance.pk is None:
+                    # Same name repeated within the upload: last row wins
+                    for field, value in serializer.validated_data.items():
+                        setattr(instance, field, value)
+                else:
+                    for field, value in serializer.validated_data.items():
+                        setattr(instance, field, value)
+                    instance.updated_at = now
+                    update_fields.update(serializer.validated_data)
+                    to_update[instance.pk] = instance
+        except MenuImportError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic(using=write_alias(MenuItem)):
+            MenuItem.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+            if to_update:
+                MenuItem.objects.bulk_update(
+                    list(to_update.values()),
+                    sorted(update_fields),
+                    batch_size=BULK_BATCH_SIZE
+                )
+        invalidate_catalogue()
+        
+        return Response(
+            {'created': len(to_create), 'updated': len(to_update)},
+            status=status.HTTP_201_CREATED if to_create else status.HTTP_200_OK
+        )
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_menu(self, request):
@@ -1,16 +1,19 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import CustomUser
+from foodieasy_backend.admin_performance import LargeTableAdminMixin
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(LargeTableAdminMixin, UserAdmin):
     """Admin configuration for CustomUser"""
     
     model = CustomUser
     list_display = ['email', 'full_name', 'role', 'is_staff', 'is_active', 'date_joined']
-    list_filter = ['role', 'is_staff', 'is_active', 'date_joined']
-    search_fields = ['email', 'first_name', 'last_name', 'phone_number']
+    list_filter = ['role', 'is_staff', 'is_active']
+    search_fields = ['=id', '^email', '^first_name', '^last_name', '^phone_number']
+    search_help_text = 'User id, or the start of an email address, first name, last name or phone number.'
+    date_hierarchy = 'date_joined'
     ordering = ['-date_joined']
     
     fieldsets = (
@@ -91,3 +91,11 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # Admin changelist ordering and date hierarchy
+            models.Index(fields=['-date_joined'], name='user_date_joined_idx'),
+            # Admin prefix search (LIKE 'term%') on PostgreSQL
+            models.Index(fields=['first_name'], name='user_first_name_like_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['last_name'], name='user_last_name_like_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['phone_number'], name='user_phone_like_idx', opclasses=['varchar_pattern_ops']),
+        ]
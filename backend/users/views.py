@@ -1,10 +1,11 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, get_user_model
 from django.utils import timezone
+from foodieasy_backend.throttling import AnonBucketThrottle, AuthThrottle, RiderLocationThrottle
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
@@ -27,6 +28,7 @@ def get_tokens_for_user(user):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AnonBucketThrottle, AuthThrottle])
 def register(request):
     """
     Register a new user.
@@ -60,6 +62,7 @@ def register(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AnonBucketThrottle, AuthThrottle])
 def login(request):
     """
     Login user and return JWT tokens.
@@ -117,6 +120,7 @@ def get_profile(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([RiderLocationThrottle])
 def update_rider_location(request):
     """
     Update rider's current location.